@@ -1,5 +1,5 @@
 import { useState, useRef, useEffect } from "react";
-import { chat, getCurrentModel } from "../services/api";
+import { chat, getCurrentModel, deleteChatSession } from "../services/api";
 import Message from "./Message";
 import ChatHistory from "./ChatHistory";
 import ModelSelector from "./ModelSelector";
@@ -124,10 +124,16 @@ export default function ChatBox({ useRag }) {
         }
     }
 
+    function forgetOnServer(chatId) {
+        // The backend keeps each chat's conversation memory; a 404 just means it had none
+        deleteChatSession(chatId).catch(() => {});
+    }
+
     function deleteChat(chatId) {
         const allChats = getAllChats();
         const filtered = allChats.filter(c => c.id !== chatId);
         localStorage.setItem('allChats', JSON.stringify(filtered));
+        forgetOnServer(chatId);
 
         if (chatId === currentChatId) {
             if (filtered.length > 0) {
@@ -153,7 +159,7 @@ export default function ChatBox({ useRag }) {
         setError(null);
 
         try {
-            const res = await chat(input, useRag, 3, currentModel);
+            const res = await chat(input, useRag, 3, currentModel, currentChatId);
 
             const assistantMsg = {
                 role: "assistant",
@@ -184,6 +190,7 @@ export default function ChatBox({ useRag }) {
         if (window.confirm("Clear current chat?")) {
             setMessages([]);
             saveCurrentChat();
+            forgetOnServer(currentChatId);
             setError(null);
         }
     }
@@ -0,0 +1,370 @@
+"""
+Batch Chat
+Answer a JSONL file of questions, for offline evaluation or bulk Q&A
+
+Questions are embedded a batch at a time in one Ollama request and
+retrieved with one blocked matrix multiply per collection. Answers are
+generated with bounded parallelism, so Ollama stays busy without piling
+up requests. Each finished answer is appended to the run's log. Starting
+the same run id again skips everything already answered, so an
+interrupted run resumes where it stopped.
+
+Input lines look like {"id": "q1", "question": "...", "top_k": 3,
+"model": "...", "collections": ["default"], "use_rag": true}. Only the
+question is required ("message" works too). Lines without an id are
+numbered by their position in the file.
+
+Usage:
+    python batch_chat.py questions.jsonl -o answers.jsonl
+    python batch_chat.py questions.jsonl --run-id eval-1 --concurrency 4
+"""
+
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+from collection_manager import DEFAULT_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+_RUN_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+
+def validate_run_id(run_id: str) -> str:
+    """Run ids name log files on disk, so keep them to a safe alphabet"""
+    if not _RUN_ID_RE.match(run_id or ""):
+        raise ValueError(f"Invalid run id '{run_id}': use letters, digits, '-' and '_'")
+    return run_id
+
+
+def run_id_for(data: bytes) -> str:
+    """Default run id: the same input file resumes the same run"""
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def parse_items(lines: Iterable[str]) -> List[Dict]:
+    """Parse JSONL question lines; raises ValueError naming the first bad line"""
+    items, seen = [], set()
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {number}: invalid JSON ({e.msg})")
+        if not isinstance(item, dict):
+            raise ValueError(f"Line {number}: expected a JSON object")
+        question = item.get("question", item.get("message"))
+        if not isinstance(question, str) or not question.strip():
+            raise ValueError(f"Line {number}: missing question")
+        item["question"] = question.strip()
+        item["id"] = str(item.get("id", number))
+        if item["id"] in seen:
+            raise ValueError(f"Line {number}: duplicate id '{item['id']}'")
+        seen.add(item["id"])
+        items.append(item)
+    return items
+
+
+class BatchRunner:
+    """Resumable batch question answering over a RAGChatbot"""
+
+    def __init__(
+        self,
+        chatbot: "RAGChatbot",
+        runs_dir: Path,
+        batch_size: int = 32,
+        concurrency: int = 2
+    ):
+        self.chatbot = chatbot
+        self.runs_dir = Path(runs_dir)
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self._active: Set[str] = set()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def path_for(self, run_id: str) -> Path:
+        return self.runs_dir / f"{validate_run_id(run_id)}.jsonl"
+
+    def completed(self, run_id: str) -> Dict[str, Dict]:
+        """Answers already logged for a run, keyed by item id"""
+        path = self.path_for(run_id)
+        done = {}
+        if path.exists():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut short when the previous run was killed
+                        continue
+                    done[record["id"]] = record
+        return done
+
+    def queue_depth(self) -> int:
+        """Answers waiting for or being generated, across runs"""
+        return self._pending
+
+    def _repair_log(self, path: Path):
+        """Drop a trailing partial line so appended records start on their own line"""
+        if not path.exists() or path.stat().st_size == 0:
+            return
+        with open(path, "rb+") as f:
+            f.seek(-1, 2)
+            if f.read(1) == b"\n":
+                return
+            f.seek(0)
+            f.truncate(f.read().rfind(b"\n") + 1)
+
+    def run(
+        self,
+        items: List[Dict],
+        run_id: str,
+        top_k: int = 3,
+        model: Optional[str] = None,
+        collections: Optional[List[str]] = None,
+        debug: bool = False
+    ) -> Iterator[Dict]:
+        """Answer every item not yet in the run's log, yielding records as they finish
+
+        The last record is a summary ({"summary": {...}}). Failed items are
+        yielded with an "error" but not logged, so the next run retries them.
+        Raises RuntimeError if the run is already in progress.
+        """
+        path = self.path_for(run_id)
+        with self._lock:
+            if run_id in self._active:
+                raise RuntimeError(f"Batch run '{run_id}' is already in progress")
+            self._active.add(run_id)
+        try:
+            self.runs_dir.mkdir(parents=True, exist_ok=True)
+            self._repair_log(path)
+            done = self.completed(run_id)
+        except Exception:
+            self._release(run_id)
+            raise
+
+        pending = [item for item in items if item["id"] not in done]
+        defaults = {
+            "top_k": top_k,
+            "model": model,
+            "collections": collections or [DEFAULT_COLLECTION]
+        }
+        records = self._run(pending, run_id, path, defaults, debug, skipped=len(items) - len(pending))
+        # Step into _run's try, so run_id is released even if records is dropped unread
+        next(records)
+        return records
+
+    def _release(self, run_id: str):
+        with self._lock:
+            self._active.discard(run_id)
+
+    def _answer_done(self, future: Future):
+        # Also called for futures cancelled before _answer ran
+        with self._lock:
+            self._pending -= 1
+
+    def _finish(self, run_id: str, executor: ThreadPoolExecutor, log):
+        """Wait for answers in progress, then close the log and release the run"""
+        executor.shutdown(wait=True)
+        if log is not None:
+            log.close()
+        self._release(run_id)
+
+    def _run(
+        self,
+        items: List[Dict],
+        run_id: str,
+        path: Path,
+        defaults: Dict,
+        debug: bool,
+        skipped: int
+    ) -> Iterator[Dict]:
+        started = time.perf_counter()
+        answered = failed = 0
+        log_lock = threading.Lock()
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch-chat")
+        in_flight: Set[Future] = set()
+        log = None
+
+        def collect(block: bool) -> Iterator[Dict]:
+            nonlocal answered, failed, in_flight
+            if not in_flight:
+                return
+            finished, in_flight = wait(in_flight, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+            for future in finished:
+                record = future.result()
+                if "error" in record:
+                    failed += 1
+                else:
+                    answered += 1
+                yield record
+
+        try:
+            yield None  # run() primes the generator to here
+            log = open(path, "a", encoding="utf-8")
+            for start in range(0, len(items), self.batch_size):
+                block = [{**defaults, **{k: v for k, v in item.items() if v is not None}}
+                         for item in items[start:start + self.batch_size]]
+                retrievals = self._retrieve_block(block)
+                for item, retrieval in zip(block, retrievals):
+                    with self._lock:
+                        self._pending += 1
+                    future = executor.submit(
+                        self._answer, item, retrieval, debug, time.perf_counter(), log, log_lock
+                    )
+                    future.add_done_callback(self._answer_done)
+                    in_flight.add(future)
+                # Keep at most one block queued behind the generations in progress
+                while len(in_flight) > self.concurrency:
+                    yield from collect(block=True)
+                yield from collect(block=False)
+            while in_flight:
+                yield from collect(block=True)
+
+            total_ms = (time.perf_counter() - started) * 1000
+            logger.info(
+                f"Batch run {run_id}: {answered} answered, {failed} failed, "
+                f"{skipped} already done in {total_ms / 1000:.1f} s"
+            )
+            yield {"summary": {
+                "run_id": run_id,
+                "answered": answered,
+                "failed": failed,
+                "skipped": skipped,
+                "total_ms": total_ms
+            }}
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            if any(not future.done() for future in in_flight):
+                # Reached early when the consumer goes away; answers in progress are
+                # still logged, and the run stays active until they are
+                threading.Thread(
+                    target=self._finish, args=(run_id, executor, log), name="batch-chat-finish", daemon=True
+                ).start()
+            else:
+                self._finish(run_id, executor, log)
+
+    def _retrieve_block(self, block: List[Dict]) -> List[Optional[Dict]]:
+        """Retrieve context for a block, batching items that share retrieval settings"""
+        retrievals: List[Optional[Dict]] = [None] * len(block)
+        groups: Dict[tuple, List[int]] = {}
+        for i, item in enumerate(block):
+            if item.get("use_rag", True):
+                key = (tuple(item["collections"]), item["top_k"], item["model"] or self.chatbot.model)
+                groups.setdefault(key, []).append(i)
+
+        for (collections, top_k, model), indexes in groups.items():
+            try:
+                if not any(self.chatbot.collections.get(name).documents for name in collections):
+                    continue
+                results = self.chatbot.retrieve_batch(
+                    [block[i]["question"] for i in indexes],
+                    n_results=top_k,
+                    collections=list(collections),
+                    model=model
+                )
+                for i, retrieval in zip(indexes, results):
+                    retrievals[i] = retrieval
+            except Exception as e:
+                # chat() retrieves these one at a time instead
+                logger.error(f"Error in batch retrieval: {e}")
+        return retrievals
+
+    def _answer(
+        self,
+        item: Dict,
+        retrieval: Optional[Dict],
+        debug: bool,
+        queued: float,
+        log,
+        log_lock: threading.Lock
+    ) -> Dict:
+        queue_ms = (time.perf_counter() - queued) * 1000
+        result = self.chatbot.chat(
+            message=item["question"],
+            use_rag=item.get("use_rag", True),
+            top_k=item["top_k"],
+            model_override=item["model"],
+            debug=True,
+            collections=item["collections"],
+            retrieval=retrieval
+        )
+
+        record = {
+            "id": item["id"],
+            "question": item["question"],
+            "answer": result["answer"],
+            "sources": result["sources"],
+            "context_used": result["context_used"],
+            "model_used": result.get("model_used")
+        }
+        if "error" in result:
+            record["error"] = result["error"]
+            return record
+
+        details = result["debug"]
+        record["timings"] = {"queue_ms": queue_ms, **details["timings"]}
+        if debug:
+            record["debug"] = {key: value for key, value in details.items() if key != "timings"}
+        with log_lock:
+            log.write(json.dumps(record, default=str) + "\n")
+            log.flush()
+        return record
+
+
+def main():
+    import argparse
+    import sys
+
+    from config import settings
+    from rag_engine import build_chatbot
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", type=Path, help="JSONL file of questions")
+    parser.add_argument("-o", "--output", type=Path, help="Write answers here instead of stdout")
+    parser.add_argument("--run-id", help="Resume this run (default: derived from the input file)")
+    parser.add_argument("--top-k", type=int, default=settings.TOP_K_RESULTS)
+    parser.add_argument("--model", help="Chat model (default: LLM_MODEL)")
+    parser.add_argument("--collection", action="append", dest="collections", help="Collection to search; repeatable")
+    parser.add_argument("--batch-size", type=int, default=settings.BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=settings.BATCH_CONCURRENCY)
+    parser.add_argument("--debug", action="store_true", help="Include retrieved chunks and token counts")
+    args = parser.parse_args()
+
+    data = args.input.read_bytes()
+    items = parse_items(data.decode("utf-8").splitlines())
+    run_id = args.run_id or run_id_for(data)
+
+    # Same settings as the server, so answers match what /chat would give
+    chatbot = build_chatbot(settings)
+    kb_path = settings.STORAGE_DIR / settings.KB_FILE
+    if kb_path.exists():
+        chatbot.load_knowledge_base(str(kb_path))
+
+    runner = BatchRunner(
+        chatbot,
+        settings.STORAGE_DIR / settings.BATCH_RUNS_DIR,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency
+    )
+    out = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    try:
+        print(f"Run {run_id}: {len(items)} questions", file=sys.stderr)
+        for record in runner.run(items, run_id, args.top_k, args.model, args.collections, args.debug):
+            out.write(json.dumps(record, default=str) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
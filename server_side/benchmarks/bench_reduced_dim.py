@@ -0,0 +1,114 @@
+"""
+Reduced-Dimension Search Benchmark
+Recall and latency of the reduced first pass against full-dimension search
+
+Synthetic embeddings get a decaying variance spectrum, as real ones have,
+with the variance in the leading coordinates like a Matryoshka-trained
+model (--rotate scrambles it, so only PCA finds it). Pass --embeddings to
+measure real vectors instead, e.g. an (n, dim) .npy saved from a store.
+Queries are noisy copies of stored vectors; recall@k is the share of the
+exact full-dimension top-k that the reduced search also returns.
+
+Usage:
+    python benchmarks/bench_reduced_dim.py --chunks 200000 --dims 64,128,256
+    python benchmarks/bench_reduced_dim.py --embeddings kb.npy --methods pca
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from rag_engine import SimpleVectorStore
+
+
+def make_embeddings(chunks: int, dim: int, decay: float, rotate: bool, seed: int) -> np.ndarray:
+    """Gaussian vectors whose i-th coordinate has std (i + 1) ** -decay"""
+    rng = np.random.default_rng(seed)
+    scales = (np.arange(dim, dtype=np.float32) + 1) ** -decay
+    embeddings = rng.standard_normal((chunks, dim), dtype=np.float32) * scales
+    if rotate:
+        rotation, _ = np.linalg.qr(rng.standard_normal((dim, dim)))
+        embeddings = embeddings @ rotation.astype(np.float32)
+    return embeddings
+
+
+def make_queries(embeddings: np.ndarray, count: int, noise: float, seed: int) -> np.ndarray:
+    """Stored vectors plus noise scaled to each vector's norm"""
+    rng = np.random.default_rng(seed)
+    picked = embeddings[rng.choice(len(embeddings), size=count, replace=False)]
+    jitter = rng.standard_normal(picked.shape, dtype=np.float32)
+    jitter *= (noise * np.linalg.norm(picked, axis=1) / np.linalg.norm(jitter, axis=1))[:, None]
+    return picked + jitter
+
+
+def build_store(embeddings: np.ndarray, **kwargs) -> SimpleVectorStore:
+    store = SimpleVectorStore(max_workers=1, **kwargs)
+    batch = 10000
+    for start in range(0, len(embeddings), batch):
+        rows = embeddings[start:start + batch]
+        store.add(
+            ids=[f"bench_{i}" for i in range(start, start + len(rows))],
+            embeddings=rows,
+            documents=[f"chunk {i}" for i in range(start, start + len(rows))],
+            metadatas=[{"source": "bench", "chunk": i} for i in range(start, start + len(rows))]
+        )
+    return store
+
+
+def run(store: SimpleVectorStore, queries: np.ndarray, top_k: int):
+    """(mean ms per query, result id lists)"""
+    store.query(queries[0], top_k)  # warm up
+    start = time.perf_counter()
+    results = [store.query(q, top_k)["ids"][0] for q in queries]
+    return (time.perf_counter() - start) * 1000 / len(queries), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--embeddings", type=Path, help="(n, dim) .npy of real embeddings")
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--decay", type=float, default=0.5, help="Spectrum decay of synthetic embeddings")
+    parser.add_argument("--rotate", action="store_true", help="Spread synthetic variance over all coordinates")
+    parser.add_argument("--dims", default="64,128,256")
+    parser.add_argument("--methods", default="truncate,pca")
+    parser.add_argument("--candidates", default="100", help="Shortlist sizes to try, comma-separated")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=1.0, help="Query noise relative to vector norm")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.embeddings:
+        embeddings = np.load(args.embeddings).astype(np.float32)
+        print(f"Loaded {len(embeddings)} x {embeddings.shape[1]} embeddings from {args.embeddings}")
+    else:
+        embeddings = make_embeddings(args.chunks, args.dim, args.decay, args.rotate, args.seed)
+        print(f"Synthetic: {args.chunks} x {args.dim}, decay {args.decay}{', rotated' if args.rotate else ''}")
+    queries = make_queries(embeddings, args.queries, args.noise, args.seed + 1)
+
+    full_ms, exact = run(build_store(embeddings), queries, args.top_k)
+    print(f"\n{'method':>9} {'dim':>5} {'shortlist':>9} {'build s':>8} {'ms/query':>9} {'speedup':>8} {f'recall@{args.top_k}':>9}")
+    print(f"{'full':>9} {embeddings.shape[1]:>5} {'-':>9} {'-':>8} {full_ms:>9.2f} {1:>7.2f}x {1:>9.3f}")
+
+    for method in args.methods.split(","):
+        for dim in (int(d) for d in args.dims.split(",")):
+            for candidates in (int(c) for c in args.candidates.split(",")):
+                start = time.perf_counter()
+                store = build_store(embeddings, reduced_dim=dim, reduced_method=method, rescore_candidates=candidates)
+                build_s = time.perf_counter() - start
+                ms, found = run(store, queries, args.top_k)
+                recall = np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(exact, found)])
+                print(
+                    f"{method:>9} {dim:>5} {candidates:>9} {build_s:>8.1f} {ms:>9.2f} "
+                    f"{full_ms / ms:>7.2f}x {recall:>9.3f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
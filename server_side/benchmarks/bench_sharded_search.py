@@ -0,0 +1,77 @@
+"""
+Sharded Search Benchmark
+Measure SimpleVectorStore.query latency against thread pool width
+
+Usage:
+    python benchmarks/bench_sharded_search.py --chunks 500000 --workers 1,2,4,8,16
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from rag_engine import SimpleVectorStore
+
+
+def build_store(chunks: int, dim: int, shard_size: int, seed: int) -> SimpleVectorStore:
+    """Fill a store with random unit-ish vectors in batches"""
+    rng = np.random.default_rng(seed)
+    store = SimpleVectorStore(shard_size=shard_size, max_workers=1)
+    batch = 10000
+
+    for start in range(0, chunks, batch):
+        count = min(batch, chunks - start)
+        store.add(
+            ids=[f"bench_{i}" for i in range(start, start + count)],
+            embeddings=rng.standard_normal((count, dim), dtype=np.float32),
+            documents=[f"chunk {i}" for i in range(start, start + count)],
+            metadatas=[{"source": "bench", "chunk": i} for i in range(start, start + count)]
+        )
+    return store
+
+
+def time_queries(store: SimpleVectorStore, queries: np.ndarray, top_k: int) -> float:
+    """Return mean query latency in milliseconds"""
+    store.query(queries[0], top_k)  # warm up the pool and caches
+    start = time.perf_counter()
+    for q in queries:
+        store.query(q, top_k)
+    return (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--shard-size", type=int, default=65536)
+    parser.add_argument("--workers", default=",".join(
+        str(w) for w in (1, 2, 4, 8, 16) if w <= (os.cpu_count() or 1)
+    ))
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"Building store: {args.chunks} chunks x {args.dim} dims (shard size {args.shard_size})")
+    store = build_store(args.chunks, args.dim, args.shard_size, args.seed)
+    queries = np.random.default_rng(args.seed + 1).standard_normal(
+        (args.queries, args.dim), dtype=np.float32
+    )
+
+    baseline = None
+    print(f"\n{'workers':>8} {'ms/query':>10} {'speedup':>8}")
+    for workers in (int(w) for w in args.workers.split(",")):
+        store.max_workers = workers
+        latency = time_queries(store, queries, args.top_k)
+        baseline = baseline or latency
+        print(f"{workers:>8} {latency:>10.2f} {baseline / latency:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
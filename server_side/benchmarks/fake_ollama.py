@@ -0,0 +1,294 @@
+"""
+Fake Ollama Server
+Deterministic, network-free stand-in for the Ollama HTTP API
+
+Implements the endpoints the backend uses (/api/tags, /api/embeddings,
+/api/embed, /api/chat, /api/generate) with seeded embeddings and scripted
+answers. Latencies are configurable so benchmarks can model a slow or fast
+inference box without needing one.
+
+Usage:
+    python benchmarks/fake_ollama.py --port 11435 --token-latency 0.01
+    OLLAMA_HOST=http://127.0.0.1:11435 python main.py
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_MODELS = ["ministral-3", "nomic-embed-text"]
+DEFAULT_ANSWER = (
+    "Based on the provided context, here is a concise answer to your question. "
+    "The documents describe the topic in detail and the key points are summarized above."
+)
+
+
+class FakeOllama:
+    """Threaded HTTP server that mimics the Ollama API deterministically"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        dim: int = 768,
+        seed: int = 0,
+        models: Optional[List[str]] = None,
+        responses: Optional[List[str]] = None,
+        embed_latency: float = 0.0,
+        load_latency: float = 0.0,
+        prompt_token_latency: float = 0.0,
+        token_latency: float = 0.0
+    ):
+        self.dim = dim
+        self.seed = seed
+        self.models = models or list(DEFAULT_MODELS)
+        self.responses = itertools.cycle(responses or [DEFAULT_ANSWER])
+        self.embed_latency = embed_latency
+        self.load_latency = load_latency
+        self.prompt_token_latency = prompt_token_latency
+        self.token_latency = token_latency
+
+        self.request_counts: Dict[str, int] = {}
+        self._loaded_models: set = set()
+        self._word_vectors: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllama":
+        """Serve in a daemon thread"""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            name="fake-ollama",
+            daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Shut the server down"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOllama":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ===== Deterministic model behaviour =====
+
+    def _word_vector(self, word: str) -> np.ndarray:
+        vec = self._word_vectors.get(word)
+        if vec is None:
+            rng = np.random.default_rng(zlib.crc32(word.encode()) ^ self.seed)
+            vec = rng.standard_normal(self.dim).astype(np.float32)
+            self._word_vectors[word] = vec
+        return vec
+
+    def embed(self, text: str) -> List[float]:
+        """Hashed bag-of-words embedding: similar texts get similar vectors"""
+        words = text.lower().split()
+        if not words:
+            return [0.0] * self.dim
+        with self._lock:
+            vec = np.sum([self._word_vector(w) for w in words], axis=0)
+        norm = np.linalg.norm(vec)
+        return (vec / norm if norm else vec).tolist()
+
+    @staticmethod
+    def count_tokens(text: str) -> int:
+        return max(1, int(len(text.split()) * 1.3))
+
+    def _load_model(self, model: str) -> int:
+        """Simulate a cold model load once per model; returns load ns"""
+        with self._lock:
+            cold = model not in self._loaded_models
+            self._loaded_models.add(model)
+        if cold and self.load_latency:
+            time.sleep(self.load_latency)
+            return int(self.load_latency * 1e9)
+        return 0
+
+    def _count(self, path: str):
+        with self._lock:
+            self.request_counts[path] = self.request_counts.get(path, 0) + 1
+
+    # ===== HTTP plumbing =====
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; without this,
+            # Nagle plus delayed ACKs add ~40 ms to every keep-alive call
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, payload: Dict, code: int = 200):
+                body = json.dumps(payload).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_chunk(self, payload: Dict):
+                data = (json.dumps(payload) + "\n").encode()
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def _read_json(self) -> Dict:
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def do_GET(self):
+                fake._count(self.path)
+                if self.path == "/api/tags":
+                    now = datetime.now(timezone.utc).isoformat()
+                    self._send_json({"models": [
+                        {
+                            "name": name,
+                            "model": name,
+                            "modified_at": now,
+                            "size": 4 * 1024 ** 3,
+                            "digest": hashlib.sha256(name.encode()).hexdigest()
+                        }
+                        for name in fake.models
+                    ]})
+                elif self.path in ("/", "/api/version"):
+                    self._send_json({"version": "0.0.0-fake"})
+                else:
+                    self._send_json({"error": "not found"}, 404)
+
+            def do_POST(self):
+                fake._count(self.path)
+                req = self._read_json()
+                model = req.get("model", "")
+                if model and model not in fake.models:
+                    self._send_json({"error": f"model '{model}' not found"}, 404)
+                    return
+
+                if self.path == "/api/embeddings":
+                    if fake.embed_latency:
+                        time.sleep(fake.embed_latency)
+                    self._send_json({"embedding": fake.embed(req.get("prompt", ""))})
+                elif self.path == "/api/embed":
+                    inputs = req.get("input", "")
+                    inputs = [inputs] if isinstance(inputs, str) else inputs
+                    if fake.embed_latency:
+                        time.sleep(fake.embed_latency * len(inputs))
+                    self._send_json({
+                        "model": model,
+                        "embeddings": [fake.embed(text) for text in inputs]
+                    })
+                elif self.path in ("/api/chat", "/api/generate"):
+                    self._generate(req, model)
+                else:
+                    self._send_json({"error": "not found"}, 404)
+
+            def _generate(self, req: Dict, model: str):
+                is_chat = self.path == "/api/chat"
+                if is_chat:
+                    prompt = "\n".join(m.get("content", "") for m in req.get("messages") or [])
+                else:
+                    prompt = req.get("system", "") + "\n" + req.get("prompt", "")
+
+                load_ns = fake._load_model(model)
+                prompt_tokens = fake.count_tokens(prompt)
+                if fake.prompt_token_latency:
+                    time.sleep(fake.prompt_token_latency * prompt_tokens)
+
+                with fake._lock:
+                    answer = next(fake.responses)
+                pieces = [w + " " for w in answer.split()]
+                created = datetime.now(timezone.utc).isoformat()
+                stats = {
+                    "load_duration": load_ns,
+                    "prompt_eval_count": prompt_tokens,
+                    "prompt_eval_duration": int(fake.prompt_token_latency * prompt_tokens * 1e9),
+                    "eval_count": len(pieces),
+                    "eval_duration": int(fake.token_latency * len(pieces) * 1e9),
+                }
+                stats["total_duration"] = sum(v for k, v in stats.items() if k.endswith("duration"))
+
+                def frame(text: str, done: bool) -> Dict:
+                    out = {"model": model, "created_at": created, "done": done}
+                    if is_chat:
+                        out["message"] = {"role": "assistant", "content": text}
+                    else:
+                        out["response"] = text
+                    return out
+
+                if not req.get("stream", True):
+                    if fake.token_latency:
+                        time.sleep(fake.token_latency * len(pieces))
+                    self._send_json({**frame("".join(pieces).strip(), True), **stats})
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for piece in pieces:
+                    if fake.token_latency:
+                        time.sleep(fake.token_latency)
+                    self._send_chunk(frame(piece, False))
+                self._send_chunk({**frame("", True), **stats})
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--models", default=",".join(DEFAULT_MODELS))
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Seconds per embedding")
+    parser.add_argument("--load-latency", type=float, default=0.0, help="Seconds for a cold model load")
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0, help="Seconds per prompt token")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds per generated token")
+    args = parser.parse_args()
+
+    server = FakeOllama(
+        host=args.host,
+        port=args.port,
+        dim=args.dim,
+        seed=args.seed,
+        models=args.models.split(","),
+        embed_latency=args.embed_latency,
+        load_latency=args.load_latency,
+        prompt_token_latency=args.prompt_token_latency,
+        token_latency=args.token_latency
+    )
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark Fixtures
+Seeded generators for text and for every file type DocumentProcessor reads
+"""
+
+import struct
+import zlib
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+VOCABULARY = (
+    "revenue quarter customer product invoice shipment region forecast budget "
+    "contract supplier warehouse inventory margin growth market report analysis "
+    "server request latency memory cache index vector embedding model document "
+    "policy employee manager project deadline meeting review release feature "
+    "python function class module import error exception config deploy build"
+).split()
+
+
+def make_text(words: int, seed: int = 0) -> str:
+    """Deterministic pseudo-prose with sentence breaks"""
+    rng = np.random.default_rng(seed)
+    tokens = rng.choice(VOCABULARY, size=words)
+    out = []
+    for i, token in enumerate(tokens):
+        out.append(token.capitalize() if i % 12 == 0 else token)
+        if i % 12 == 11:
+            out[-1] += "."
+    return " ".join(out)
+
+
+def make_rows(rows: int, seed: int = 0) -> Dict[str, List]:
+    """Column data for tabular fixtures"""
+    rng = np.random.default_rng(seed)
+    return {
+        "order_id": list(range(1, rows + 1)),
+        "region": rng.choice(["north", "south", "east", "west"], size=rows).tolist(),
+        "product": rng.choice(VOCABULARY[:12], size=rows).tolist(),
+        "quantity": rng.integers(1, 100, size=rows).tolist(),
+        "price": np.round(rng.uniform(1, 500, size=rows), 2).tolist(),
+    }
+
+
+def write_txt(path: Path, words: int, seed: int = 0) -> Path:
+    path.write_text(make_text(words, seed), encoding="utf-8")
+    return path
+
+
+def write_code(path: Path, functions: int, seed: int = 0) -> Path:
+    rng = np.random.default_rng(seed)
+    lines = []
+    for i in range(functions):
+        a, b = rng.choice(VOCABULARY, size=2)
+        lines += [
+            f"def {a}_{b}_{i}(value):",
+            f'    """Compute the {a} {b} for value"""',
+            f"    return value * {int(rng.integers(1, 10))}",
+            "",
+        ]
+    path.write_text("\n".join(lines), encoding="utf-8")
+    return path
+
+
+def write_csv(path: Path, rows: int, seed: int = 0) -> Path:
+    data = make_rows(rows, seed)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(",".join(data) + "\n")
+        for values in zip(*data.values()):
+            f.write(",".join(str(v) for v in values) + "\n")
+    return path
+
+
+def write_xlsx(path: Path, rows: int, seed: int = 0) -> Path:
+    from openpyxl import Workbook
+
+    data = make_rows(rows, seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append(list(data))
+    for values in zip(*data.values()):
+        ws.append(list(values))
+    wb.save(path)
+    return path
+
+
+def write_docx(path: Path, paragraphs: int, seed: int = 0) -> Path:
+    from docx import Document
+
+    doc = Document()
+    for i in range(paragraphs):
+        doc.add_paragraph(make_text(60, seed + i))
+    doc.save(path)
+    return path
+
+
+def write_pdf(path: Path, pages: int, seed: int = 0) -> Path:
+    """Minimal multi-page PDF with real text operators"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(pages):
+        lines = make_text(400, seed + page).split(". ")
+        ops = ["BT /F1 10 Tf 50 760 Td 12 TL"]
+        for line in lines[:55]:
+            safe = line.replace("\\", "").replace("(", "").replace(")", "")
+            ops.append(f"({safe}) '")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids)
+    )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(bytes(out))
+    return path
+
+
+def write_png(path: Path, width: int, height: int, seed: int = 0) -> Path:
+    """Noise RGB PNG written without an imaging library"""
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    raw = b"".join(b"\x00" + row.tobytes() for row in pixels)
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    png = b"\x89PNG\r\n\x1a\n"
+    png += chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+    png += chunk(b"IDAT", zlib.compress(raw, 6))
+    png += chunk(b"IEND", b"")
+    path.write_bytes(png)
+    return path
+
+
+def write_reader_fixtures(directory: Path, scale: int = 1, seed: int = 0) -> Dict[str, Path]:
+    """One fixture per DocumentProcessor reader, sized by scale"""
+    directory.mkdir(parents=True, exist_ok=True)
+    return {
+        "txt": write_txt(directory / "sample.txt", 20000 * scale, seed),
+        "code": write_code(directory / "sample.py", 500 * scale, seed),
+        "csv": write_csv(directory / "sample.csv", 20000 * scale, seed),
+        "excel": write_xlsx(directory / "sample.xlsx", 5000 * scale, seed),
+        "docx": write_docx(directory / "sample.docx", 200 * scale, seed),
+        "pdf": write_pdf(directory / "sample.pdf", 20 * scale, seed),
+        "image": write_png(directory / "sample.png", 512 * scale, 512 * scale, seed),
+    }
@@ -0,0 +1,331 @@
+"""
+Load Test Harness
+Replay a JSONL request trace against the LoLA API and report per-endpoint
+latency percentiles, throughput and error rates
+
+Each trace line is one JSON object, in the same one-request-per-line layout
+as the repo's requests.jsonl:
+
+    {"request_id": "r1", "method": "POST", "path": "/chat", "json": {"message": "hi"}}
+    {"request_id": "r2", "method": "POST", "path": "/upload", "file": {"name": "a.txt", "words": 2000}}
+    {"request_id": "r3", "method": "GET", "path": "/documents", "offset": 1.5}
+    {"request_id": "r4", "title": "...", "body": "..."}
+
+Lines without a "path" are replayed as /chat calls using "body" (or
+"title") as the message. "offset" is the arrival time in seconds and is
+honoured with --use-offsets; otherwise arrivals follow --rate.
+
+Usage:
+    # In-process against main.app with a local fake Ollama
+    python benchmarks/loadtest.py trace.jsonl --concurrency 16 --rate 20
+
+    # Against a running server (start it with OLLAMA_HOST pointing at fake_ollama.py)
+    python benchmarks/loadtest.py trace.jsonl --url http://127.0.0.1:8000
+
+    # Write a synthetic mixed trace
+    python benchmarks/loadtest.py trace.jsonl --synthesize 1000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+import fixtures
+
+# Collapse ids in paths so /chats/load/abc and /chats/load/xyz share a row
+PATH_TEMPLATES = [
+    (re.compile(r"^/chats/(load|delete|export)/[^/]+$"), r"/chats/\1/{id}"),
+]
+
+
+def endpoint_key(method: str, path: str) -> str:
+    path = path.split("?", 1)[0]
+    for pattern, template in PATH_TEMPLATES:
+        path = pattern.sub(template, path)
+    return f"{method} {path}"
+
+
+def load_trace(path: Path) -> List[Dict]:
+    """Read a JSONL trace, normalizing backlog-style lines into /chat calls"""
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "path" not in entry:
+                message = (entry.get("body") or entry.get("title") or "").strip()
+                if not message:
+                    raise ValueError(f"Trace line {line_no} has neither a path nor a message")
+                entry = {
+                    "request_id": entry.get("request_id", str(line_no)),
+                    "method": "POST",
+                    "path": "/chat",
+                    "json": {"message": message[:5000], "use_rag": True},
+                    "offset": entry.get("offset"),
+                }
+            entry.setdefault("request_id", str(line_no))
+            entry.setdefault("method", "GET")
+            if entry.get("file", {}).get("path"):
+                entry["file"]["path"] = str((path.parent / entry["file"]["path"]).resolve())
+            entries.append(entry)
+    return entries
+
+
+def synthesize_trace(path: Path, count: int, seed: int):
+    """Write a mixed trace weighted towards chat traffic"""
+    rng = np.random.default_rng(seed)
+    kinds = ["chat", "documents", "upload", "chats_save", "chats_list", "chats_load", "health"]
+    weights = [0.55, 0.1, 0.05, 0.1, 0.05, 0.1, 0.05]
+    sessions: List[str] = []
+
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            kind = rng.choice(kinds, p=weights)
+            rid = f"syn-{i:06d}"
+            if kind == "chat":
+                entry = {"method": "POST", "path": "/chat",
+                         "json": {"message": fixtures.make_text(20, seed + i), "use_rag": True, "top_k": 3}}
+            elif kind == "documents":
+                entry = {"method": "GET", "path": "/documents"}
+            elif kind == "upload":
+                entry = {"method": "POST", "path": "/upload",
+                         "file": {"name": f"trace_{i}.txt", "words": int(rng.integers(500, 5000)), "seed": i}}
+            elif kind == "chats_save":
+                session_id = f"session-{len(sessions)}"
+                sessions.append(session_id)
+                entry = {"method": "POST", "path": "/chats/save", "json": {
+                    "id": session_id,
+                    "title": f"Session {len(sessions)}",
+                    "messages": [
+                        {"role": "user", "text": fixtures.make_text(20, seed + i), "timestamp": ""},
+                        {"role": "assistant", "text": fixtures.make_text(80, seed + i + 1), "timestamp": ""},
+                    ],
+                }}
+            elif kind == "chats_load" and sessions:
+                entry = {"method": "GET", "path": f"/chats/load/{rng.choice(sessions)}"}
+            elif kind == "chats_list":
+                entry = {"method": "GET", "path": "/chats/list"}
+            else:
+                entry = {"method": "GET", "path": "/health"}
+            f.write(json.dumps({"request_id": rid, **entry}) + "\n")
+
+
+# =========================
+# Replay
+# =========================
+
+class LoadRunner:
+    """Replays trace entries with bounded concurrency and a target arrival rate"""
+
+    def __init__(self, client, concurrency: int, rate: float, use_offsets: bool, seed: int):
+        self.client = client
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.rate = rate
+        self.use_offsets = use_offsets
+        self.rng = np.random.default_rng(seed)
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.status_codes: Dict[str, Dict[int, int]] = {}
+
+    def _arrival_times(self, entries: List[Dict]) -> List[float]:
+        if self.use_offsets:
+            return [float(e.get("offset") or 0.0) for e in entries]
+        if self.rate <= 0:
+            return [0.0] * len(entries)
+        # Poisson arrivals at the requested mean rate
+        gaps = self.rng.exponential(1.0 / self.rate, size=len(entries))
+        return np.cumsum(gaps).tolist()
+
+    def _build_request(self, entry: Dict) -> Dict:
+        kwargs = {}
+        if "json" in entry:
+            kwargs["json"] = entry["json"]
+        if "file" in entry:
+            spec = entry["file"]
+            if spec.get("path"):
+                content = Path(spec["path"]).read_bytes()
+                name = spec.get("name") or Path(spec["path"]).name
+            else:
+                content = fixtures.make_text(spec.get("words", 1000), spec.get("seed", 0)).encode()
+                name = spec.get("name", "trace.txt")
+            kwargs["files"] = {"file": (name, content)}
+        return kwargs
+
+    async def _send(self, entry: Dict):
+        key = endpoint_key(entry["method"], entry["path"])
+        kwargs = self._build_request(entry)
+        async with self.semaphore:
+            start = time.perf_counter()
+            try:
+                resp = await self.client.request(entry["method"], entry["path"], **kwargs)
+                code = resp.status_code
+            except Exception:
+                code = 0
+            elapsed = (time.perf_counter() - start) * 1000
+
+        self.samples.setdefault(key, []).append(elapsed)
+        codes = self.status_codes.setdefault(key, {})
+        codes[code] = codes.get(code, 0) + 1
+        if code == 0 or code >= 400:
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+    async def run(self, entries: List[Dict]) -> float:
+        arrivals = self._arrival_times(entries)
+        tasks = []
+        start = time.perf_counter()
+        for entry, at in zip(entries, arrivals):
+            delay = at - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self._send(entry)))
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - start
+
+    def report(self, wall_seconds: float) -> Dict:
+        endpoints = {}
+        all_samples = []
+        for key in sorted(self.samples):
+            arr = np.array(self.samples[key])
+            all_samples.extend(self.samples[key])
+            errors = self.errors.get(key, 0)
+            endpoints[key] = {
+                "requests": len(arr),
+                "errors": errors,
+                "error_rate": round(errors / len(arr), 4),
+                "throughput_rps": round(len(arr) / wall_seconds, 2),
+                "mean_ms": round(float(arr.mean()), 2),
+                "p50_ms": round(float(np.percentile(arr, 50)), 2),
+                "p95_ms": round(float(np.percentile(arr, 95)), 2),
+                "p99_ms": round(float(np.percentile(arr, 99)), 2),
+                "status_codes": {str(c): n for c, n in sorted(self.status_codes[key].items())},
+            }
+
+        total_errors = sum(self.errors.values())
+        arr = np.array(all_samples or [0.0])
+        return {
+            "wall_seconds": round(wall_seconds, 3),
+            "requests": len(all_samples),
+            "errors": total_errors,
+            "error_rate": round(total_errors / max(len(all_samples), 1), 4),
+            "throughput_rps": round(len(all_samples) / wall_seconds, 2),
+            "p50_ms": round(float(np.percentile(arr, 50)), 2),
+            "p95_ms": round(float(np.percentile(arr, 95)), 2),
+            "p99_ms": round(float(np.percentile(arr, 99)), 2),
+            "endpoints": endpoints,
+        }
+
+
+def print_report(report: Dict):
+    print(f"\n{'endpoint':<28} {'reqs':>6} {'err%':>6} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    print("-" * 80)
+    rows = list(report["endpoints"].items()) + [("TOTAL", report)]
+    for key, row in rows:
+        print(
+            f"{key:<28} {row['requests']:>6} {row['error_rate'] * 100:>5.1f}% "
+            f"{row['throughput_rps']:>8.2f} {row['p50_ms']:>8.1f}ms {row['p95_ms']:>8.1f}ms {row['p99_ms']:>8.1f}ms"
+        )
+
+
+async def run_in_process(entries: List[Dict], args) -> Dict:
+    """Drive main.app through an ASGI transport with a local fake Ollama"""
+    import httpx
+    from fake_ollama import FakeOllama
+
+    fake = FakeOllama(
+        seed=args.seed,
+        embed_latency=args.embed_latency,
+        load_latency=args.load_latency,
+        prompt_token_latency=args.prompt_token_latency,
+        token_latency=args.token_latency
+    ).start()
+    os.environ["OLLAMA_HOST"] = fake.url
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="lola-load-") as workdir:
+        # Keep uploads and storage out of the real server directory
+        os.chdir(workdir)
+        try:
+            import main
+
+            await main.app.router.startup()
+            try:
+                transport = httpx.ASGITransport(app=main.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://lola", timeout=None) as client:
+                    runner = LoadRunner(client, args.concurrency, args.rate, args.use_offsets, args.seed)
+                    wall = await runner.run(entries)
+            finally:
+                await main.app.router.shutdown()
+        finally:
+            os.chdir(cwd)
+            fake.stop()
+
+    return runner.report(wall)
+
+
+async def run_remote(entries: List[Dict], args) -> Dict:
+    """Drive a running uvicorn server over HTTP"""
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=None, limits=limits) as client:
+        runner = LoadRunner(client, args.concurrency, args.rate, args.use_offsets, args.seed)
+        wall = await runner.run(entries)
+    return runner.report(wall)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace", type=Path, help="JSONL trace file")
+    parser.add_argument("--url", default=None, help="Target a running server instead of main.app in-process")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum in-flight requests")
+    parser.add_argument("--rate", type=float, default=0.0, help="Mean arrivals per second (0 = closed loop)")
+    parser.add_argument("--use-offsets", action="store_true", help="Replay trace 'offset' timestamps")
+    parser.add_argument("--limit", type=int, default=0, help="Replay only the first N entries")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--embed-latency", type=float, default=0.0)
+    parser.add_argument("--load-latency", type=float, default=0.0)
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0)
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument("--synthesize", type=int, default=0, help="Write N synthetic entries to the trace and exit")
+    parser.add_argument("--output", type=Path, default=None, help="Write the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.synthesize:
+        synthesize_trace(args.trace, args.synthesize, args.seed)
+        print(f"Wrote {args.synthesize} entries to {args.trace}")
+        return
+
+    entries = load_trace(args.trace)
+    if args.limit:
+        entries = entries[:args.limit]
+
+    mode = f"remote {args.url}" if args.url else "in-process"
+    print(f"Replaying {len(entries)} requests ({mode}, concurrency {args.concurrency}, "
+          f"rate {'offsets' if args.use_offsets else args.rate or 'closed loop'})")
+
+    runner = run_remote if args.url else run_in_process
+    report = asyncio.run(runner(entries, args))
+    report["config"] = {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()}
+
+    print_report(report)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
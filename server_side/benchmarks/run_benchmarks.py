@@ -0,0 +1,261 @@
+"""
+Offline Benchmark Suite
+Reproducible timings for the vector store, chunking, document readers
+and the /upload and /chat endpoints, all against a local fake Ollama
+
+Usage:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --sizes 10000,100000,1000000 --output results.json
+    python benchmarks/run_benchmarks.py --sections readers,end_to_end --token-latency 0.005
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+BENCH_DIR = Path(__file__).resolve().parent
+SERVER_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(SERVER_DIR))
+sys.path.insert(0, str(BENCH_DIR))
+
+from fake_ollama import FakeOllama
+import fixtures
+
+SECTIONS = ["vector_store", "chunking", "readers", "end_to_end"]
+
+
+def timed(fn: Callable, repeat: int = 1) -> Dict:
+    """Run fn repeat times and summarize wall-clock milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples = np.array(samples)
+    return {
+        "runs": repeat,
+        "mean_ms": round(float(samples.mean()), 3),
+        "min_ms": round(float(samples.min()), 3),
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p95_ms": round(float(np.percentile(samples, 95)), 3),
+    }
+
+
+# =========================
+# Sections
+# =========================
+
+def bench_vector_store(sizes: List[int], dim: int, queries: int, seed: int, workdir: Path) -> Dict:
+    from rag_engine import SimpleVectorStore
+
+    results = {}
+    for size in sizes:
+        print(f"  vector store: {size} chunks")
+        rng = np.random.default_rng(seed)
+        embeddings = rng.standard_normal((size, dim), dtype=np.float32)
+        ids = [f"doc{i // 100}_{i}" for i in range(size)]
+        docs = [f"chunk {i} of benchmark document {i // 100}" for i in range(size)]
+        metas = [{"source": f"doc{i // 100}", "filename": f"doc{i // 100}.txt", "chunk": i % 100}
+                 for i in range(size)]
+
+        store = SimpleVectorStore()
+        batch = 10000
+
+        def add_all():
+            for start in range(0, size, batch):
+                end = start + batch
+                store.add(ids[start:end], embeddings[start:end], docs[start:end], metas[start:end])
+
+        add = timed(add_all)
+        query_vecs = rng.standard_normal((queries, dim), dtype=np.float32)
+        query_iter = iter(query_vecs)
+        query = timed(lambda: store.query(next(query_iter), 3), repeat=queries)
+
+        kb_path = workdir / f"bench_{size}.pkl"
+        save = timed(lambda: store.save(str(kb_path)))
+        kb_bytes = kb_path.stat().st_size
+        load = timed(lambda: SimpleVectorStore().load(str(kb_path)))
+        delete = timed(lambda: store.delete_by_source("doc0"))
+        kb_path.unlink()
+
+        results[str(size)] = {
+            "add": {**add, "chunks_per_s": round(size / (add["mean_ms"] / 1000))},
+            "query": query,
+            "delete_by_source": delete,
+            "save": {**save, "bytes": kb_bytes},
+            "load": load,
+        }
+    return results
+
+
+def bench_chunking(seed: int) -> Dict:
+    from rag_engine import RAGChatbot
+
+    results = {}
+    for words in (10000, 100000, 1000000):
+        text = fixtures.make_text(words, seed)
+        stats = timed(lambda: RAGChatbot.chunk_text(text), repeat=3)
+        results[str(words)] = {**stats, "words_per_s": round(words / (stats["mean_ms"] / 1000))}
+    return results
+
+
+def bench_readers(workdir: Path, scale: int, seed: int) -> Dict:
+    from rag_engine import DocumentProcessor
+
+    readers = {
+        "txt": DocumentProcessor.read_txt,
+        "code": DocumentProcessor.read_code,
+        "csv": DocumentProcessor.read_csv,
+        "excel": DocumentProcessor.read_excel,
+        "docx": DocumentProcessor.read_docx,
+        "pdf": DocumentProcessor.read_pdf,
+        "image": DocumentProcessor.read_image,
+    }
+    paths = fixtures.write_reader_fixtures(workdir / "fixtures", scale, seed)
+
+    results = {}
+    for name, reader in readers.items():
+        path = paths[name]
+        # Tabular readers stream chunks; drain them so the whole file is timed
+        stats = timed(lambda: list(reader(str(path))) if name in ("csv", "excel") else reader(str(path)),
+                      repeat=3)
+        results[name] = {**stats, "file_bytes": path.stat().st_size}
+    return results
+
+
+def bench_end_to_end(workdir: Path, uploads: int, chats: int, seed: int) -> Dict:
+    from fastapi.testclient import TestClient
+
+    app_dir = workdir / "app"
+    app_dir.mkdir(exist_ok=True)
+    os.chdir(app_dir)
+    import main
+
+    docs = [fixtures.write_txt(app_dir / f"upload_{i}.txt", 3000, seed + i) for i in range(uploads)]
+    questions = [fixtures.make_text(15, seed + 1000 + i) for i in range(chats)]
+
+    with TestClient(main.app) as client:
+        upload_samples, chat_samples = [], []
+        for path in docs:
+            start = time.perf_counter()
+            with open(path, "rb") as f:
+                resp = client.post("/upload", files={"file": (path.name, f)})
+            upload_samples.append((time.perf_counter() - start) * 1000)
+            resp.raise_for_status()
+
+        for question in questions:
+            start = time.perf_counter()
+            resp = client.post("/chat", json={"message": question, "use_rag": True, "top_k": 3})
+            chat_samples.append((time.perf_counter() - start) * 1000)
+            resp.raise_for_status()
+
+    def summarize(samples: List[float]) -> Dict:
+        arr = np.array(samples)
+        return {
+            "runs": len(arr),
+            "mean_ms": round(float(arr.mean()), 3),
+            "p50_ms": round(float(np.percentile(arr, 50)), 3),
+            "p95_ms": round(float(np.percentile(arr, 95)), 3),
+        }
+
+    return {"upload": summarize(upload_samples), "chat": summarize(chat_samples)}
+
+
+# =========================
+# Runner
+# =========================
+
+def environment_info() -> Dict:
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=SERVER_DIR, capture_output=True, text=True, timeout=10
+        ).stdout.strip()
+    except Exception:
+        revision = ""
+
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "git_revision": revision or None,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", default=",".join(SECTIONS))
+    parser.add_argument("--sizes", default="10000,100000", help="Vector store sizes in chunks")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--reader-scale", type=int, default=1)
+    parser.add_argument("--uploads", type=int, default=10)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--embed-latency", type=float, default=0.0)
+    parser.add_argument("--load-latency", type=float, default=0.0)
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0)
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument("--output", default=None, help="JSON output path")
+    args = parser.parse_args()
+
+    sections = [s for s in args.sections.split(",") if s]
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        parser.error(f"Unknown sections: {', '.join(sorted(unknown))}")
+
+    fake = FakeOllama(
+        dim=args.dim,
+        seed=args.seed,
+        embed_latency=args.embed_latency,
+        load_latency=args.load_latency,
+        prompt_token_latency=args.prompt_token_latency,
+        token_latency=args.token_latency
+    ).start()
+    # Must be set before the ollama module is first imported
+    os.environ["OLLAMA_HOST"] = fake.url
+
+    output = Path(args.output or BENCH_DIR / "results" / f"bench-{datetime.now():%Y%m%d-%H%M%S}.json").resolve()
+    report = {"environment": environment_info(), "config": vars(args), "results": {}}
+
+    with tempfile.TemporaryDirectory(prefix="lola-bench-") as tmp:
+        workdir = Path(tmp)
+        cwd = os.getcwd()
+        try:
+            for section in sections:
+                print(f"Running {section}...")
+                if section == "vector_store":
+                    sizes = [int(s) for s in args.sizes.split(",")]
+                    result = bench_vector_store(sizes, args.dim, args.queries, args.seed, workdir)
+                elif section == "chunking":
+                    result = bench_chunking(args.seed)
+                elif section == "readers":
+                    result = bench_readers(workdir, args.reader_scale, args.seed)
+                else:
+                    result = bench_end_to_end(workdir, args.uploads, args.chats, args.seed)
+                report["results"][section] = result
+        finally:
+            os.chdir(cwd)
+            fake.stop()
+
+    report["fake_ollama_requests"] = fake.request_counts
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(json.dumps(report["results"], indent=2))
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
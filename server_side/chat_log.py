@@ -0,0 +1,337 @@
+"""
+Chat Log
+Append-only per-session chat history
+
+Each session is a JSONL file of {"meta": {...}} lines (title, timestamps
+and other session fields, later lines win) and {"message": {...}} lines.
+Saving a turn appends its new messages and the changed session fields
+instead of rewriting the whole session, so a session costs O(messages) bytes written
+over its lifetime rather than O(messages^2). Byte offsets of the message
+lines are indexed in memory, so a page of a long session is read without
+parsing the rest. Once meta lines outnumber messages, a background thread
+compacts the file to a single meta line plus the messages.
+
+Sessions saved as one JSON document by earlier versions are converted on
+first access.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+from array import array
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from memory import validate_session_id
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class ChatConflict(ValueError):
+    """An append based on a stale view of the session"""
+
+    def __init__(self, session_id: str, expected: int, actual: int):
+        super().__init__(f"Session {session_id} has {actual} messages, not {expected}")
+        self.actual = actual
+
+
+class _Index:
+    """What we know about one session file as of its last scan"""
+
+    def __init__(self, inode: int):
+        self.inode = inode
+        self.size = 0
+        self.meta: Dict = {}
+        self.offsets = array("q")
+        self.meta_lines = 0
+        # Running hash of the message lines, to tell whether a saved session extends them
+        self.digest = hashlib.blake2b(digest_size=16)
+
+
+class ChatLog:
+    """Chat sessions as append-only JSONL files with an in-memory offset index"""
+
+    def __init__(self, directory: Path, min_compact_lines: int = 64):
+        self.directory = Path(directory)
+        self.min_compact_lines = min_compact_lines
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        self._indexes: Dict[str, _Index] = {}
+        self._locks: Dict[str, threading.RLock] = {}
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._pending: set = set()
+        self._thread: Optional[threading.Thread] = None
+
+    # ===== Files and index =====
+
+    def path_for(self, session_id: str) -> Path:
+        return self.directory / f"{validate_session_id(session_id)}.jsonl"
+
+    def _legacy_path(self, session_id: str) -> Path:
+        return self.directory / f"{session_id}.json"
+
+    def _session_lock(self, session_id: str) -> threading.RLock:
+        with self._lock:
+            return self._locks.setdefault(session_id, threading.RLock())
+
+    def exists(self, session_id: str) -> bool:
+        return self.path_for(session_id).exists() or self._legacy_path(session_id).exists()
+
+    def _index(self, session_id: str) -> Optional[_Index]:
+        """The session's index, refreshed if the file changed (e.g. another worker appended)"""
+        path = self.path_for(session_id)
+        legacy = self._legacy_path(session_id)
+        if not path.exists() and legacy.exists():
+            self._convert_legacy(session_id, legacy)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            self._indexes.pop(session_id, None)
+            return None
+
+        index = self._indexes.get(session_id)
+        if index is None or index.inode != stat.st_ino or stat.st_size < index.size:
+            # New to us, or replaced by a compaction
+            index = _Index(stat.st_ino)
+        if stat.st_size > index.size:
+            self._scan(path, index)
+        self._indexes[session_id] = index
+        return index
+
+    def _scan(self, path: Path, index: _Index):
+        """Index the lines appended since the last scan"""
+        with open(path, "rb") as f:
+            f.seek(index.size)
+            position = index.size
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Torn write from a crash; the next append overwrites it
+                    break
+                record = json.loads(line)
+                if "message" in record:
+                    index.offsets.append(position)
+                    index.digest.update(line)
+                elif "meta" in record:
+                    index.meta.update(record["meta"])
+                    index.meta_lines += 1
+                position += len(line)
+        index.size = position
+
+    def _convert_legacy(self, session_id: str, legacy: Path):
+        with open(legacy, "r", encoding="utf-8") as f:
+            session = json.load(f)
+        messages = session.pop("messages", [])
+        self._write(self.path_for(session_id), session, (_line({"message": m}) for m in messages))
+        legacy.unlink(missing_ok=True)
+        logger.info(f"Converted chat session {session_id} to an append-only log")
+
+    @staticmethod
+    def _write(path: Path, meta: Dict, message_lines) -> None:
+        """Write a compact log (one meta line, then the messages) and swap it in"""
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            f.write(_line({"meta": meta}))
+            for line in message_lines:
+                f.write(line)
+        os.replace(tmp, path)
+
+    # ===== Writing =====
+
+    def append(
+        self,
+        session_id: str,
+        messages: List[Dict],
+        meta: Optional[Dict] = None,
+        expected_count: Optional[int] = None
+    ) -> int:
+        """Append messages (and session field updates); returns the new message count
+
+        expected_count, if given, must match the stored message count, so a
+        client that missed an append (another window, a failed request) gets
+        a ChatConflict instead of a gap or a duplicate.
+        """
+        meta = {key: value for key, value in (meta or {}).items() if key != "messages"}
+        with self._session_lock(session_id):
+            index = self._index(session_id)
+            count = len(index.offsets) if index is not None else 0
+            if expected_count is not None and expected_count != count:
+                raise ChatConflict(session_id, expected_count, count)
+
+            if index is not None:
+                # Only fields that changed, typically just updatedAt
+                meta = {key: value for key, value in meta.items() if index.meta.get(key, _MISSING) != value}
+
+            path = self.path_for(session_id)
+            lines = [_line({"message": message}) for message in messages]
+            if index is None:
+                meta.setdefault("id", session_id)
+                lines.insert(0, _line({"meta": meta}))
+            elif meta:
+                lines.append(_line({"meta": meta}))
+            if not lines:
+                return count
+
+            if index is not None and path.stat().st_size > index.size:
+                # Drop a torn tail line before appending after it
+                with open(path, "r+b") as f:
+                    f.truncate(index.size)
+            with open(path, "ab") as f:
+                f.write(b"".join(lines))
+            index = self._index(session_id)
+            if index.meta_lines > max(self.min_compact_lines, len(index.offsets)):
+                self._schedule(session_id)
+            return len(index.offsets)
+
+    def save(self, session_id: str, session: Dict) -> int:
+        """Store a whole session as the old API sends it; returns the messages actually written
+
+        When the stored messages are a prefix of the new ones (their lines
+        hash the same), only the rest is appended. Anything else (edited or
+        deleted messages) rewrites the log.
+        """
+        messages = session.get("messages") or []
+        meta = {key: value for key, value in session.items() if key != "messages"}
+        with self._session_lock(session_id):
+            index = self._index(session_id)
+            count = len(index.offsets) if index is not None else 0
+            if count <= len(messages) and (not count or _digest(messages[:count]) == index.digest.digest()):
+                self.append(session_id, messages[count:], meta)
+                return len(messages) - count
+            merged = {**index.meta, **meta}
+            self._write(self.path_for(session_id), merged, (_line({"message": m}) for m in messages))
+            self._index(session_id)
+            return len(messages)
+
+    def delete(self, session_id: str) -> bool:
+        with self._session_lock(session_id):
+            self._indexes.pop(session_id, None)
+            existed = self.exists(session_id)
+            self.path_for(session_id).unlink(missing_ok=True)
+            self._legacy_path(session_id).unlink(missing_ok=True)
+            return existed
+
+    def clear(self) -> int:
+        count = 0
+        for path in list(self.directory.glob("*.jsonl")) + list(self.directory.glob("*.json")):
+            path.unlink(missing_ok=True)
+            count += 1
+        with self._lock:
+            self._indexes.clear()
+        return count
+
+    # ===== Reading =====
+
+    def session_ids(self) -> List[str]:
+        ids = {path.stem for path in self.directory.glob("*.jsonl")}
+        ids.update(path.stem for path in self.directory.glob("*.json"))
+        return sorted(ids)
+
+    def meta(self, session_id: str) -> Optional[Dict]:
+        """Session fields and message count, without reading any message"""
+        with self._session_lock(session_id):
+            index = self._index(session_id)
+            if index is None:
+                return None
+            return {**index.meta, "total_messages": len(index.offsets)}
+
+    def iter_messages(self, session_id: str, offset: int = 0, limit: Optional[int] = None) -> Iterator[Dict]:
+        """Messages from offset on, read from disk as they are consumed"""
+        with self._session_lock(session_id):
+            index = self._index(session_id)
+            if index is None:
+                return
+            offsets = index.offsets
+            end = len(offsets) if limit is None else min(len(offsets), offset + limit)
+            if offset >= end:
+                return
+            start_byte, stop_byte = offsets[offset], index.size
+            # A compaction while we read swaps the file, but this handle keeps the old one
+            f = open(self.path_for(session_id), "rb")
+        remaining = end - offset
+        with f:
+            f.seek(start_byte)
+            position = start_byte
+            for line in f:
+                if position >= stop_byte or not remaining:
+                    break
+                position += len(line)
+                record = json.loads(line)
+                if "message" in record:
+                    remaining -= 1
+                    yield record["message"]
+
+    def load(self, session_id: str, offset: int = 0, limit: Optional[int] = None) -> Optional[Dict]:
+        """The session with messages[offset:offset + limit] (all of them without a limit)"""
+        meta = self.meta(session_id)
+        if meta is None:
+            return None
+        total = meta.pop("total_messages")
+        session = {**meta, "messages": list(self.iter_messages(session_id, offset, limit))}
+        if limit is not None or offset:
+            session.update(total_messages=total, offset=offset, limit=limit)
+        return session
+
+    # ===== Compaction =====
+
+    def compact(self, session_id: str):
+        """Rewrite the log as one meta line plus the messages"""
+        with self._session_lock(session_id):
+            index = self._index(session_id)
+            if index is None or index.meta_lines <= 1:
+                return
+            path = self.path_for(session_id)
+            with open(path, "rb") as f:
+                def message_lines():
+                    for offset in index.offsets:
+                        f.seek(offset)
+                        yield f.readline()
+                self._write(path, index.meta, message_lines())
+            self._index(session_id)
+        logger.info(f"Compacted chat session {session_id} ({len(index.offsets)} messages)")
+
+    def _schedule(self, session_id: str):
+        with self._lock:
+            if session_id in self._pending:
+                return
+            self._pending.add(session_id)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="chat-compactor", daemon=True)
+                self._thread.start()
+        self._queue.put(session_id)
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def join(self):
+        """Block until every queued compaction has finished"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            session_id = self._queue.get()
+            with self._lock:
+                self._pending.discard(session_id)
+            try:
+                self.compact(session_id)
+            except Exception as e:
+                logger.error(f"Error compacting chat session {session_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+
+def _line(record: Dict) -> bytes:
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _digest(messages: List[Dict]) -> bytes:
+    """What _Index.digest would be for a log holding exactly these messages"""
+    digest = hashlib.blake2b(digest_size=16)
+    for message in messages:
+        digest.update(_line({"message": message}))
+    return digest.digest()
@@ -0,0 +1,209 @@
+"""
+Chunk Metadata
+Columnar, interned chunk metadata instead of one dict per chunk
+
+Chunks of one file share their source, filename, file type and upload
+date, so those fields live once in a document table. Per chunk there are
+only three integers: the document id, the chunk index and an id into a
+table of the remaining fields (user metadata, caption flags), which is
+interned too, since every chunk of an upload carries the same user
+metadata. Indexing or iterating still yields plain dicts, for callers
+that want the old shape; scans by document use the tables directly.
+"""
+
+import pickle
+import sys
+from array import array
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple, Union
+
+import numpy as np
+
+# Fields kept per document rather than per chunk
+DOCUMENT_FIELDS = ("source", "filename", "file_type", "upload_date")
+# Chunk index column value for chunks without an integer "chunk"
+NO_CHUNK = -1
+
+
+class ChunkMetadata:
+    """List-like sequence of chunk metadata dicts, stored as a document table plus int columns"""
+
+    def __init__(self):
+        self.documents: List[Dict] = []
+        # Chunks per document, kept current on append and delete
+        self.doc_counts: List[int] = []
+        self._extras: List[Dict] = [{}]
+        self._doc_ids = array("i")
+        self._chunks = array("i")
+        self._extra_ids = array("i")
+        # Interning lookups, rebuilt on load
+        self._doc_lookup: Dict[tuple, int] = {}
+        self._extra_lookup: Dict[bytes, int] = {self._extra_key({}): 0}
+
+    @staticmethod
+    def _extra_key(extra: Dict) -> bytes:
+        return pickle.dumps(sorted(extra.items()), protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ChunkMetadata":
+        """Rebuild from to_dict()"""
+        meta = cls()
+        meta.documents = data["documents"]
+        meta._extras = data["extras"]
+        meta._doc_ids = array("i", data["doc_ids"])
+        meta._chunks = array("i", data["chunks"])
+        meta._extra_ids = array("i", data["extra_ids"])
+        meta._doc_lookup = {tuple(doc.items()): i for i, doc in enumerate(meta.documents)}
+        meta._extra_lookup = {cls._extra_key(extra): i for i, extra in enumerate(meta._extras)}
+        meta.doc_counts = np.bincount(meta.doc_ids(), minlength=len(meta.documents)).tolist()
+        return meta
+
+    def to_dict(self) -> Dict:
+        return {
+            "documents": self.documents,
+            "extras": self._extras,
+            "doc_ids": self._doc_ids,
+            "chunks": self._chunks,
+            "extra_ids": self._extra_ids
+        }
+
+    # ===== Sequence interface =====
+
+    def __len__(self) -> int:
+        return len(self._doc_ids)
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self._row(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("chunk index out of range")
+        return self._row(index)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(len(self)):
+            yield self._row(i)
+
+    def __delitem__(self, index: int):
+        if index < 0:
+            index += len(self)
+        self.delete_rows([index])
+
+    def _row(self, i: int) -> Dict:
+        meta = dict(self.documents[self._doc_ids[i]])
+        if self._chunks[i] != NO_CHUNK:
+            meta["chunk"] = self._chunks[i]
+        meta.update(self._extras[self._extra_ids[i]])
+        return meta
+
+    def append(self, meta: Dict):
+        document, extra = {}, {}
+        for key, value in meta.items():
+            if key in DOCUMENT_FIELDS and isinstance(value, str):
+                document[key] = value
+            elif key != "chunk" or not _is_chunk_index(value):
+                extra[key] = value
+
+        doc_key = tuple(document.items())
+        doc_id = self._doc_lookup.get(doc_key)
+        if doc_id is None:
+            doc_id = self._doc_lookup[doc_key] = len(self.documents)
+            self.documents.append(document)
+            self.doc_counts.append(0)
+        extra_id = 0
+        if extra:
+            extra_key = self._extra_key(extra)
+            extra_id = self._extra_lookup.get(extra_key)
+            if extra_id is None:
+                extra_id = self._extra_lookup[extra_key] = len(self._extras)
+                self._extras.append(extra)
+
+        chunk = meta.get("chunk")
+        self.doc_counts[doc_id] += 1
+        self._doc_ids.append(doc_id)
+        self._chunks.append(chunk if _is_chunk_index(chunk) else NO_CHUNK)
+        self._extra_ids.append(extra_id)
+
+    def extend(self, metas: Iterable[Dict]):
+        for meta in metas:
+            self.append(meta)
+
+    def clear(self):
+        self.__init__()
+
+    def copy(self) -> "ChunkMetadata":
+        """An independent copy; the interned dicts are never mutated, so they are shared"""
+        meta = ChunkMetadata()
+        meta.documents = list(self.documents)
+        meta.doc_counts = list(self.doc_counts)
+        meta._extras = list(self._extras)
+        meta._doc_ids = array("i", self._doc_ids)
+        meta._chunks = array("i", self._chunks)
+        meta._extra_ids = array("i", self._extra_ids)
+        meta._doc_lookup = dict(self._doc_lookup)
+        meta._extra_lookup = dict(self._extra_lookup)
+        return meta
+
+    def memory_bytes(self) -> int:
+        """Int columns plus a rough size for the document and extras tables"""
+        columns = sum(column.itemsize * len(column) for column in (self._doc_ids, self._chunks, self._extra_ids))
+        tables = sum(
+            sys.getsizeof(entry) + sum(sys.getsizeof(value) for value in entry.values())
+            for entry in self.documents + self._extras
+        )
+        return columns + tables
+
+    # ===== Document-level access =====
+
+    def doc_ids(self) -> np.ndarray:
+        """Document id per chunk"""
+        return _column(self._doc_ids)
+
+    def document_ids(self, field: str, value) -> List[int]:
+        """Ids of documents whose field equals value"""
+        return [i for i, doc in enumerate(self.documents) if doc.get(field) == value]
+
+    def rows_for(self, field: str, value) -> np.ndarray:
+        """Chunk rows belonging to documents whose field equals value"""
+        ids = self.document_ids(field, value)
+        if not ids:
+            return np.empty(0, dtype=np.intp)
+        return np.flatnonzero(np.isin(self.doc_ids(), ids))
+
+    def chunk_counts(self) -> List[Tuple[Dict, int]]:
+        """(document fields, chunk count) for every document with chunks, in first-seen order"""
+        return [(doc, count) for doc, count in zip(self.documents, self.doc_counts) if count]
+
+    def delete_rows(self, rows: Sequence[int]):
+        """Drop chunk rows, then any document or extras entry no longer used"""
+        keep = np.ones(len(self), dtype=bool)
+        keep[np.asarray(rows, dtype=np.intp)] = False
+        doc_ids = self.doc_ids()[keep]
+        chunks = _column(self._chunks)[keep]
+        extra_ids = _column(self._extra_ids)[keep]
+
+        used_docs = np.unique(doc_ids)
+        if len(used_docs) < len(self.documents):
+            self.documents = [self.documents[i] for i in used_docs]
+            self._doc_lookup = {tuple(doc.items()): i for i, doc in enumerate(self.documents)}
+            doc_ids = np.searchsorted(used_docs, doc_ids).astype(np.int32)
+        # Entry 0 (no extras) always stays
+        used_extras = np.union1d([0], extra_ids).astype(np.int32)
+        if len(used_extras) < len(self._extras):
+            self._extras = [self._extras[i] for i in used_extras]
+            self._extra_lookup = {self._extra_key(extra): i for i, extra in enumerate(self._extras)}
+            extra_ids = np.searchsorted(used_extras, extra_ids).astype(np.int32)
+
+        self.doc_counts = np.bincount(doc_ids, minlength=len(self.documents)).tolist()
+        self._doc_ids = array("i", doc_ids.tobytes())
+        self._chunks = array("i", chunks.tobytes())
+        self._extra_ids = array("i", extra_ids.tobytes())
+
+
+def _column(values: array) -> np.ndarray:
+    # A copy, not a view: an array exporting its buffer can't grow, and ingests append concurrently
+    return np.frombuffer(values.tobytes(), dtype=np.int32)
+
+
+def _is_chunk_index(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and 0 <= value < 2 ** 31
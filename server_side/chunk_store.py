@@ -0,0 +1,292 @@
+"""
+Chunk Text Store
+Chunk texts in an append-only segment file instead of Python strings
+
+Each text is appended to a segment file (zlib-compressed by default) and
+only its offset and length stay in memory, 12 bytes per chunk. Reads go
+through mmap and only happen for the chunks a query returns; a small LRU
+keeps hot ones decoded. Deleting a chunk only drops its offset; the dead
+record stays in the file until a save finds the segment mostly dead and
+compacts it.
+
+A saved segment sits beside its index file as <stem>.<token>.chunks.
+Compaction writes a new segment instead of rewriting the current one, so
+the saved index never points at a half-written file. Stores that have
+never been saved write to an anonymous temporary file.
+"""
+
+import logging
+import mmap
+import os
+import sys
+import tempfile
+import threading
+import uuid
+import zlib
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Compact on save once less than this share of the segment is live
+MIN_LIVE_RATIO = 0.5
+
+
+class ChunkTexts:
+    """List-like sequence of chunk texts backed by a segment file"""
+
+    def __init__(
+        self,
+        compress: bool = True,
+        cache_size: int = 1024,
+        temp_dir: Optional[Path] = None
+    ):
+        self.compress = compress
+        self.cache_size = cache_size
+        self.temp_dir = Path(temp_dir) if temp_dir is not None else None
+
+        self._offsets = array("q")
+        self._lengths = array("I")
+        # Opened on first write; None path means an anonymous temporary file
+        self._path: Optional[Path] = None
+        self._file = None
+        self._writable = True
+        self._end = 0
+        self._mmap: Optional[mmap.mmap] = None
+        self._mapped = 0
+        # Decoded texts keyed by offset, which stays valid across deletes
+        self._cache: "OrderedDict[int, str]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    @classmethod
+    def open(
+        cls,
+        path: Path,
+        state: Dict,
+        cache_size: int = 1024,
+        writable: bool = True,
+        temp_dir: Optional[Path] = None
+    ) -> "ChunkTexts":
+        """Texts saved by persist()/copy_to(); read-only ones are copied before the first write"""
+        texts = cls(state.get("compressed", True), cache_size, temp_dir)
+        texts._offsets = array("q", state["offsets"])
+        texts._lengths = array("I", state["lengths"])
+        texts._path = Path(path)
+        texts._writable = writable
+        texts._file = open(texts._path, "r+b" if writable else "rb", buffering=0)
+        # Appends go after anything already there, even records no index refers to
+        texts._end = os.fstat(texts._file.fileno()).st_size
+        return texts
+
+    # ===== Sequence interface =====
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self._read(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("chunk index out of range")
+        return self._read(index)
+
+    def __iter__(self) -> Iterator[str]:
+        # Full scans (export, re-embedding) bypass the cache so they don't evict hot chunks
+        for i in range(len(self)):
+            yield self._read(i, cache=False)
+
+    def __delitem__(self, index: int):
+        with self._lock:
+            self._cache.pop(self._offsets[index], None)
+            del self._offsets[index]
+            del self._lengths[index]
+
+    def append(self, text: str):
+        data = text.encode("utf-8")
+        if self.compress:
+            data = zlib.compress(data, 1)
+        with self._lock:
+            if self._file is None:
+                self._file = self._temp_file()
+            elif not self._writable:
+                self._make_private()
+            self._file.seek(self._end)
+            self._file.write(data)
+            self._offsets.append(self._end)
+            self._lengths.append(len(data))
+            self._end += len(data)
+
+    def extend(self, texts: Iterable[str]):
+        for text in texts:
+            self.append(text)
+
+    def clear(self):
+        with self._lock:
+            self._offsets = array("q")
+            self._lengths = array("I")
+            self._cache.clear()
+
+    def memory_bytes(self) -> int:
+        """Offsets plus cached texts; the segment itself lives in the page cache"""
+        offsets = self._offsets.itemsize * len(self._offsets) + self._lengths.itemsize * len(self._lengths)
+        return offsets + sum(sys.getsizeof(text) for text in list(self._cache.values()))
+
+    # ===== Reading =====
+
+    def _read(self, index: int, cache: bool = True) -> str:
+        with self._lock:
+            offset, length = self._offsets[index], self._lengths[index]
+            text = self._cache.get(offset)
+            if text is not None:
+                self._cache.move_to_end(offset)
+                return text
+            if offset + length > self._mapped:
+                self._remap()
+            data = self._mmap[offset:offset + length]
+            if cache and self.cache_size > 0:
+                text = self._decode(data)
+                self._cache[offset] = text
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+                return text
+        return self._decode(data)
+
+    def _decode(self, data: bytes) -> str:
+        return (zlib.decompress(data) if self.compress else data).decode("utf-8")
+
+    def _remap(self):
+        # Queries still slicing the old map hold their own reference to it
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mapped = len(self._mmap)
+
+    def _records(self) -> Iterator[bytes]:
+        """Raw live records, in order"""
+        for i in range(len(self)):
+            with self._lock:
+                offset, length = self._offsets[i], self._lengths[i]
+                if offset + length > self._mapped:
+                    self._remap()
+                yield self._mmap[offset:offset + length]
+
+    # ===== Persistence =====
+
+    def _state(self, path: Path) -> Dict:
+        return {
+            "segment": path.name,
+            "offsets": self._offsets,
+            "lengths": self._lengths,
+            "compressed": self.compress
+        }
+
+    def _copy_records(self, f) -> array:
+        """Write the live records to f back to back; returns their new offsets"""
+        offsets = array("q")
+        position = 0
+        for record in self._records():
+            f.write(record)
+            offsets.append(position)
+            position += len(record)
+        return offsets
+
+    def _write_segment(self, path: Path) -> Tuple[array, object]:
+        """Compacted copy of the live records in a new file at path, left open"""
+        f = open(path, "w+b", buffering=0)
+        try:
+            offsets = self._copy_records(f)
+            os.fsync(f.fileno())
+        except Exception:
+            f.close()
+            path.unlink(missing_ok=True)
+            raise
+        return offsets, f
+
+    def _temp_file(self):
+        # Unbuffered like segment files, so the mmap always sees every write
+        if self.temp_dir is not None:
+            self.temp_dir.mkdir(parents=True, exist_ok=True)
+        return tempfile.TemporaryFile(prefix="lola-", suffix=".chunks", dir=self.temp_dir, buffering=0)
+
+    def _make_private(self):
+        """Move to a temporary copy before writing to a read-only (shared) segment"""
+        f = self._temp_file()
+        self._switch(None, f, self._copy_records(f))
+
+    def _switch(self, path: Optional[Path], f, offsets: array):
+        self._path, self._file, self._writable = path, f, True
+        self._offsets = offsets
+        self._end = os.fstat(f.fileno()).st_size
+        self._mmap, self._mapped = None, 0
+        self._cache.clear()
+
+    def persist(self, directory: Path, stem: str) -> Dict:
+        """Make sure every live text is on disk beside directory/stem.pkl; returns the state to save
+
+        Texts already in one of stem's segments stay there unless it is mostly
+        dead records; anything else is written to a new segment.
+        """
+        directory = Path(directory)
+        with self._lock:
+            live = sum(self._lengths)
+            own = (
+                self._path is not None and self._writable and self._path.exists()
+                and self._path.parent == directory and self._path.name.startswith(f"{stem}.")
+            )
+            if own and live >= self._end * MIN_LIVE_RATIO:
+                os.fsync(self._file.fileno())
+                return self._state(self._path)
+
+            target = directory / f"{stem}.{uuid.uuid4().hex[:8]}.chunks"
+            offsets, f = self._write_segment(target)
+            if own:
+                logger.info(f"Compacted {self._path.name}: {self._end - live} dead bytes dropped")
+            self._switch(target, f, offsets)
+            return self._state(target)
+
+    def copy_to(self, path: Path) -> Dict:
+        """Write a compacted copy of the texts to path; this store keeps its own segment"""
+        path = Path(path)
+        with self._lock:
+            offsets, f = self._write_segment(path)
+            f.close()
+            return {**self._state(path), "offsets": offsets}
+
+    def copy(self) -> "ChunkTexts":
+        """An independent copy, on its own temporary segment"""
+        texts = ChunkTexts(self.compress, self.cache_size, self.temp_dir)
+        with self._lock:
+            if len(self):
+                f = texts._temp_file()
+                texts._switch(None, f, self._copy_records(f))
+                texts._lengths = array("I", self._lengths)
+        return texts
+
+
+def remove_stale_segments(directory: Path, stem: str, current: str) -> int:
+    """Delete stem's segments older than current, e.g. ones replaced by compaction
+
+    Processes that still map one keep reading it until they reload. Where a
+    mapped file can't be deleted (Windows), it is left for a later sweep:
+    every save sweeps again, and so does loading the index at startup.
+    Returns how many stale segments are left.
+    """
+    directory = Path(directory)
+    try:
+        newest = (directory / current).stat().st_mtime
+    except OSError:
+        return 0
+    left = 0
+    for segment in directory.glob(f"{stem}.*.chunks"):
+        if segment.name == current:
+            continue
+        try:
+            # Newer ones belong to a save this process hasn't loaded yet
+            if segment.stat().st_mtime < newest:
+                segment.unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"Could not remove stale segment {segment.name}, retrying on the next save: {e}")
+            left += 1
+    return left
@@ -0,0 +1,365 @@
+"""
+Collection Manager
+Named knowledge base collections, each with its own index file
+
+The "default" collection is the original knowledge base file and always
+stays resident. Other collections are loaded on first use and unloaded
+(after saving any changes) once idle, or when loaded collections exceed
+the memory cap, least recently used first.
+"""
+
+import logging
+import re
+import threading
+import time
+from concurrent.futures import Future, wait
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COLLECTION = "default"
+_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+
+def validate_collection_name(name: str) -> str:
+    """Collection names become file names, so keep them to a safe alphabet"""
+    if not _NAME_RE.match(name or ""):
+        raise ValueError(
+            f"Invalid collection name '{name}': use letters, digits, '-' and '_' (max 64)"
+        )
+    return name
+
+
+class CollectionManager:
+    """Lazily loaded, idle-unloaded vector stores keyed by collection name"""
+
+    def __init__(
+        self,
+        store_factory: Callable[[], "SimpleVectorStore"],
+        collections_dir: Path,
+        default_path: Path,
+        idle_seconds: float = 900.0,
+        memory_cap_bytes: int = 0
+    ):
+        self.store_factory = store_factory
+        self.collections_dir = Path(collections_dir)
+        self.default_path = Path(default_path)
+        self.idle_seconds = idle_seconds
+        self.memory_cap_bytes = memory_cap_bytes
+
+        self._stores: Dict[str, "SimpleVectorStore"] = {DEFAULT_COLLECTION: store_factory()}
+        self._last_used: Dict[str, float] = {DEFAULT_COLLECTION: time.monotonic()}
+        self._saved_versions: Dict[str, int] = {DEFAULT_COLLECTION: 0}
+        # Index file mtimes as of load/save, to spot saves by another process
+        self._mtimes: Dict[str, int] = {}
+        # Collections with an ingest in flight are never unloaded under it
+        self._pins: Dict[str, int] = {}
+        # Loads, saves and unloads in progress, run outside the lock; other callers wait on the future
+        self._loading: Dict[str, Future] = {}
+        self._saving: Dict[str, Future] = {}
+        self._unloading: Dict[str, Future] = {}
+        self._lock = threading.RLock()
+        self._reaper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # ===== Lookup =====
+
+    def path_for(self, name: str) -> Path:
+        if name == DEFAULT_COLLECTION:
+            return self.default_path
+        return self.collections_dir / f"{validate_collection_name(name)}.pkl"
+
+    @property
+    def default(self) -> "SimpleVectorStore":
+        return self._stores[DEFAULT_COLLECTION]
+
+    @default.setter
+    def default(self, store: "SimpleVectorStore"):
+        with self._lock:
+            self._stores[DEFAULT_COLLECTION] = store
+            self._saved_versions[DEFAULT_COLLECTION] = store.version
+
+    def names(self) -> List[str]:
+        """Every collection, loaded or on disk"""
+        names = set(self._stores)
+        if self.collections_dir.exists():
+            names.update(p.stem for p in self.collections_dir.glob("*.pkl"))
+        return sorted(names, key=lambda n: (n != DEFAULT_COLLECTION, n))
+
+    def exists(self, name: str) -> bool:
+        return name in self._stores or self.path_for(name).exists()
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._stores
+
+    def get(self, name: str = DEFAULT_COLLECTION, create: bool = False) -> "SimpleVectorStore":
+        """The collection's store, loading it from disk on first use
+
+        The load runs outside the manager lock, so lookups of other
+        collections don't wait for it; callers wanting the same one share it.
+        """
+        name = validate_collection_name(name)
+        while True:
+            with self._lock:
+                unloading = self._unloading.get(name)
+                if unloading is None:
+                    store = self._stores.get(name)
+                    if store is not None:
+                        self._last_used[name] = time.monotonic()
+                        return store
+                    loading = self._loading.get(name)
+                    if loading is None:
+                        path = self.path_for(name)
+                        if not path.exists() and not create:
+                            raise KeyError(f"Collection not found: {name}")
+                        loading = self._loading[name] = Future()
+                        owner = True
+                    else:
+                        owner = False
+                    break
+            # Being saved on its way out; afterwards it is either still loaded or on disk
+            wait([unloading])
+        if not owner:
+            return loading.result()
+
+        try:
+            store = self.store_factory()
+            mtime = None
+            if path.exists():
+                store.load(str(path))
+                mtime = path.stat().st_mtime_ns
+                logger.info(f"Loaded collection '{name}' ({len(store.ids)} chunks)")
+        except BaseException as e:
+            with self._lock:
+                del self._loading[name]
+            loading.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[name]
+            self._stores[name] = store
+            self._saved_versions[name] = store.version
+            if mtime is not None:
+                self._mtimes[name] = mtime
+            self._last_used[name] = time.monotonic()
+        loading.set_result(store)
+        self.enforce_memory_cap(keep=name)
+        return store
+
+    @contextmanager
+    def use(self, name: str = DEFAULT_COLLECTION, create: bool = False) -> Iterator["SimpleVectorStore"]:
+        """get(), pinning the collection in memory until the block exits"""
+        while True:
+            store = self.get(name, create)
+            with self._lock:
+                # Unloaded (or being unloaded) between get() and here; load it again
+                if self._stores.get(name) is store and name not in self._unloading:
+                    self._pins[name] = self._pins.get(name, 0) + 1
+                    break
+        version = store.version
+        try:
+            yield store
+        finally:
+            with self._lock:
+                self._pins[name] -= 1
+                if not self._pins[name]:
+                    del self._pins[name]
+                self._last_used[name] = time.monotonic()
+            if store.version != version:
+                # Ingests grow loaded collections too, not just loads
+                self.enforce_memory_cap(keep=name)
+
+    def swap(self, name: str, store: "SimpleVectorStore") -> bool:
+        """Replace a collection's store, from inside use(); False while anyone else has it in use
+
+        The new store counts as unsaved. Ingests hold their store for their
+        whole run, so swapping under one would lose its remaining chunks.
+        """
+        with self._lock:
+            if name not in self._stores:
+                # Dropped meanwhile; nothing to replace
+                return True
+            if self._pins.get(name, 0) > 1:
+                return False
+            self._stores[name] = store
+            self._saved_versions[name] = None
+            self._last_used[name] = time.monotonic()
+        return True
+
+    def loaded(self) -> Dict[str, "SimpleVectorStore"]:
+        with self._lock:
+            return dict(self._stores)
+
+    # ===== Persistence and unloading =====
+
+    def is_dirty(self, name: str) -> bool:
+        store = self._stores.get(name)
+        return store is not None and store.version != self._saved_versions.get(name)
+
+    def save(self, name: str):
+        """Write a loaded collection to its index file, outside the manager lock
+
+        One save per collection runs at a time; a caller arriving during
+        one waits for it and then saves whatever changed since.
+        """
+        while True:
+            with self._lock:
+                store = self._stores.get(name)
+                if store is None:
+                    return
+                saving = self._saving.get(name)
+                if saving is None:
+                    saving = self._saving[name] = Future()
+                    version = store.version
+                    break
+            wait([saving])
+
+        try:
+            path = self.path_for(name)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            store.save(str(path))
+            mtime = path.stat().st_mtime_ns
+        except BaseException:
+            with self._lock:
+                del self._saving[name]
+            saving.set_result(None)
+            raise
+        with self._lock:
+            del self._saving[name]
+            if self._stores.get(name) is store:
+                # Changes made while saving keep it dirty
+                self._saved_versions[name] = version
+                self._mtimes[name] = mtime
+        saving.set_result(None)
+
+    def save_dirty(self, include_default: bool = True):
+        """Save every loaded collection with unsaved changes"""
+        for name in list(self._stores):
+            if name == DEFAULT_COLLECTION and not include_default:
+                continue
+            if self.is_dirty(name):
+                self.save(name)
+
+    def unload(self, name: str):
+        """Save (if changed) and drop a collection from memory; the default stays
+
+        The save runs outside the manager lock. Callers wanting the
+        collection meanwhile wait, then load it again from the saved file.
+        """
+        if name == DEFAULT_COLLECTION:
+            return
+        with self._lock:
+            if name not in self._stores or name in self._pins or name in self._unloading:
+                return
+            store = self._stores[name]
+            unloading = self._unloading[name] = Future()
+
+        try:
+            if self.is_dirty(name):
+                self.save(name)
+        except BaseException:
+            with self._lock:
+                del self._unloading[name]
+            unloading.set_result(None)
+            raise
+        with self._lock:
+            del self._unloading[name]
+            unloaded = self._stores.get(name) is store and not self.is_dirty(name)
+            if unloaded:
+                self._stores.pop(name)
+                self._last_used.pop(name, None)
+                self._saved_versions.pop(name, None)
+                self._mtimes.pop(name, None)
+        unloading.set_result(None)
+        if unloaded:
+            logger.info(f"Unloaded collection '{name}'")
+
+    def drop(self, name: str):
+        """Delete a collection, its index file and its chunk text segments"""
+        if name == DEFAULT_COLLECTION:
+            raise ValueError("The default collection cannot be deleted; clear it instead")
+        while True:
+            with self._lock:
+                pending = self._loading.get(name) or self._saving.get(name) or self._unloading.get(name)
+                if pending is None:
+                    self._drop(name)
+                    return
+            # Let a load or save in progress finish, so it can't bring the collection back afterwards
+            wait([pending])
+
+    def _drop(self, name: str):
+        with self._lock:
+            self._stores.pop(name, None)
+            self._last_used.pop(name, None)
+            self._saved_versions.pop(name, None)
+            self._mtimes.pop(name, None)
+            self.path_for(name).unlink(missing_ok=True)
+            for segment in self.collections_dir.glob(f"{name}.*.chunks"):
+                segment.unlink(missing_ok=True)
+
+    def refresh_stale(self):
+        """Reload collections another process saved (or drop ones it deleted) since we loaded them"""
+        for name in [n for n in self._stores if n != DEFAULT_COLLECTION]:
+            with self._lock:
+                if name not in self._stores or name in self._pins or self.is_dirty(name):
+                    continue
+                path = self.path_for(name)
+                if not path.exists():
+                    self._stores.pop(name)
+                    self._last_used.pop(name, None)
+                    self._saved_versions.pop(name, None)
+                    self._mtimes.pop(name, None)
+                    continue
+                if path.stat().st_mtime_ns == self._mtimes.get(name):
+                    continue
+                store = self.store_factory()
+                store.load(str(path))
+                self._stores[name] = store
+                self._saved_versions[name] = store.version
+                self._mtimes[name] = path.stat().st_mtime_ns
+            logger.info(f"Reloaded collection '{name}' saved by another process")
+
+    def unload_idle(self):
+        if self.idle_seconds <= 0:
+            return
+        cutoff = time.monotonic() - self.idle_seconds
+        for name, last_used in list(self._last_used.items()):
+            if name != DEFAULT_COLLECTION and last_used < cutoff:
+                self.unload(name)
+
+    def memory_bytes(self) -> int:
+        return sum(store.memory_bytes() for store in list(self._stores.values()))
+
+    def enforce_memory_cap(self, keep: Optional[str] = None):
+        """Unload least recently used collections (other than keep) while over the cap"""
+        if self.memory_cap_bytes <= 0:
+            return
+        with self._lock:
+            by_age = sorted(
+                (n for n in self._stores if n not in (DEFAULT_COLLECTION, keep)),
+                key=lambda n: self._last_used.get(n, 0)
+            )
+        for name in by_age:
+            if self.memory_bytes() <= self.memory_cap_bytes:
+                break
+            self.unload(name)
+
+    def start(self, interval: float = 60.0):
+        """Unload idle collections periodically on a daemon thread"""
+        if self._reaper is not None or self.idle_seconds <= 0:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.unload_idle()
+                    self.enforce_memory_cap()
+                except Exception as e:
+                    logger.error(f"Error unloading idle collections: {e}")
+
+        self._reaper = threading.Thread(target=run, name="collection-reaper", daemon=True)
+        self._reaper.start()
+
+    def stop(self):
+        self._stop.set()
@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings
 from pathlib import Path
-from typing import List
+from typing import Dict, List
 
 class Settings(BaseSettings):
     # App Settings
@@ -10,6 +10,7 @@ class Settings(BaseSettings):
     # Server Settings
     HOST: str = "0.0.0.0"
     PORT: int = 8000
+    WORKERS: int = 1  # Uvicorn worker processes; more than one needs SHARED_INDEX
     
     # CORS Settings
     CORS_ORIGINS: List[str] = [
@@ -26,6 +27,58 @@ class Settings(BaseSettings):
     CHUNK_OVERLAP: int = 50
     TOP_K_RESULTS: int = 3
     MIN_SIMILARITY: float = 0.3
+    CONTEXT_TOKEN_BUDGET: int = 1536  # Prompt tokens (system prompt, history and retrieved context), 0 = unlimited; leaves room for the answer in Ollama's default num_ctx of 2048
+    MODEL_CONTEXT_BUDGETS: Dict[str, int] = {}  # Per-model overrides, e.g. {"llama3.1": 6000}
+    CONTEXT_MIN_TOKENS: int = 640  # Kept for retrieved context however long the history (about one 500-word chunk)
+    
+    # Conversation Memory Settings
+    MEMORY_RECENT_TURNS: int = 6  # Messages replayed verbatim per session (3 exchanges)
+    MEMORY_HISTORY_TOKENS: int = 512  # Fold older turns into the summary once verbatim history exceeds this
+    SUMMARY_MODEL: str = ""  # Model that writes conversation summaries, empty = LLM_MODEL
+    MEMORY_RETENTION_DAYS: int = 30  # Delete a session's server-side memory after this many idle days (checked at startup), 0 = keep
+    
+    # Batch Chat Settings
+    BATCH_SIZE: int = 32  # Questions embedded per request by /chat/batch
+    BATCH_CONCURRENCY: int = 2  # Answers generated in parallel; match Ollama's OLLAMA_NUM_PARALLEL
+    BATCH_RUNS_DIR: str = "batch_runs"  # Per-run answer logs used to resume, under STORAGE_DIR
+    
+    # Re-embedding Settings
+    REEMBED_ON_MODEL_CHANGE: bool = True  # Re-embed in the background when EMBEDDING_MODEL differs from the KB's
+    REEMBED_CHUNKS_PER_SECOND: float = 20.0  # Throttle so queries still get Ollama time, 0 = unthrottled
+    
+    # Vector Search Settings
+    SEARCH_SHARD_SIZE: int = 65536  # Rows scored per shard
+    SEARCH_WORKERS: int = 0  # Thread pool width, 0 = one per CPU core
+    KB_READY_WAIT_SECONDS: float = 2.0  # How long requests wait for a background KB load
+    CHUNK_TEXT_COMPRESSION: bool = True  # zlib-compress chunk texts in their on-disk segment
+    CHUNK_TEXT_CACHE_SIZE: int = 1024  # Decoded chunk texts kept in memory per collection
+    EMBEDDING_REDUCTION: str = ""  # First pass on reduced embeddings: "pca", "truncate" (Matryoshka models), "" = off
+    REDUCED_DIM: int = 256  # Dimensions kept for the first pass
+    RESCORE_CANDIDATES: int = 100  # Shortlist re-scored at full dimension
+    
+    # Deduplication Settings
+    NEAR_DUP_DETECTION: bool = True  # Skip near-identical chunks before embedding
+    NEAR_DUP_MAX_DISTANCE: int = 3  # Max differing SimHash bits (of 64) to count as a duplicate
+    
+    # Vision Settings
+    IMAGE_CAPTIONING: bool = False  # Caption uploaded images in the background so they are searchable
+    CAPTION_MODEL: str = ""  # Vision model used for captions, empty = LLM_MODEL
+    VISION_MAX_SIDE: int = 1024  # Longest edge (px) of images sent to vision models
+    VISION_CACHE_SIZE: int = 256  # Vision answers kept in memory
+    
+    # Watched Folder Settings
+    WATCH_INTERVAL_SECONDS: float = 300.0  # Rescan period for watched folders, 0 = only via /watch/scan
+    WATCH_STATE_FILE: str = "watch_state.json"
+    
+    # Collection Settings
+    COLLECTIONS_DIR: str = "collections"  # Index files of named collections, under STORAGE_DIR
+    COLLECTION_IDLE_SECONDS: float = 900.0  # Unload named collections unused this long, 0 = never
+    COLLECTION_MEMORY_CAP_MB: int = 0  # Unload least recently used collections above this, 0 = no cap
+    
+    # Multi-Process Settings
+    SHARED_INDEX: bool = False  # Share one index between uvicorn workers: one writer, the rest read-only
+    SHARED_INDEX_DIR: str = "shared_index"  # Generations, write spool and writer lock, under STORAGE_DIR
+    SHARED_INDEX_POLL_SECONDS: float = 1.0  # How often readers look for new generations and the writer for spooled writes
     
     # File Upload Settings
     MAX_FILE_SIZE_MB: int = 50
@@ -0,0 +1,171 @@
+"""
+Context Assembler
+Pack retrieved chunks into what is left of a per-model prompt token budget
+
+Neighbouring chunks of one source (chunk i and i+1) are merged into one
+passage with their shared overlap removed. Passages are then added in
+order of relevance until the budget is spent. The budget covers the whole
+prompt, so the system prompt, conversation summary, history and question
+are reserved from it first, except for a minimum kept for the context
+(callers trim history to fit the rest). Anything past the model's context window
+would be truncated by Ollama anyway, after a costly prompt evaluation,
+so it is better to cut it here.
+"""
+
+import logging
+import re
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Passages are only cut to fit when at least this many tokens of budget remain
+MIN_PARTIAL_TOKENS = 64
+# Chat template tokens (role markers, separators) added around each message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English text)"""
+    return (len(text) + 3) // 4
+
+
+def estimate_prompt_tokens(messages: List[Dict]) -> int:
+    """Rough token count of chat messages ({"role", "content"}), template included"""
+    return sum(estimate_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def skip_words(text: str, count: int) -> str:
+    """text without its first count words, keeping the rest's line breaks and spacing"""
+    if count <= 0:
+        return text
+    match = re.match(r"\s*(?:\S+(?:\s+|$)){%d}" % count, text)
+    return text[match.end():] if match else ""
+
+
+def overlap_words(previous: List[str], following: List[str], max_overlap: int) -> int:
+    """Length of the longest suffix of previous that is also a prefix of following"""
+    for size in range(min(max_overlap, len(previous), len(following)), 0, -1):
+        if previous[-size:] == following[:size]:
+            return size
+    return 0
+
+
+class ContextAssembler:
+    """Merge adjacent chunks, strip their overlap and pack to a token budget"""
+
+    def __init__(
+        self,
+        default_budget: int = 1536,
+        model_budgets: Optional[Dict[str, int]] = None,
+        max_overlap: int = 100,
+        min_context_tokens: int = 640
+    ):
+        self.default_budget = default_budget
+        self.model_budgets = model_budgets or {}
+        self.max_overlap = max_overlap
+        # Kept for retrieved context however much of the budget the rest of the prompt takes
+        self.min_context_tokens = min_context_tokens
+
+    def budget_for(self, model: Optional[str]) -> int:
+        """Prompt token budget for a model ("name:tag", then "name", then the default); 0 = unlimited"""
+        if model:
+            if model in self.model_budgets:
+                return self.model_budgets[model]
+            base = model.split(":", 1)[0]
+            if base in self.model_budgets:
+                return self.model_budgets[base]
+        return self.default_budget
+
+    def history_budget(self, model: Optional[str]) -> Optional[int]:
+        """Prompt tokens the rest of the prompt may take beside the context's minimum; None = unlimited"""
+        limit = self.budget_for(model)
+        if not limit:
+            return None
+        return max(limit - self.min_context_tokens, 0)
+
+    def _passages(self, hits: List[Dict]) -> List[Dict]:
+        """Group hits into runs of consecutive chunks per source"""
+        by_source: Dict[str, List[Dict]] = {}
+        for hit in hits:
+            by_source.setdefault(hit["meta"].get("source", hit["source"]), []).append(hit)
+
+        passages = []
+        for source_hits in by_source.values():
+            source_hits.sort(key=lambda h: (h["meta"].get("chunk") is None, h["meta"].get("chunk") or 0))
+            run = None
+            for hit in source_hits:
+                chunk = hit["meta"].get("chunk")
+                if run is not None and chunk is not None and run["last_chunk"] is not None and chunk == run["last_chunk"] + 1:
+                    words = hit["document"].split()
+                    overlap = overlap_words(run["words"], words, self.max_overlap)
+                    run["words"].extend(words[overlap:])
+                    # Cut the overlap off the original text, so rows and code lines stay intact
+                    rest = skip_words(hit["document"], overlap)
+                    if rest:
+                        run["text"] += "\n" + rest
+                    run["overlap_words"] += overlap
+                    run["last_chunk"] = chunk
+                    run["chunks"] += 1
+                    run["similarity"] = max(run["similarity"], hit["similarity"])
+                    continue
+                run = {
+                    "source": hit["source"],
+                    "words": hit["document"].split(),
+                    "text": hit["document"],
+                    "last_chunk": chunk,
+                    "chunks": 1,
+                    "overlap_words": 0,
+                    "similarity": hit["similarity"]
+                }
+                passages.append(run)
+
+        passages.sort(key=lambda p: p["similarity"], reverse=True)
+        return passages
+
+    def assemble(self, hits: List[Dict], model: Optional[str] = None, reserved_tokens: int = 0) -> Dict:
+        """Build the context string from hits ({"document", "meta", "source", "similarity"})
+
+        reserved_tokens is the rest of the prompt (system prompt, summary,
+        history, question), which the context has to fit beside; it still gets
+        min_context_tokens if the rest takes more than its share. Returns the
+        context, its sources in relevance order and token accounting:
+        naive_tokens (top-k joined verbatim), tokens (what is sent) and tokens_saved.
+        """
+        limit = self.budget_for(model)
+        budget = max(limit - reserved_tokens, min(limit, self.min_context_tokens)) if limit else 0
+        naive_tokens = estimate_tokens("\n\n".join(hit["document"] for hit in hits))
+
+        parts, sources = [], []
+        used = truncated = 0
+        passages = self._passages(hits)
+        for passage in passages:
+            tokens = estimate_tokens(passage["text"])
+            remaining = budget - used
+            if limit and tokens > remaining:
+                if remaining < MIN_PARTIAL_TOKENS:
+                    break
+                # Cut on a word boundary at the remaining budget
+                passage["text"] = passage["text"][:remaining * 4].rsplit(None, 1)[0].rstrip()
+                tokens = estimate_tokens(passage["text"])
+                truncated += 1
+            parts.append(passage["text"])
+            used += tokens
+            if passage["source"] not in sources:
+                sources.append(passage["source"])
+            if limit and used >= budget:
+                break
+
+        context = "\n\n".join(parts)
+        packed_tokens = estimate_tokens(context)
+        return {
+            "context": context,
+            "sources": sources,
+            "budget": budget,
+            "naive_tokens": naive_tokens,
+            "tokens": packed_tokens,
+            "tokens_saved": max(0, naive_tokens - packed_tokens),
+            "chunks_merged": sum(p["chunks"] - 1 for p in passages),
+            "overlap_words_removed": sum(p["overlap_words"] for p in passages),
+            "passages_truncated": truncated,
+            "passages_dropped": len(passages) - len(parts)
+        }
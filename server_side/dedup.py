@@ -0,0 +1,151 @@
+"""
+Near-Duplicate Detection
+64-bit SimHash fingerprints with banded lookup
+
+Two chunks are near-duplicates when their fingerprints differ in at most
+max_distance bits. Splitting the fingerprint into max_distance + 1 bands
+guarantees (pigeonhole) that any such pair agrees exactly on one band, so a
+lookup only compares against fingerprints sharing a band value.
+"""
+
+import hashlib
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"\w+")
+_BIT_WEIGHTS = np.uint64(1) << np.arange(64, dtype=np.uint64)
+
+
+@lru_cache(maxsize=1 << 16)
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+
+
+def _mix(z: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, so combined shingle hashes have independent bits"""
+    z = z ^ (z >> np.uint64(30))
+    z = z * np.uint64(0xBF58476D1CE4E5B9)
+    z = z ^ (z >> np.uint64(27))
+    z = z * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def simhash(text: str, shingle: int = 3) -> Optional[int]:
+    """SimHash of word shingles; None when the text is too short to fingerprint"""
+    tokens = _TOKEN_RE.findall(text.lower())
+    if len(tokens) < shingle * 4:
+        return None
+
+    # Shingle hashes are combined from cached token hashes with wrapping uint64 math
+    token_hashes = np.fromiter(map(_token_hash, tokens), dtype=np.uint64, count=len(tokens))
+    n = len(tokens) - shingle + 1
+    combined = np.zeros(n, dtype=np.uint64)
+    for offset in range(shingle):
+        combined = combined * np.uint64(0x100000001B3) + token_hashes[offset:offset + n]
+    hashes = np.unique(_mix(combined))
+
+    # Each feature votes +1/-1 per bit; the fingerprint keeps the majority
+    bits = (hashes[:, None] >> np.arange(64, dtype=np.uint64)) & np.uint64(1)
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(hashes)
+    return int((_BIT_WEIGHTS * (votes > 0)).sum(dtype=np.uint64))
+
+
+class SimHashIndex:
+    """Fingerprints of stored chunks, grouped by source for pruning"""
+
+    def __init__(self, max_distance: int = 3):
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        width = 64 // self.bands
+        self._shifts = [i * width for i in range(self.bands)]
+        self._masks = [
+            (1 << (64 - shift if i == self.bands - 1 else width)) - 1
+            for i, shift in enumerate(self._shifts)
+        ]
+
+        self._tables: List[Dict[int, Set[int]]] = [{} for _ in range(self.bands)]
+        self._refcounts: Dict[int, int] = {}
+        self._sources: Dict[str, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._refcounts)
+
+    def _band_keys(self, fingerprint: int) -> Iterable[int]:
+        for shift, mask in zip(self._shifts, self._masks):
+            yield (fingerprint >> shift) & mask
+
+    def source_counts(self, source: str) -> Dict[int, int]:
+        """How many times each fingerprint was added for source"""
+        counts: Dict[int, int] = {}
+        for fp in self._sources.get(source, ()):
+            counts[fp] = counts.get(fp, 0) + 1
+        return counts
+
+    def find(
+        self,
+        fingerprint: int,
+        ignore_source: Optional[str] = None,
+        ignored: Optional[Dict[int, int]] = None
+    ) -> Optional[int]:
+        """A stored fingerprint within max_distance bits, if any
+
+        Fingerprints that only belong to ignore_source (e.g. the old version of
+        a file being replaced) don't count. Callers checking many fingerprints
+        against one source pass its source_counts() as ignored instead.
+        """
+        if ignored is None:
+            ignored = self.source_counts(ignore_source) if ignore_source is not None else {}
+
+        def live(candidate: int) -> bool:
+            return self._refcounts[candidate] > ignored.get(candidate, 0)
+
+        if fingerprint in self._refcounts and live(fingerprint):
+            return fingerprint
+        for table, key in zip(self._tables, self._band_keys(fingerprint)):
+            for candidate in table.get(key, ()):
+                if bin(candidate ^ fingerprint).count("1") <= self.max_distance and live(candidate):
+                    return candidate
+        return None
+
+    def add(self, fingerprint: int, source: str):
+        self._sources.setdefault(source, []).append(fingerprint)
+        count = self._refcounts.get(fingerprint, 0)
+        self._refcounts[fingerprint] = count + 1
+        if count == 0:
+            for table, key in zip(self._tables, self._band_keys(fingerprint)):
+                table.setdefault(key, set()).add(fingerprint)
+
+    def remove_source(self, source: str):
+        for fingerprint in self._sources.pop(source, []):
+            count = self._refcounts[fingerprint] - 1
+            if count:
+                self._refcounts[fingerprint] = count
+                continue
+            del self._refcounts[fingerprint]
+            for table, key in zip(self._tables, self._band_keys(fingerprint)):
+                bucket = table.get(key)
+                if bucket is not None:
+                    bucket.discard(fingerprint)
+                    if not bucket:
+                        del table[key]
+
+    def clear(self):
+        for table in self._tables:
+            table.clear()
+        self._refcounts.clear()
+        self._sources.clear()
+
+    def to_dict(self) -> Dict:
+        """Serializable form: fingerprints per source"""
+        return {"max_distance": self.max_distance, "sources": self._sources}
+
+    @classmethod
+    def from_dict(cls, data: Dict, max_distance: int) -> "SimHashIndex":
+        index = cls(max_distance)
+        for source, fingerprints in data.get("sources", {}).items():
+            for fingerprint in fingerprints:
+                index.add(fingerprint, source)
+        return index
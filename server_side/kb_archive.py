@@ -0,0 +1,277 @@
+"""
+Knowledge Base Archive
+Portable export/import of a vector store without re-embedding
+
+An archive is a zip file holding:
+    manifest.json   format version, embedding model, dimension, chunk count
+                    and a SHA-256 per member
+    embeddings.npy  float32 (chunks, dim) matrix, row i belongs to line i
+    chunks.jsonl    {"id", "text", "metadata"} per chunk
+    files.json      content hash and chunk count per ingested file
+
+Both directions stream: export writes the matrix a block of rows at a
+time and import reads rows and chunk lines in step, adding them to the
+store in bulk. Import never calls Ollama. It refuses archives made with
+a different embedding model or dimension, skips files the knowledge base
+already has, and drops exact and near-duplicate chunks.
+
+Usage (server stopped, or it overwrites the file on shutdown):
+    python kb_archive.py export storage/knowledge_base.pkl kb.zip
+    python kb_archive.py import kb.zip storage/knowledge_base.pkl
+    python kb_archive.py verify kb.zip
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+import zipfile
+from contextlib import nullcontext
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, IO, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMAT = "lola-kb-archive"
+ARCHIVE_VERSION = 1
+# Rows per block when streaming embeddings in or out
+BLOCK_ROWS = 4096
+
+
+class _HashingWriter:
+    """File wrapper that hashes everything written through it"""
+
+    def __init__(self, f: IO[bytes]):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data) -> int:
+        data = memoryview(data).cast("B")
+        self.sha256.update(data)
+        return self.f.write(data)
+
+
+def read_manifest(archive: zipfile.ZipFile) -> Dict:
+    """The archive's manifest, checked for format and version"""
+    try:
+        manifest = json.loads(archive.read("manifest.json"))
+    except KeyError:
+        raise ValueError("Not a knowledge base archive: manifest.json is missing")
+    if manifest.get("format") != ARCHIVE_FORMAT:
+        raise ValueError("Not a knowledge base archive: unknown format")
+    if manifest.get("version", 0) > ARCHIVE_VERSION:
+        raise ValueError(f"Archive version {manifest['version']} is newer than this server supports")
+    return manifest
+
+
+def verify_archive(path) -> Dict:
+    """Check every member against its manifest checksum; returns the manifest"""
+    with zipfile.ZipFile(path) as archive:
+        manifest = read_manifest(archive)
+        for name, expected in manifest["checksums"].items():
+            sha256 = hashlib.sha256()
+            with archive.open(name) as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    sha256.update(block)
+            if sha256.hexdigest() != expected:
+                raise ValueError(f"Checksum mismatch for {name}: the archive is corrupt")
+    return manifest
+
+
+def export_archive(store: "SimpleVectorStore", path, embedding_model: str, collection: Optional[str] = None) -> Dict:
+    """Write store to a zip archive at path; returns the manifest"""
+    start = time.perf_counter()
+    count, dim = len(store.ids), store.dim
+    checksums = {}
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        # Float matrices barely compress, so store them as-is
+        with archive.open(zipfile.ZipInfo("embeddings.npy", date_time=time.localtime()[:6]), "w", force_zip64=True) as raw:
+            f = _HashingWriter(raw)
+            np.lib.format.write_array_header_1_0(
+                f, {"descr": np.lib.format.dtype_to_descr(np.dtype("<f4")), "fortran_order": False, "shape": (count, dim)}
+            )
+            embeddings = store.embeddings
+            for row in range(0, count, BLOCK_ROWS):
+                f.write(np.ascontiguousarray(embeddings[row:row + BLOCK_ROWS], dtype="<f4"))
+            checksums["embeddings.npy"] = f.sha256.hexdigest()
+
+        with archive.open("chunks.jsonl", "w", force_zip64=True) as raw:
+            f = _HashingWriter(raw)
+            for id_, doc, meta in zip(store.ids, store.documents, store.metadatas):
+                f.write((json.dumps({"id": id_, "text": doc, "metadata": meta}, default=str) + "\n").encode("utf-8"))
+            checksums["chunks.jsonl"] = f.sha256.hexdigest()
+
+        files = json.dumps(store.files, default=str).encode("utf-8")
+        archive.writestr("files.json", files)
+        checksums["files.json"] = hashlib.sha256(files).hexdigest()
+
+        manifest = {
+            "format": ARCHIVE_FORMAT,
+            "version": ARCHIVE_VERSION,
+            "created": datetime.now().isoformat(),
+            "collection": collection,
+            "embedding_model": embedding_model,
+            "dim": dim,
+            "chunks": count,
+            "files": len(store.files),
+            "checksums": checksums
+        }
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+
+    logger.info(f"Exported {count} chunks to {path} in {time.perf_counter() - start:.1f} s")
+    return manifest
+
+
+def import_archive(
+    store: "SimpleVectorStore",
+    path,
+    embedding_model: Optional[str] = None,
+    lock: Optional[threading.RLock] = None
+) -> Dict:
+    """Merge an archive into store without re-embedding; returns an import report
+
+    embedding_model, if given, must match the archive's. A store without a
+    recorded model takes the archive's if it is empty or embedding_model
+    vouched for it. Chunks are added a
+    block at a time under lock, so queries and other writers interleave.
+    """
+    start = time.perf_counter()
+    manifest = verify_archive(path)
+    if embedding_model and manifest["embedding_model"] != embedding_model:
+        raise ValueError(
+            f"Archive embeddings come from '{manifest['embedding_model']}', "
+            f"this knowledge base uses '{embedding_model}'"
+        )
+    if store.dim and manifest["chunks"] and manifest["dim"] != store.dim:
+        raise ValueError(f"Archive embeddings have {manifest['dim']} dimensions, this knowledge base {store.dim}")
+    if not store.embedding_model and (embedding_model or not store.ids):
+        # An empty knowledge base takes on the archive's model, so it's queried with it
+        store.embedding_model = manifest["embedding_model"]
+
+    report = {
+        "chunks_total": manifest["chunks"],
+        "chunks_imported": 0,
+        "exact_duplicates": 0,
+        "near_duplicates": 0,
+        "sources_imported": 0,
+        "sources_skipped": 0
+    }
+    lock = lock or nullcontext()
+
+    with zipfile.ZipFile(path) as archive:
+        files = json.loads(archive.read("files.json"))
+        # Files the knowledge base already has keep their current version
+        with lock:
+            skipped = {source for source in files if store.has_source(source)}
+        report["sources_skipped"] = len(skipped)
+
+        with archive.open("embeddings.npy") as matrix, archive.open("chunks.jsonl") as chunks:
+            version = np.lib.format.read_magic(matrix)
+            read_header = (
+                np.lib.format.read_array_header_1_0 if version == (1, 0)
+                else np.lib.format.read_array_header_2_0
+            )
+            shape, fortran_order, dtype = read_header(matrix)
+            if fortran_order or dtype != np.dtype("<f4") or shape != (manifest["chunks"], manifest["dim"]):
+                raise ValueError("Archive embeddings do not match the manifest")
+
+            row_bytes = shape[1] * dtype.itemsize
+            for row in range(0, shape[0], BLOCK_ROWS):
+                rows = min(BLOCK_ROWS, shape[0] - row)
+                block = np.frombuffer(matrix.read(rows * row_bytes), dtype=dtype).reshape(rows, shape[1])
+                batch = {"ids": [], "embeddings": [], "documents": [], "metadatas": [], "fingerprints": []}
+                with lock:
+                    for i in range(rows):
+                        chunk = json.loads(chunks.readline())
+                        if chunk["metadata"].get("source") in skipped:
+                            continue
+                        duplicate, fingerprint = store.find_duplicate(chunk["text"])
+                        if duplicate:
+                            report[f"{duplicate}_duplicates"] += 1
+                            continue
+                        for key, value in zip(batch, (chunk["id"], block[i], chunk["text"], chunk["metadata"], fingerprint)):
+                            batch[key].append(value)
+                    if batch["ids"]:
+                        rows_before = len(store.ids)
+                        store.add(**batch)
+                        report["chunks_imported"] += len(store.ids) - rows_before
+
+        with lock:
+            for source, entry in files.items():
+                if source not in skipped and store.has_source(source):
+                    store.record_file(source, entry)
+                    report["sources_imported"] += 1
+
+    report["seconds"] = round(time.perf_counter() - start, 3)
+    logger.info(
+        f"Imported {report['chunks_imported']} of {report['chunks_total']} chunks from {path} "
+        f"({report['exact_duplicates'] + report['near_duplicates']} duplicates, "
+        f"{report['sources_skipped']} files already present)"
+    )
+    return report
+
+
+def _cli_embedding_model(store: "SimpleVectorStore", flag: Optional[str], parser) -> Optional[str]:
+    """The knowledge base's embedding model, checked against --embedding-model"""
+    if store.embedding_model and flag and flag != store.embedding_model:
+        parser.error(f"The knowledge base was embedded with '{store.embedding_model}', not '{flag}'")
+    return store.embedding_model or flag
+
+
+def main():
+    import argparse
+
+    from config import settings
+    from rag_engine import SimpleVectorStore
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_cmd = commands.add_parser("export", help="Write a knowledge base file to an archive")
+    export_cmd.add_argument("kb", type=Path)
+    export_cmd.add_argument("archive", type=Path)
+    export_cmd.add_argument("--embedding-model", help="Model of a knowledge base file that doesn't record one")
+    import_cmd = commands.add_parser("import", help="Merge an archive into a knowledge base file")
+    import_cmd.add_argument("archive", type=Path)
+    import_cmd.add_argument("kb", type=Path)
+    import_cmd.add_argument("--embedding-model", help="Model of a knowledge base file that doesn't record one")
+    verify_cmd = commands.add_parser("verify", help="Check an archive's checksums")
+    verify_cmd.add_argument("archive", type=Path)
+    args = parser.parse_args()
+
+    if args.command == "verify":
+        manifest = verify_archive(args.archive)
+        print(f"OK: {manifest['chunks']} chunks, {manifest['dim']} dimensions, {manifest['embedding_model']}")
+        return
+
+    store = SimpleVectorStore(
+        near_dup_distance=settings.NEAR_DUP_MAX_DISTANCE if settings.NEAR_DUP_DETECTION else None,
+        text_compression=settings.CHUNK_TEXT_COMPRESSION,
+        text_cache_size=settings.CHUNK_TEXT_CACHE_SIZE,
+        text_dir=args.kb.parent
+    )
+    if args.command == "export":
+        store.load(str(args.kb))
+        embedding_model = _cli_embedding_model(store, args.embedding_model, parser)
+        if not embedding_model:
+            parser.error(f"{args.kb} doesn't record its embedding model, pass --embedding-model")
+        manifest = export_archive(store, args.archive, embedding_model)
+        print(f"Exported {manifest['chunks']} chunks to {args.archive}")
+    else:
+        if args.kb.exists():
+            store.load(str(args.kb))
+        embedding_model = _cli_embedding_model(store, args.embedding_model, parser)
+        if store.ids and not embedding_model:
+            parser.error(f"{args.kb} doesn't record its embedding model, pass --embedding-model")
+        # An empty knowledge base adopts the archive's model
+        report = import_archive(store, args.archive, embedding_model)
+        args.kb.parent.mkdir(parents=True, exist_ok=True)
+        store.save(str(args.kb))
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
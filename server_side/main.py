@@ -1,25 +1,52 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, status
+import time
+_startup_t0 = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, UploadFile, File, Request, Response, status
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from rag_engine import RAGChatbot
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse, FileResponse
+from rag_engine import build_chatbot, LazyModule, DocumentProcessor
 from schemas import (
     ChatRequest, ChatResponse, AddDocumentRequest,
     UploadResponse, DocumentListResponse, StatusResponse,
     ErrorResponse, HealthResponse, DeleteDocumentRequest,
-    ModelListResponse, ModelSwitchRequest
+    ModelListResponse, ModelSwitchRequest, ModelStatsResponse,
+    WatchFolderRequest, UnwatchFolderRequest, WatchScanRequest, ReembedRequest,
+    AppendChatMessagesRequest
 )
+from watcher import FolderWatcher
+from collection_manager import DEFAULT_COLLECTION, validate_collection_name
+from memory import validate_session_id
+from chat_log import ChatLog, ChatConflict
+from batch_chat import BatchRunner, parse_items, run_id_for, validate_run_id
+from kb_archive import verify_archive
+from reembed import EmbeddingMigration
+from shared_index import WriterLock, IndexGenerations, GenerationFollower, WriteSpool
 from config import settings
+from metrics import metrics, MetricsMiddleware, track_queue, track_cache
 from pathlib import Path
 import shutil
+import hashlib
 import logging
 from datetime import datetime
 import json
 from pathlib import Path
 from datetime import datetime
-import ollama
+from typing import Dict, Optional
+import aiofiles
+import asyncio
+import os
+import threading
+import uuid
+import zipfile
+
+ollama = LazyModule("ollama")
+
+# Milliseconds spent in each startup phase, measured from module import
+startup_phases = {"imports": (time.perf_counter() - _startup_t0) * 1000}
 
 CHAT_STORAGE_DIR = Path("storage/chats")
-CHAT_STORAGE_DIR.mkdir(parents=True, exist_ok=True)
+chat_log = ChatLog(CHAT_STORAGE_DIR)
 
 # Setup logging
 logging.basicConfig(
@@ -43,24 +70,204 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 # Initialize chatbot
 try:
-    chatbot = RAGChatbot(
-        model=settings.LLM_MODEL,
-        embedding_model=settings.EMBEDDING_MODEL
-    )
-    
-    # Try to load existing knowledge base
-    kb_path = settings.STORAGE_DIR / settings.KB_FILE
-    if kb_path.exists():
-        chatbot.load_knowledge_base(str(kb_path))
-        logger.info(f"Loaded existing knowledge base from {kb_path}")
+    phase_start = time.perf_counter()
+    chatbot = build_chatbot(settings)
+    startup_phases["chatbot_init"] = (time.perf_counter() - phase_start) * 1000
     
 except Exception as e:
     logger.error(f"Failed to initialize chatbot: {e}")
     raise
 
+# Knowledge base gauges are computed on scrape, never on the request path
+metrics.gauge(
+    "lola_vector_store_chunks", "Chunks stored in loaded collections",
+    fn=lambda: sum(len(store.ids) for store in chatbot.collections.loaded().values())
+)
+metrics.gauge(
+    "lola_vector_store_memory_bytes", "Approximate memory held by embeddings and chunk text",
+    fn=lambda: chatbot.collections.memory_bytes()
+)
+metrics.gauge(
+    "lola_collections_loaded", "Collections currently loaded in memory",
+    fn=lambda: len(chatbot.collections.loaded())
+)
+track_queue("vector_search", lambda: chatbot.vector_store.search_queue_depth())
+track_queue("image_captioning", lambda: chatbot.captioner.queue_depth() if chatbot.captioner else 0)
+track_cache("vision_answers", chatbot.vision_answers.hit_ratio)
+track_queue("memory_summaries", chatbot.memory.queue_depth)
+
+# Offline/bulk question answering; answers are logged per run so runs can resume
+batch_runner = BatchRunner(
+    chatbot,
+    settings.STORAGE_DIR / settings.BATCH_RUNS_DIR,
+    batch_size=settings.BATCH_SIZE,
+    concurrency=settings.BATCH_CONCURRENCY
+)
+track_queue("batch_chat", batch_runner.queue_depth)
+
+
+def save_kb_in_background():
+    """Persist the knowledge base after a folder scan or spooled writes changed it"""
+    try:
+        chatbot.save_knowledge_base(str(settings.STORAGE_DIR / settings.KB_FILE))
+    except Exception as e:
+        logger.error(f"Error saving knowledge base after background change: {e}")
+
+
+# Re-embeds the knowledge base when the embedding model changes; saved after each swap
+migration = EmbeddingMigration(
+    chatbot,
+    chunks_per_second=settings.REEMBED_CHUNKS_PER_SECOND,
+    on_swap=lambda name: save_kb_in_background()
+)
+track_queue("reembed", migration.remaining)
+
+
+def start_migration_if_needed():
+    """Start re-embedding if the loaded knowledge base predates the configured model (writer only)"""
+    if settings.REEMBED_ON_MODEL_CHANGE and chatbot.is_ready and migration.needed(chatbot.embedding_model):
+        migration.start(chatbot.embedding_model)
+
+
+watcher = FolderWatcher(
+    chatbot,
+    state_path=settings.STORAGE_DIR / settings.WATCH_STATE_FILE,
+    allowed_extensions=settings.ALLOWED_EXTENSIONS,
+    interval=settings.WATCH_INTERVAL_SECONDS,
+    on_change=save_kb_in_background
+)
+
+# ============ Multi-Process Mode ============
+
+# With SHARED_INDEX the first worker to take the lock becomes the writer. The
+# others serve queries from memory-mapped index generations and queue writes.
+shared_role: Optional[str] = None
+generations = spool = follower = writer_lock = None
+if settings.SHARED_INDEX:
+    shared_dir = settings.STORAGE_DIR / settings.SHARED_INDEX_DIR
+    writer_lock = WriterLock(shared_dir / "writer.lock")
+    generations = IndexGenerations(shared_dir / "generations")
+    spool = WriteSpool(shared_dir / "spool")
+    shared_role = "writer" if writer_lock.acquire() else "reader"
+
+    if shared_role == "writer":
+        chatbot.generations = generations
+    else:
+        def adopt_generation(name: str, store):
+            chatbot.use_shared_store(store)
+            chatbot.collections.refresh_stale()
+            logger.info(f"Serving index generation {name} ({len(store.ids)} chunks)")
+
+        follower = GenerationFollower(
+            generations,
+            chatbot.collections.store_factory,
+            adopt_generation,
+            interval=settings.SHARED_INDEX_POLL_SECONDS
+        )
+    logger.info(f"Shared index: process {os.getpid()} is the {shared_role}")
+
+
+def is_reader() -> bool:
+    return shared_role == "reader"
+
+
+def queue_for_writer(op: str, **args) -> str:
+    """Hand a write to the writer process; it is applied within a poll interval"""
+    job_id = spool.submit(op, **args)
+    logger.info(f"Queued {op} for the writer process ({job_id})")
+    return job_id
+
+
+def publish_generation():
+    """Publish the loaded knowledge base for reader processes (writer only)"""
+    if chatbot.generations is None or not chatbot.is_ready:
+        return
+    try:
+        chatbot.generations.publish(chatbot.vector_store)
+    except Exception as e:
+        logger.error(f"Error publishing index generation: {e}")
+
+
+def apply_spooled_write(op: str, args: Dict):
+    """Run a write queued by a reader process (writer only)"""
+    chatbot.wait_until_ready()
+    collection = args.get("collection", DEFAULT_COLLECTION)
+    if op == "ingest":
+        report = chatbot.ingest_document(
+            args["path"], args.get("metadata"),
+            content_hash=args.get("content_hash"), collection=collection
+        )
+        if not report["success"]:
+            logger.error(f"Queued ingest failed: {args['path']}")
+    elif op == "delete":
+        if chatbot.delete_document(args["filename"], collection):
+            (upload_dir_for(collection) / args["filename"]).unlink(missing_ok=True)
+    elif op == "clear":
+        chatbot.clear_knowledge_base(collection)
+    elif op == "drop_collection":
+        with chatbot._store_lock:
+            chatbot.collections.drop(collection)
+        shutil.rmtree(upload_dir_for(collection), ignore_errors=True)
+    elif op == "watch_add":
+        watcher.add_folder(args["path"], args.get("recursive", True))
+        watcher.request_scan()
+    elif op == "watch_remove":
+        watcher.remove_folder(args["path"], args.get("purge", True))
+    elif op == "watch_scan":
+        watcher.request_scan()
+    elif op == "import":
+        try:
+            chatbot.import_archive(args["path"], collection)
+        finally:
+            Path(args["path"]).unlink(missing_ok=True)
+    elif op == "reembed":
+        chatbot.embedding_model = args["model"]
+        migration.start(args["model"])
+    elif op != "save":
+        logger.warning(f"Unknown spooled write: {op}")
+
+def resolve_collection(name: str, create: bool = False) -> str:
+    """Validate a collection name, mapping bad or unknown names to 400/404"""
+    try:
+        validate_collection_name(name)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if not create and not chatbot.collections.exists(name):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Collection not found: {name}"
+        )
+    return name
+
+
+def upload_dir_for(collection: str) -> Path:
+    """Uploads of named collections live in their own subdirectory"""
+    if collection == DEFAULT_COLLECTION:
+        return settings.UPLOAD_DIR
+    return settings.UPLOAD_DIR / collection
+
+
+# Keeps this process's ETags apart from another worker's, or an earlier run's
+ETAG_PREFIX = uuid.uuid4().hex[:8]
+
+def kb_etag(*parts) -> str:
+    """ETag for a response fully determined by parts (store versions, status fields)"""
+    return f'"{ETAG_PREFIX}-{hashlib.md5(repr(parts).encode()).hexdigest()[:16]}"'
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Tag the response with etag; returns a 304 to send instead if the client's copy is current"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    if etag in tags or "*" in tags:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
+
 # ============ Exception Handlers ============
 
 @app.exception_handler(Exception)
@@ -74,19 +281,54 @@ async def global_exception_handler(request, exc):
         ).dict()
     )
 
+async def ensure_kb_ready():
+    """Wait briefly for a background KB load, then reject writes that would race it"""
+    if chatbot.is_ready:
+        return
+    ready = await asyncio.to_thread(chatbot.wait_until_ready, settings.KB_READY_WAIT_SECONDS)
+    if not ready:
+        detail = f"Knowledge base is {chatbot.kb_status}"
+        if chatbot.kb_status == "loading":
+            detail += f" ({chatbot.kb_progress:.0%})"
+        elif chatbot.kb_error:
+            detail += f": {chatbot.kb_error}"
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers={"Retry-After": "2"}
+        )
+
 # ============ Health & Status Endpoints ============
 
 @app.get("/health", response_model=HealthResponse)
-async def health_check():
+async def health_check(request: Request, response: Response):
     """Check API health and status"""
-    stats = chatbot.get_stats()
+    store = chatbot.vector_store
+    etag = kb_etag(
+        store.version, chatbot.model, chatbot.embedding_model,
+        chatbot.ollama_connected, chatbot.kb_status, round(chatbot.kb_progress, 3)
+    )
+    cached = not_modified(request, response, etag)
+    if cached is not None:
+        return cached
     return HealthResponse(
         status="healthy",
         models={
             "llm": chatbot.model,
             "embedding": chatbot.embedding_model
         },
-        vector_store_size=stats["total_chunks"]
+        vector_store_size=len(store.ids),
+        ollama_connected=chatbot.ollama_connected,
+        kb_status=chatbot.kb_status,
+        kb_progress=round(chatbot.kb_progress, 3)
+    )
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Expose metrics in Prometheus text format"""
+    return PlainTextResponse(
+        metrics.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
     )
 
 @app.get("/")
@@ -101,6 +343,7 @@ async def root():
             "upload": "/upload",
             "documents": "/documents",
             "models": "/models",
+            "metrics": "/metrics",
             "docs": "/docs"
         }
     }
@@ -208,11 +451,33 @@ async def get_current_model():
         "embedding_model": chatbot.embedding_model
     }
 
+@app.get("/stats/startup")
+async def get_startup_stats():
+    """Time spent in each startup phase, in milliseconds"""
+    return {
+        "phases_ms": {name: round(ms, 2) for name, ms in startup_phases.items()},
+        "ollama_connected": chatbot.ollama_connected,
+        "shared_role": shared_role,
+        "pid": os.getpid()
+    }
+
+@app.get("/stats/models", response_model=ModelStatsResponse)
+async def get_model_stats():
+    """Measured latency and token throughput per model since startup"""
+    return ModelStatsResponse(models=chatbot.model_stats.snapshot())
+
 # ============ Chats_history Endpoints ============
 
+def chat_session_id(session_id: Optional[str]) -> str:
+    """Validate a chat session id, which names its log file, mapping bad ones to 400"""
+    try:
+        return validate_session_id(session_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
 @app.post("/chats/save")
 async def save_chat_session(session: dict):
-    """Save a chat session to disk"""
+    """Save a whole chat session; messages already stored are not written again"""
     try:
         session_id = session.get('id')
         if not session_id:
@@ -220,19 +485,18 @@ async def save_chat_session(session: dict):
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Session ID is required"
             )
+        chat_session_id(session_id)
         
-        # Save to file
-        chat_file = CHAT_STORAGE_DIR / f"{session_id}.json"
-        with open(chat_file, 'w', encoding='utf-8') as f:
-            json.dump(session, f, indent=2)
-        
-        logger.info(f"Saved chat session: {session_id}")
+        written = await asyncio.to_thread(chat_log.save, session_id, session)
+        logger.info(f"Saved chat session: {session_id} ({written} messages written)")
         
         return {
             "status": "success",
             "session_id": session_id,
             "message": "Chat session saved successfully"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error saving chat session: {e}")
         raise HTTPException(
@@ -240,19 +504,46 @@ async def save_chat_session(session: dict):
             detail=str(e)
         )
 
+@app.post("/chats/{session_id}/messages")
+async def append_chat_messages(session_id: str, request: AppendChatMessagesRequest):
+    """Append new messages to a chat session, creating it if needed"""
+    chat_session_id(session_id)
+    try:
+        total = await asyncio.to_thread(
+            chat_log.append, session_id, request.messages, request.session, request.expected_count
+        )
+        return {
+            "status": "success",
+            "session_id": session_id,
+            "total_messages": total
+        }
+    except ChatConflict as e:
+        # The client missed an append; it should reload from total_messages
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": str(e), "total_messages": e.actual}
+        )
+    except Exception as e:
+        logger.error(f"Error appending to chat session: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
 @app.get("/chats/list")
-async def list_chat_sessions():
-    """List all chat sessions"""
+async def list_chat_sessions(include_messages: bool = True):
+    """List all chat sessions; include_messages=false gives their fields and message counts only"""
     try:
         sessions = []
+        read = chat_log.load if include_messages else chat_log.meta
         
-        for chat_file in CHAT_STORAGE_DIR.glob("*.json"):
+        for session_id in chat_log.session_ids():
             try:
-                with open(chat_file, 'r', encoding='utf-8') as f:
-                    session = json.load(f)
+                session = await asyncio.to_thread(read, session_id)
+                if session is not None:
                     sessions.append(session)
             except Exception as e:
-                logger.error(f"Error loading chat file {chat_file}: {e}")
+                logger.error(f"Error loading chat session {session_id}: {e}")
                 continue
         
         # Sort by updated_at (most recent first)
@@ -270,20 +561,23 @@ async def list_chat_sessions():
         )
 
 @app.get("/chats/load/{session_id}")
-async def load_chat_session(session_id: str):
-    """Load a specific chat session"""
+async def load_chat_session(session_id: str, offset: int = 0, limit: Optional[int] = None):
+    """Load a chat session, or one page of its messages with offset/limit"""
+    chat_session_id(session_id)
+    if offset < 0 or (limit is not None and limit < 1):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="offset must be >= 0 and limit >= 1"
+        )
     try:
-        chat_file = CHAT_STORAGE_DIR / f"{session_id}.json"
+        session = await asyncio.to_thread(chat_log.load, session_id, offset, limit)
         
-        if not chat_file.exists():
+        if session is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Chat session not found: {session_id}"
             )
         
-        with open(chat_file, 'r', encoding='utf-8') as f:
-            session = json.load(f)
-        
         return session
     except HTTPException:
         raise
@@ -297,16 +591,17 @@ async def load_chat_session(session_id: str):
 @app.delete("/chats/delete/{session_id}")
 async def delete_chat_session(session_id: str):
     """Delete a chat session"""
+    chat_session_id(session_id)
     try:
-        chat_file = CHAT_STORAGE_DIR / f"{session_id}.json"
+        # Server-side memory may exist even if the client never saved the chat
+        chatbot.memory.forget(session_id)
         
-        if not chat_file.exists():
+        if not await asyncio.to_thread(chat_log.delete, session_id):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Chat session not found: {session_id}"
             )
         
-        chat_file.unlink()
         logger.info(f"Deleted chat session: {session_id}")
         
         return {
@@ -327,10 +622,8 @@ async def delete_chat_session(session_id: str):
 async def clear_all_chat_sessions():
     """Clear all chat sessions"""
     try:
-        count = 0
-        for chat_file in CHAT_STORAGE_DIR.glob("*.json"):
-            chat_file.unlink()
-            count += 1
+        count = await asyncio.to_thread(chat_log.clear)
+        chatbot.memory.clear()
         
         logger.info(f"Cleared {count} chat sessions")
         
@@ -346,50 +639,70 @@ async def clear_all_chat_sessions():
             detail=str(e)
         )
 
+# Messages read from the log per step of a streamed export
+CHAT_EXPORT_PAGE = 200
+
+def export_header(session: Dict, total: int) -> str:
+    return "\n".join([
+        f"Chat: {session.get('title', 'Untitled')}",
+        f"Created: {session.get('createdAt', 'Unknown')}",
+        f"Messages: {total}",
+        "",
+        "=" * 50,
+        ""
+    ]) + "\n"
+
+def export_message(msg: Dict) -> str:
+    role = msg.get('role', 'unknown').upper()
+    text = msg.get('text', '')
+    timestamp = msg.get('timestamp', '')
+    
+    lines = [f"{role} ({timestamp}):", text, ""]
+    if msg.get('sources'):
+        lines.append(f"Sources: {', '.join(msg['sources'])}")
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
 @app.post("/chats/export/{session_id}")
-async def export_chat_session(session_id: str):
-    """Export a chat session as text"""
+async def export_chat_session(session_id: str, stream: bool = False):
+    """Export a chat session as text; stream=true sends the text itself, page by page"""
+    chat_session_id(session_id)
     try:
-        chat_file = CHAT_STORAGE_DIR / f"{session_id}.json"
+        session = await asyncio.to_thread(chat_log.meta, session_id)
         
-        if not chat_file.exists():
+        if session is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Chat session not found: {session_id}"
             )
         
-        with open(chat_file, 'r', encoding='utf-8') as f:
-            session = json.load(f)
-        
-        # Convert to text
-        lines = [
-            f"Chat: {session.get('title', 'Untitled')}",
-            f"Created: {session.get('createdAt', 'Unknown')}",
-            f"Messages: {len(session.get('messages', []))}",
-            "",
-            "=" * 50,
-            ""
-        ]
+        total = session["total_messages"]
+        filename = f"{session.get('title', 'chat')}_{session_id}.txt"
         
-        for msg in session.get('messages', []):
-            role = msg.get('role', 'unknown').upper()
-            text = msg.get('text', '')
-            timestamp = msg.get('timestamp', '')
-            
-            lines.append(f"{role} ({timestamp}):")
-            lines.append(text)
-            lines.append("")
+        if stream:
+            async def pages():
+                yield export_header(session, total)
+                for offset in range(0, total, CHAT_EXPORT_PAGE):
+                    page = await asyncio.to_thread(
+                        chat_log.load, session_id, offset, CHAT_EXPORT_PAGE
+                    )
+                    if page is None:
+                        break
+                    yield "".join(export_message(msg) for msg in page["messages"])
             
-            if msg.get('sources'):
-                lines.append(f"Sources: {', '.join(msg['sources'])}")
-                lines.append("")
+            return StreamingResponse(
+                pages(),
+                media_type="text/plain; charset=utf-8",
+                headers={"Content-Disposition": f'attachment; filename="{session_id}.txt"'}
+            )
         
-        text_content = "\n".join(lines)
+        messages = (await asyncio.to_thread(chat_log.load, session_id) or {}).get("messages", [])
+        text_content = export_header(session, total) + "".join(export_message(msg) for msg in messages)
         
         return {
             "status": "success",
-            "content": text_content,
-            "filename": f"{session.get('title', 'chat')}_{session_id}.txt"
+            "content": text_content[:-1],
+            "filename": filename
         }
     except HTTPException:
         raise
@@ -411,25 +724,45 @@ async def chat(req: ChatRequest):
     - **use_rag**: Whether to use RAG (retrieve context from documents)
     - **top_k**: Number of relevant chunks to retrieve (1-10)
     - **model**: Optional - override the current model for this request
+    - **debug**: Include stage timings, token counts and chunk similarities
+    - **collections**: Optional - collections to search (default: "default")
+    - **session_id**: Optional - continue this conversation with its recent turns and summary
     """
+    collections = [resolve_collection(name) for name in req.collections or [DEFAULT_COLLECTION]]
+    if req.session_id:
+        try:
+            validate_session_id(req.session_id)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     try:
         logger.info(f"Chat request: {req.message[:50]}... (RAG: {req.use_rag}, Model: {req.model or chatbot.model})")
         
         # Use specified model or default
         model_to_use = req.model or chatbot.model
+
+        # While the knowledge base is still loading, wait briefly and then answer without RAG
+        use_rag = req.use_rag
+        if use_rag and not chatbot.is_ready:
+            use_rag = await asyncio.to_thread(chatbot.wait_until_ready, settings.KB_READY_WAIT_SECONDS)
+            if not use_rag:
+                logger.info(f"Knowledge base {chatbot.kb_status}; answering without RAG")
         
         result = chatbot.chat(
             message=req.message,
-            use_rag=req.use_rag,
+            use_rag=use_rag,
             top_k=req.top_k or settings.TOP_K_RESULTS,
-            model_override=model_to_use
+            model_override=model_to_use,
+            debug=req.debug,
+            collections=collections,
+            session_id=req.session_id
         )
         
         return ChatResponse(
             answer=result["answer"],
             sources=result["sources"],
             context_used=result["context_used"],
-            model_used=result.get("model_used", model_to_use)
+            model_used=result.get("model_used", model_to_use),
+            debug=result.get("debug")
         )
         
     except Exception as e:
@@ -439,8 +772,80 @@ async def chat(req: ChatRequest):
             detail=f"Error processing chat request: {str(e)}"
         )
 
+@app.post("/chat/batch")
+async def chat_batch(
+    file: UploadFile = File(...),
+    run_id: Optional[str] = None,
+    top_k: int = 3,
+    model: Optional[str] = None,
+    collection: str = DEFAULT_COLLECTION,
+    debug: bool = False
+):
+    """
+    Answer a JSONL file of questions, streaming JSONL answers as they finish
+    
+    Each line is {"id", "question"} plus optional per-line "top_k", "model",
+    "collections" and "use_rag"; the query parameters are the defaults.
+    Every answer carries per-stage timings; the last line is a summary.
+    Answers are logged under the run id (default: derived from the file), so
+    posting the same file again resumes an interrupted run.
+    """
+    await ensure_kb_ready()
+    data = await file.read()
+    try:
+        items = parse_items(data.decode("utf-8").splitlines())
+        run_id = validate_run_id(run_id) if run_id else run_id_for(data)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if not 1 <= top_k <= 10:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="top_k must be between 1 and 10")
+
+    resolve_collection(collection)
+    for item in items:
+        names = item.get("collections")
+        if names is not None:
+            if not isinstance(names, list):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Item {item['id']}: collections must be a list"
+                )
+            item["collections"] = [resolve_collection(name) for name in names]
+
+    try:
+        records = batch_runner.run(items, run_id, top_k, model, [collection], debug)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error starting batch run: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error starting batch run: {str(e)}"
+        )
+
+    logger.info(f"Batch run {run_id}: {len(items)} questions")
+    return StreamingResponse(
+        (json.dumps(record, default=str) + "\n" for record in records),
+        media_type="application/x-ndjson",
+        headers={"X-Batch-Run-Id": run_id}
+    )
+
+@app.get("/chat/batch/{run_id}")
+async def get_batch_run(run_id: str):
+    """Download every answer logged for a batch run so far (JSONL)"""
+    try:
+        path = batch_runner.path_for(run_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if not path.exists():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Batch run not found: {run_id}")
+    return FileResponse(path, media_type="application/x-ndjson", filename=f"{run_id}.jsonl")
+
 # ============ File Upload Endpoints ============
 
+# Upload reads start small and double while the client keeps filling them
+UPLOAD_BUFFER_MIN = 64 * 1024
+UPLOAD_BUFFER_MAX = 1024 * 1024
+
 def validate_file(file: UploadFile) -> tuple[bool, str]:
     """Validate uploaded file"""
     # Check extension
@@ -451,14 +856,54 @@ def validate_file(file: UploadFile) -> tuple[bool, str]:
     # Note: File size validation should be done during reading
     return True, "Valid"
 
+async def stream_upload(
+    file: UploadFile,
+    part_path: Path,
+    max_size: Optional[int] = None,
+    parts: Optional[list] = None
+) -> tuple[int, str]:
+    """Write an upload to part_path without blocking the event loop; returns (size, sha256)
+
+    Stops once the upload exceeds max_size, deleting the part file and
+    returning the size read so far. The chunks also go to parts if given.
+    """
+    file_size = 0
+    sha256 = hashlib.sha256()
+    buffer_size = UPLOAD_BUFFER_MIN
+    async with aiofiles.open(part_path, "wb") as buffer:
+        while chunk := await file.read(buffer_size):
+            file_size += len(chunk)
+            if max_size is not None and file_size > max_size:
+                break
+            sha256.update(chunk)
+            await buffer.write(chunk)
+            if parts is not None:
+                parts.append(chunk)
+            if len(chunk) == buffer_size:
+                buffer_size = min(buffer_size * 2, UPLOAD_BUFFER_MAX)
+    if max_size is not None and file_size > max_size:
+        # Clean up partial file
+        part_path.unlink(missing_ok=True)
+    return file_size, sha256.hexdigest()
+
+def keep_copy(path: Path, copy_path: Path):
+    """Keep path's current content at copy_path (a hard link where the filesystem allows)"""
+    try:
+        os.link(path, copy_path)
+    except OSError:
+        shutil.copy2(path, copy_path)
+
 @app.post("/upload", response_model=UploadResponse)
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(file: UploadFile = File(...), collection: str = DEFAULT_COLLECTION):
     """
     Upload a document to the knowledge base
     
     Supported formats: TXT, PDF, DOCX, DOC, XLSX, XLS, CSV, Images, Code files
     Max file size: 50MB
+    Pass ?collection=name to add it to a named collection (created on first upload)
     """
+    await ensure_kb_ready()
+    resolve_collection(collection, create=True)
     try:
         # Validate file
         is_valid, message = validate_file(file)
@@ -470,56 +915,119 @@ async def upload_file(file: UploadFile = File(...)):
         
         # Sanitize filename
         safe_filename = Path(file.filename).name
-        file_path = settings.UPLOAD_DIR / safe_filename
+        upload_dir = upload_dir_for(collection)
+        upload_dir.mkdir(parents=True, exist_ok=True)
+        file_path = upload_dir / safe_filename
         
         # Check file size while reading
         max_size = settings.MAX_FILE_SIZE_MB * 1024 * 1024  # Convert to bytes
-        file_size = 0
-        
-        # Save file with size check
-        with open(file_path, "wb") as buffer:
-            while chunk := await file.read(8192):  # Read in 8KB chunks
-                file_size += len(chunk)
-                if file_size > max_size:
-                    # Clean up partial file
-                    buffer.close()
-                    file_path.unlink(missing_ok=True)
-                    raise HTTPException(
-                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                        detail=f"File too large. Max size: {settings.MAX_FILE_SIZE_MB}MB"
-                    )
-                buffer.write(chunk)
+        too_large = HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large. Max size: {settings.MAX_FILE_SIZE_MB}MB"
+        )
+        # Multipart parsing already knows the size; reject before writing anything
+        if file.size is not None and file.size > max_size:
+            raise too_large
+        # Plain text and code go straight to the chunker instead of being read back from disk
+        parts = [] if DocumentProcessor.is_plain_text(safe_filename) else None
+        # Write beside the target so a rejected upload never clobbers the existing file;
+        # uniquely named, so simultaneous uploads of one name don't interleave
+        part_path = file_path.with_name(f".{safe_filename}.{uuid.uuid4().hex[:8]}.part")
+        
+        # Save file with size check; hashed while streaming so unchanged re-uploads are detected without a re-read
+        file_size, content_hash = await stream_upload(file, part_path, max_size, parts)
+        if file_size > max_size:
+            raise too_large
+        
+        known = None
+        if chatbot.collections.exists(collection):
+            # May load the collection from disk
+            store = await asyncio.to_thread(chatbot.collections.get, collection)
+            known = store.files.get(str(file_path))
+        if known is not None and known["sha256"] == content_hash and file_path.exists():
+            part_path.unlink(missing_ok=True)
+            logger.info(f"Unchanged upload: {safe_filename} ({known['chunks']} chunks)")
+            return UploadResponse(
+                status="success",
+                filename=safe_filename,
+                chunks_created=known["chunks"],
+                message=f"Document unchanged. Using {known['chunks']} existing chunks.",
+                unchanged=True
+            )
         
+        previous_path = None
+        if file_path.exists():
+            # The indexed version stays until the new one is; a failed ingest puts it back
+            previous_path = file_path.with_name(f".{safe_filename}.{uuid.uuid4().hex[:8]}.prev")
+            await asyncio.to_thread(keep_copy, file_path, previous_path)
+        part_path.replace(file_path)
         logger.info(f"Saved file: {safe_filename} ({file_size} bytes)")
         
-        # Add document to RAG
-        success, chunks_created = chatbot.add_document(str(file_path))
+        if is_reader():
+            queue_for_writer("ingest", path=str(file_path), content_hash=content_hash, collection=collection)
+            if previous_path is not None:
+                previous_path.unlink(missing_ok=True)
+            return UploadResponse(
+                status="queued",
+                filename=safe_filename,
+                chunks_created=0,
+                message="Document saved. It will be indexed by the writer process shortly."
+            )
+        
+        # Add document to RAG; embedding takes a while, so off the event loop
+        text = DocumentProcessor.text_from_bytes(safe_filename, b"".join(parts)) if parts is not None else None
+        parts = None
+        report = await asyncio.to_thread(
+            chatbot.ingest_document, str(file_path), content_hash=content_hash, collection=collection, text=text
+        )
+        chunks_created = report["chunks_created"]
         
-        if not success:
+        if not report["success"]:
+            if previous_path is not None:
+                previous_path.replace(file_path)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Failed to process document. The file may be empty or corrupted."
             )
+        if previous_path is not None:
+            previous_path.unlink(missing_ok=True)
         
         # Auto-save knowledge base
         kb_path = settings.STORAGE_DIR / settings.KB_FILE
-        chatbot.save_knowledge_base(str(kb_path))
+        await asyncio.to_thread(chatbot.save_knowledge_base, str(kb_path))
         
         logger.info(f"Added document: {safe_filename} ({chunks_created} chunks)")
         
+        message = f"Document processed successfully. Created {chunks_created} chunks."
+        if report["replaced"]:
+            message = f"Document updated. Replaced previous version with {chunks_created} chunks."
+        skipped = report["exact_duplicates"] + report["near_duplicates"]
+        if skipped:
+            message += f" Skipped {skipped} duplicate chunks."
+        
         return UploadResponse(
             status="success",
             filename=safe_filename,
             chunks_created=chunks_created,
-            message=f"Document processed successfully. Created {chunks_created} chunks."
+            message=message,
+            replaced=report["replaced"],
+            duplicates_skipped=report["exact_duplicates"],
+            near_duplicates_skipped=report["near_duplicates"],
+            bytes_saved=report["bytes_saved"]
         )
         
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error uploading file: {e}")
-        # Clean up file if it exists
-        if file_path.exists():
+        # Clean up; a replaced file gets its indexed version back rather than being deleted
+        if 'part_path' in locals():
+            part_path.unlink(missing_ok=True)
+        if locals().get('previous_path') is not None:
+            if previous_path.exists():
+                previous_path.replace(file_path)
+        elif 'previous_path' in locals() and file_path.exists():
+            # Only a file this upload created
             file_path.unlink(missing_ok=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -531,6 +1039,8 @@ async def upload_file(file: UploadFile = File(...)):
 @app.post("/documents/add")
 async def add_document(req: AddDocumentRequest):
     """Add a document from a file path (for internal use)"""
+    await ensure_kb_ready()
+    resolve_collection(req.collection, create=True)
     try:
         if not Path(req.path).exists():
             raise HTTPException(
@@ -538,18 +1048,19 @@ async def add_document(req: AddDocumentRequest):
                 detail=f"File not found: {req.path}"
             )
         
-        success, chunks_created = chatbot.add_document(req.path, req.metadata)
+        if is_reader():
+            job_id = queue_for_writer("ingest", path=req.path, metadata=req.metadata, collection=req.collection)
+            return {"status": "queued", "job_id": job_id}
+        
+        report = await asyncio.to_thread(chatbot.ingest_document, req.path, req.metadata, collection=req.collection)
         
-        if not success:
+        if not report["success"]:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Failed to process document"
             )
         
-        return {
-            "success": success,
-            "chunks_created": chunks_created
-        }
+        return report
         
     except HTTPException:
         raise
@@ -561,31 +1072,22 @@ async def add_document(req: AddDocumentRequest):
         )
 
 @app.get("/documents", response_model=DocumentListResponse)
-async def list_documents():
-    """List all documents in the knowledge base"""
+async def list_documents(request: Request, response: Response, collection: str = DEFAULT_COLLECTION):
+    """List all documents in the knowledge base, or in one collection"""
+    resolve_collection(collection)
     try:
-        data = chatbot.vector_store.get()
-        stats = chatbot.get_stats()
+        store = chatbot.collections.get(collection)
+        cached = not_modified(request, response, kb_etag("documents", collection, store.version))
+        if cached is not None:
+            return cached
         
-        # Group documents by filename
-        documents = []
-        seen_files = set()
-        
-        for meta in data["metadatas"]:
-            filename = meta.get("filename", "Unknown")
-            if filename not in seen_files:
-                seen_files.add(filename)
-                documents.append({
-                    "filename": filename,
-                    "source": meta.get("source", ""),
-                    "chunks": stats["documents"].get(filename, 0),
-                    "upload_date": meta.get("upload_date", "")
-                })
+        # One entry per filename, from the store's document catalog
+        documents = store.catalog()
         
         return DocumentListResponse(
             documents=documents,
-            total_documents=stats["total_documents"],
-            total_chunks=stats["total_chunks"]
+            total_documents=len(documents),
+            total_chunks=len(store.ids)
         )
         
     except Exception as e:
@@ -598,8 +1100,13 @@ async def list_documents():
 @app.delete("/documents/delete", response_model=StatusResponse)
 async def delete_document(req: DeleteDocumentRequest):
     """Delete a document from the knowledge base"""
+    await ensure_kb_ready()
+    resolve_collection(req.collection)
+    if is_reader():
+        queue_for_writer("delete", filename=req.filename, collection=req.collection)
+        return StatusResponse(status="queued", message=f"Deletion of '{req.filename}' queued")
     try:
-        chunks_removed = chatbot.delete_document(req.filename)
+        chunks_removed = chatbot.delete_document(req.filename, req.collection)
         
         if chunks_removed == 0:
             raise HTTPException(
@@ -612,7 +1119,7 @@ async def delete_document(req: DeleteDocumentRequest):
         chatbot.save_knowledge_base(str(kb_path))
         
         # Try to delete physical file
-        file_path = settings.UPLOAD_DIR / req.filename
+        file_path = upload_dir_for(req.collection) / req.filename
         if file_path.exists():
             file_path.unlink()
             logger.info(f"Deleted file: {req.filename}")
@@ -634,10 +1141,15 @@ async def delete_document(req: DeleteDocumentRequest):
         )
 
 @app.post("/documents/clear", response_model=StatusResponse)
-async def clear_all_documents():
-    """Clear all documents from the knowledge base"""
+async def clear_all_documents(collection: str = DEFAULT_COLLECTION):
+    """Clear all documents from the knowledge base, or from one collection"""
+    await ensure_kb_ready()
+    resolve_collection(collection)
+    if is_reader():
+        queue_for_writer("clear", collection=collection)
+        return StatusResponse(status="queued", message="Clearing queued")
     try:
-        chatbot.clear_knowledge_base()
+        chatbot.clear_knowledge_base(collection)
         
         # Save empty knowledge base
         kb_path = settings.STORAGE_DIR / settings.KB_FILE
@@ -662,6 +1174,10 @@ async def clear_all_documents():
 @app.post("/kb/save", response_model=StatusResponse)
 async def save_kb():
     """Manually save knowledge base to disk"""
+    await ensure_kb_ready()
+    if is_reader():
+        queue_for_writer("save")
+        return StatusResponse(status="queued", message="Save queued")
     try:
         kb_path = settings.STORAGE_DIR / settings.KB_FILE
         chatbot.save_knowledge_base(str(kb_path))
@@ -682,6 +1198,15 @@ async def save_kb():
 @app.post("/kb/load", response_model=StatusResponse)
 async def load_kb():
     """Manually load knowledge base from disk"""
+    if chatbot.kb_status == "loading":
+        await ensure_kb_ready()
+    if is_reader():
+        # Readers only ever serve what the writer published
+        await asyncio.to_thread(follower.poll)
+        return StatusResponse(
+            status="success",
+            message=f"Serving index generation {follower.generation} ({len(chatbot.vector_store.ids)} chunks)"
+        )
     try:
         kb_path = settings.STORAGE_DIR / settings.KB_FILE
         
@@ -692,6 +1217,8 @@ async def load_kb():
             )
         
         chatbot.load_knowledge_base(str(kb_path))
+        publish_generation()
+        start_migration_if_needed()
         stats = chatbot.get_stats()
         
         logger.info(f"Loaded knowledge base from {kb_path}")
@@ -710,11 +1237,127 @@ async def load_kb():
             detail=str(e)
         )
 
+@app.get("/kb/export")
+async def export_kb(collection: str = DEFAULT_COLLECTION):
+    """
+    Download a collection as a portable archive
+    
+    The zip holds the embedding matrix, chunk texts and metadata, the
+    embedding model and dimension, and checksums. POST it to /kb/import on
+    another machine to restore the knowledge base without re-embedding.
+    """
+    await ensure_kb_ready()
+    resolve_collection(collection)
+    archive_dir = settings.STORAGE_DIR / "archives"
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    filename = f"{collection}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.zip"
+    archive_path = archive_dir / f".{os.getpid()}-{filename}"
+    try:
+        manifest = await asyncio.to_thread(chatbot.export_archive, str(archive_path), collection)
+        logger.info(f"Exported collection '{collection}' ({manifest['chunks']} chunks)")
+        return FileResponse(
+            archive_path,
+            media_type="application/zip",
+            filename=filename,
+            background=BackgroundTask(archive_path.unlink, missing_ok=True)
+        )
+    except Exception as e:
+        logger.error(f"Error exporting knowledge base: {e}")
+        archive_path.unlink(missing_ok=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error exporting knowledge base: {str(e)}"
+        )
+
+@app.post("/kb/import")
+async def import_kb(file: UploadFile = File(...), collection: str = DEFAULT_COLLECTION):
+    """
+    Merge an archive from /kb/export into a collection (created if needed)
+    
+    No embeddings are computed. Archives from a different embedding model
+    are rejected; files already in the collection and duplicate chunks are skipped.
+    """
+    await ensure_kb_ready()
+    resolve_collection(collection, create=True)
+    archive_dir = settings.STORAGE_DIR / "archives"
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    archive_path = archive_dir / f".import-{os.getpid()}-{time.time_ns()}.zip"
+    part_path = archive_path.with_name(f"{archive_path.name}.part")
+    try:
+        # Renamed once complete, so the writer process never picks up a partial archive
+        await stream_upload(file, part_path)
+        part_path.replace(archive_path)
+
+        if is_reader():
+            # Validate here so a bad upload fails now rather than in the writer's log
+            await asyncio.to_thread(verify_archive, archive_path)
+            queue_for_writer("import", path=str(archive_path), collection=collection)
+            return {"status": "queued", "message": "Archive will be imported by the writer process shortly"}
+
+        report = await asyncio.to_thread(chatbot.import_archive, str(archive_path), collection)
+        archive_path.unlink(missing_ok=True)
+        await asyncio.to_thread(chatbot.save_knowledge_base, str(settings.STORAGE_DIR / settings.KB_FILE))
+        return {"status": "success", "report": report}
+
+    except (ValueError, zipfile.BadZipFile) as e:
+        archive_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error importing knowledge base: {e}")
+        part_path.unlink(missing_ok=True)
+        archive_path.unlink(missing_ok=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error importing knowledge base: {str(e)}"
+        )
+
+@app.post("/kb/reembed")
+async def reembed_kb(req: ReembedRequest = ReembedRequest()):
+    """
+    Re-embed every collection with a new embedding model in the background
+    
+    Queries keep using the old vectors until each collection's new index is
+    complete and swapped in. Without a model, the configured one is used
+    (e.g. to retry a failed migration). Set EMBEDDING_MODEL as well, or the
+    next start migrates back.
+    """
+    await ensure_kb_ready()
+    model = req.model or settings.EMBEDDING_MODEL
+    try:
+        # Fails fast on a model Ollama doesn't have
+        await asyncio.to_thread(ollama.embeddings, model=model, prompt="test")
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Embedding model '{model}' is not available: {str(e)}"
+        )
+    if is_reader():
+        queue_for_writer("reembed", model=model)
+        return {"status": "queued", "message": f"Re-embedding with {model} will start in the writer process"}
+    chatbot.embedding_model = model
+    started = migration.start(model)
+    return {
+        "status": "success",
+        "message": f"Re-embedding with {model} started" if started else f"Already re-embedding with {model}",
+        "migration": migration.status()
+    }
+
+@app.get("/kb/reembed")
+async def get_reembed_status():
+    """Progress of the current (or last) re-embedding migration"""
+    return migration.status()
+
 @app.get("/kb/stats")
-async def get_kb_stats():
+async def get_kb_stats(request: Request, response: Response, collection: str = DEFAULT_COLLECTION):
     """Get knowledge base statistics"""
+    resolve_collection(collection)
     try:
-        stats = chatbot.get_stats()
+        store = chatbot.collections.get(collection)
+        etag = kb_etag("stats", collection, store.version, chatbot.embedding_model)
+        cached = not_modified(request, response, etag)
+        if cached is not None:
+            return cached
+        stats = chatbot.get_stats(collection)
         return {
             "status": "success",
             "stats": stats
@@ -726,6 +1369,143 @@ async def get_kb_stats():
             detail=str(e)
         )
 
+# ============ Collections ============
+
+@app.get("/collections")
+async def list_collections():
+    """List collections, with sizes for the ones currently loaded"""
+    loaded = chatbot.collections.loaded()
+    collections = []
+    for name in chatbot.collections.names():
+        store = loaded.get(name)
+        collections.append({
+            "name": name,
+            "loaded": store is not None,
+            "chunks": len(store.ids) if store is not None else None,
+            "memory_bytes": store.memory_bytes() if store is not None else None
+        })
+    return {
+        "status": "success",
+        "collections": collections,
+        "memory_bytes": chatbot.collections.memory_bytes(),
+        "memory_cap_bytes": chatbot.collections.memory_cap_bytes
+    }
+
+@app.delete("/collections/{name}", response_model=StatusResponse)
+async def delete_collection(name: str):
+    """Delete a named collection, its index file and its uploads"""
+    resolve_collection(name)
+    if name == DEFAULT_COLLECTION:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="The default collection cannot be deleted; clear it instead"
+        )
+    if is_reader():
+        queue_for_writer("drop_collection", collection=name)
+        return StatusResponse(status="queued", message=f"Deletion of collection '{name}' queued")
+    try:
+        with chatbot._store_lock:
+            chatbot.collections.drop(name)
+        shutil.rmtree(upload_dir_for(name), ignore_errors=True)
+        logger.info(f"Deleted collection: {name}")
+        return StatusResponse(status="success", message=f"Deleted collection '{name}'")
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Error deleting collection: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+# ============ Watched Folders ============
+
+@app.post("/watch/add")
+async def watch_folder(req: WatchFolderRequest):
+    """Watch a directory and index its documents incrementally"""
+    if is_reader():
+        queue_for_writer("watch_add", path=req.path, recursive=req.recursive)
+        return {"status": "queued", "message": f"Watching {req.path} queued"}
+    try:
+        folder = watcher.add_folder(req.path, req.recursive)
+        watcher.request_scan()
+        return {
+            "status": "success",
+            "message": f"Watching {folder['path']}; indexing in the background",
+            "folder": folder
+        }
+    except NotADirectoryError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Error adding watched folder: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@app.post("/watch/remove", response_model=StatusResponse)
+async def unwatch_folder(req: UnwatchFolderRequest):
+    """Stop watching a directory"""
+    await ensure_kb_ready()
+    if is_reader():
+        queue_for_writer("watch_remove", path=req.path, purge=req.purge)
+        return StatusResponse(status="queued", message=f"Unwatching {req.path} queued")
+    try:
+        removed = await asyncio.to_thread(watcher.remove_folder, req.path, req.purge)
+        return StatusResponse(
+            status="success",
+            message=f"Stopped watching {req.path}" + (f"; removed {removed} chunks" if req.purge else "")
+        )
+    except KeyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e.args[0])
+        )
+    except Exception as e:
+        logger.error(f"Error removing watched folder: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@app.get("/watch/list")
+async def list_watched_folders():
+    """List watched directories"""
+    return {
+        "status": "success",
+        "folders": watcher.list_folders(),
+        "scanning": watcher.scanning,
+        "interval_seconds": settings.WATCH_INTERVAL_SECONDS
+    }
+
+@app.post("/watch/scan")
+async def scan_watched_folders(req: WatchScanRequest = WatchScanRequest()):
+    """Index changes in watched directories now"""
+    await ensure_kb_ready()
+    if is_reader():
+        queue_for_writer("watch_scan")
+        return {"status": "queued", "report": None}
+    try:
+        report = await asyncio.to_thread(watcher.scan, req.path)
+        return {"status": "success", "report": report}
+    except KeyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e.args[0])
+        )
+    except Exception as e:
+        logger.error(f"Error scanning watched folders: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
 # ============ Startup Event ============
 
 @app.on_event("startup")
@@ -735,13 +1515,80 @@ async def startup_event():
     logger.info(f"LLM Model: {settings.LLM_MODEL}")
     logger.info(f"Embedding Model: {settings.EMBEDDING_MODEL}")
     
-    stats = chatbot.get_stats()
-    logger.info(f"Loaded {stats['total_chunks']} chunks from {stats['total_documents']} documents")
+    # Load the knowledge base on a worker thread so the server can bind immediately
+    kb_path = settings.STORAGE_DIR / settings.KB_FILE
+    if is_reader():
+        # Mapping a published generation is cheap; until one exists, wait for the writer
+        phase_start = time.perf_counter()
+        try:
+            if not follower.poll():
+                chatbot.mark_loading()
+        except Exception as e:
+            logger.error(f"Error loading index generation: {e}")
+            chatbot.mark_loading()
+        startup_phases["kb_load"] = (time.perf_counter() - phase_start) * 1000
+        follower.start()
+    elif kb_path.exists():
+        phase_start = time.perf_counter()
+
+        def record_kb_load():
+            startup_phases["kb_load"] = (time.perf_counter() - phase_start) * 1000
+            publish_generation()
+            start_migration_if_needed()
+
+        chatbot.start_background_load(str(kb_path), on_done=record_kb_load)
+        logger.info(f"Loading knowledge base from {kb_path} in the background")
+    else:
+        publish_generation()
+
+    # Checking Ollama (and importing its client) must not delay accepting connections
+    def check_ollama():
+        phase_start = time.perf_counter()
+        chatbot.check_connection()
+        startup_phases["ollama_check"] = (time.perf_counter() - phase_start) * 1000
+
+    threading.Thread(target=check_ollama, name="ollama-check", daemon=True).start()
+
+    # Conversation memory of chats idle past the retention period is deleted
+    def expire_memory():
+        try:
+            expired = chatbot.memory.expire(settings.MEMORY_RETENTION_DAYS * 86400)
+            if expired:
+                logger.info(f"Deleted conversation memory of {expired} idle sessions")
+        except Exception as e:
+            logger.error(f"Error expiring conversation memory: {e}")
+
+    threading.Thread(target=expire_memory, name="memory-expiry", daemon=True).start()
+
+    if shared_role == "writer":
+        spool.start(apply_spooled_write, settings.SHARED_INDEX_POLL_SECONDS, on_drained=save_kb_in_background)
+
+    # Watched folders are rescanned in the background once the KB is loaded
+    if not is_reader():
+        watcher.start()
+    # Named collections are loaded on demand and unloaded again once idle
+    chatbot.collections.start()
+
+    startup_phases["ready"] = (time.perf_counter() - _startup_t0) * 1000
+    logger.info(
+        "Startup phases (ms): " +
+        ", ".join(f"{name}={ms:.1f}" for name, ms in startup_phases.items())
+    )
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Actions to perform on shutdown"""
     logger.info("Shutting down...")
+    watcher.stop()
+    chatbot.collections.stop()
+    if is_reader():
+        # The writer owns the files on disk
+        follower.stop()
+        return
+    if spool is not None:
+        spool.stop()
+    # Unfinished shadow indexes are dropped; the next start begins again
+    migration.cancel()
     
     # Auto-save knowledge base
     try:
@@ -750,12 +1597,17 @@ async def shutdown_event():
         logger.info("Knowledge base saved on shutdown")
     except Exception as e:
         logger.error(f"Error saving knowledge base on shutdown: {e}")
+    if writer_lock is not None:
+        writer_lock.release()
 
 if __name__ == "__main__":
     import uvicorn
+    if settings.WORKERS > 1 and not settings.SHARED_INDEX:
+        logger.warning("WORKERS > 1 without SHARED_INDEX: each worker keeps its own diverging knowledge base")
     uvicorn.run(
         "main:app",
         host=settings.HOST,
         port=settings.PORT,
-        reload=settings.DEBUG
+        reload=settings.DEBUG,
+        workers=1 if settings.DEBUG else settings.WORKERS
     )
\ No newline at end of file
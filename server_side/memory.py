@@ -0,0 +1,263 @@
+"""
+Conversation Memory
+Per-session chat history with a rolling summary
+
+Recent turns are replayed verbatim. Once a session has too many (or too
+long) turns, the oldest ones are folded into a running summary on a
+background thread, a batch at a time. Between folds the prompt prefix
+(system prompt, summary, earlier turns) is byte-identical from turn to
+turn, so Ollama can reuse its KV cache and only evaluate the new message.
+"""
+
+import json
+import logging
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from context_assembler import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+_SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an AI assistant.
+Update the summary with the new messages below. Keep names, facts, decisions, open questions and user preferences; drop small talk. Reply with the updated summary only, in at most 200 words.
+
+Current summary:
+{summary}
+
+New messages:
+{turns}"""
+
+
+def validate_session_id(session_id: str) -> str:
+    """Session ids name files on disk, so keep them to a safe alphabet"""
+    if not _SESSION_ID_RE.match(session_id or ""):
+        raise ValueError(f"Invalid session id '{session_id}': use letters, digits, '-' and '_'")
+    return session_id
+
+
+class ConversationMemory:
+    """Recent turns verbatim plus a summary of everything older, per session"""
+
+    def __init__(
+        self,
+        summarize: Callable[[str], str],
+        storage_dir: Optional[Path] = None,
+        recent_turns: int = 6,
+        fold_turns: int = 6,
+        history_tokens: int = 512,
+        max_sessions: int = 1000
+    ):
+        self.summarize = summarize
+        self.storage_dir = Path(storage_dir) if storage_dir is not None else None
+        # Turns are single messages; recent_turns=6 keeps the last three exchanges.
+        # Folding fold_turns at once keeps the prefix stable for that many turns.
+        self.recent_turns = recent_turns
+        self.fold_turns = max(2, fold_turns)
+        self.history_tokens = history_tokens
+        self.max_sessions = max_sessions
+
+        self._sessions: "OrderedDict[str, Dict]" = OrderedDict()
+        # File mtimes as of our last read/write; another worker process may have written since
+        self._mtimes: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self._folding: set = set()
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+        if self.storage_dir is not None:
+            self.storage_dir.mkdir(parents=True, exist_ok=True)
+
+    # ===== Session state =====
+
+    def _path(self, session_id: str) -> Optional[Path]:
+        if self.storage_dir is None:
+            return None
+        return self.storage_dir / f"{session_id}.json"
+
+    def _session(self, session_id: str) -> Dict:
+        session = self._sessions.get(session_id)
+        path = self._path(session_id)
+        mtime = path.stat().st_mtime_ns if path is not None and path.exists() else None
+        if session is None or (mtime is not None and mtime != self._mtimes.get(session_id)):
+            session = {"summary": "", "turns": [], "summarized_turns": 0}
+            if mtime is not None:
+                try:
+                    session.update(json.loads(path.read_text(encoding="utf-8")))
+                    self._mtimes[session_id] = mtime
+                except Exception as e:
+                    logger.error(f"Error loading conversation memory {session_id}: {e}")
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                # Evicted sessions are already on disk and reload on their next turn
+                evicted, _ = self._sessions.popitem(last=False)
+                self._mtimes.pop(evicted, None)
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _persist(self, session_id: str, session: Dict):
+        path = self._path(session_id)
+        if path is None:
+            return
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({**session, "updated": datetime.now().isoformat()}), encoding="utf-8")
+        tmp.replace(path)
+        self._mtimes[session_id] = path.stat().st_mtime_ns
+
+    def history(self, session_id: str) -> Tuple[str, List[Dict]]:
+        """The session's summary and its verbatim turns ({"role", "content"})"""
+        validate_session_id(session_id)
+        with self._lock:
+            session = self._session(session_id)
+            return session["summary"], [dict(turn) for turn in session["turns"]]
+
+    def record(self, session_id: str, user_message: str, answer: str):
+        """Append one exchange and fold older turns in the background if needed"""
+        validate_session_id(session_id)
+        with self._lock:
+            session = self._session(session_id)
+            session["turns"].append({"role": "user", "content": user_message})
+            session["turns"].append({"role": "assistant", "content": answer})
+            self._persist(session_id, session)
+            if self._needs_fold(session) and session_id not in self._folding:
+                self._folding.add(session_id)
+                self._queue.put(session_id)
+                self._ensure_worker()
+
+    def _needs_fold(self, session: Dict) -> bool:
+        turns = session["turns"]
+        if len(turns) <= 2:
+            return False
+        if len(turns) >= self.recent_turns + self.fold_turns:
+            return True
+        # Long turns are folded even inside the recent window, all but the last exchange
+        return _tokens(turns) > self.history_tokens
+
+    def forget(self, session_id: str):
+        if not _SESSION_ID_RE.match(session_id or ""):
+            return
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._mtimes.pop(session_id, None)
+            path = self._path(session_id)
+            if path is not None:
+                path.unlink(missing_ok=True)
+
+    def expire(self, max_age_seconds: float) -> int:
+        """Forget sessions whose memory hasn't changed in max_age_seconds; returns how many"""
+        if self.storage_dir is None or max_age_seconds <= 0:
+            return 0
+        cutoff = time.time() - max_age_seconds
+        expired = 0
+        for path in self.storage_dir.glob("*.json"):
+            try:
+                if path.stat().st_mtime >= cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            self.forget(path.stem)
+            expired += 1
+        return expired
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            self._mtimes.clear()
+            if self.storage_dir is not None:
+                for path in self.storage_dir.glob("*.json"):
+                    path.unlink(missing_ok=True)
+
+    def stats(self, session_id: str) -> Dict:
+        """Memory figures for chat debug output"""
+        with self._lock:
+            session = self._session(session_id)
+            return {
+                "turns": len(session["turns"]),
+                "summarized_turns": session["summarized_turns"],
+                "summary_tokens": estimate_tokens(session["summary"]),
+                "folding": session_id in self._folding
+            }
+
+    # ===== Background summarization =====
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def join(self):
+        """Block until every queued fold has finished"""
+        self._queue.join()
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="memory-summarizer", daemon=True)
+            self._thread.start()
+
+    def _fold(self, session_id: str) -> bool:
+        """Summarize the turns older than the recent window; True if the summary changed"""
+        with self._lock:
+            session = self._session(session_id)
+            # Fold whole exchanges older than the recent window, then more of
+            # the window while it is over the token limit (never the last exchange)
+            turns = session["turns"]
+            count = max(0, len(turns) - self.recent_turns)
+            count -= count % 2
+            while len(turns) - count > 2 and _tokens(turns[count:]) > self.history_tokens:
+                count += 2
+            if not count:
+                return False
+            summary = session["summary"]
+            folded = session["turns"][:count]
+            summarized = session["summarized_turns"]
+
+        transcript = "\n".join(f"{turn['role'].upper()}: {turn['content']}" for turn in folded)
+        new_summary = self.summarize(
+            SUMMARY_PROMPT.format(summary=summary or "(none yet)", turns=transcript)
+        ).strip()
+        if not new_summary:
+            return False
+
+        with self._lock:
+            path = self._path(session_id)
+            if session_id not in self._sessions and (path is None or not path.exists()):
+                # Forgotten while the summary was generated
+                return False
+            session = self._session(session_id)
+            if session["summarized_turns"] != summarized or session["turns"][:count] != folded:
+                # Another worker process folded this session first
+                return False
+            del session["turns"][:count]
+            session["summary"] = new_summary
+            session["summarized_turns"] += count
+            self._persist(session_id, session)
+        logger.info(f"Folded {count} turns of session {session_id} into its summary")
+        return True
+
+    def _run(self):
+        while True:
+            session_id = self._queue.get()
+            folded = False
+            try:
+                folded = self._fold(session_id)
+            except Exception as e:
+                logger.error(f"Error summarizing session {session_id}: {e}")
+            finally:
+                with self._lock:
+                    self._folding.discard(session_id)
+                    # More turns may have arrived while this fold ran; a failed
+                    # fold is retried on the session's next turn instead
+                    session = self._sessions.get(session_id)
+                    if folded and session is not None and self._needs_fold(session):
+                        self._folding.add(session_id)
+                        self._queue.put(session_id)
+                self._queue.task_done()
+
+
+def _tokens(turns: List[Dict]) -> int:
+    return sum(estimate_tokens(turn["content"]) for turn in turns)
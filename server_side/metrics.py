@@ -0,0 +1,392 @@
+"""
+Metrics Registry
+Minimal Prometheus text-format metrics for the LoLA backend
+
+Recording an observation is a bisect plus two additions under a lock, so
+instrumenting a hot path costs on the order of a microsecond. Gauges that
+describe current state (store size, queue depth, cache ratios) are
+computed from callbacks only when /metrics is scraped.
+"""
+
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0
+)
+
+GaugeValue = Union[float, Dict[Tuple[str, ...], float]]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+# =========================
+# Metric Types
+# =========================
+
+class _Timer:
+    """Context manager that observes elapsed seconds on exit"""
+
+    __slots__ = ("_observe", "_start")
+
+    def __init__(self, observe: Callable[[float], None]):
+        self._observe = observe
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._observe(time.perf_counter() - self._start)
+
+
+class _HistogramChild:
+    """Bucket counts for one label combination"""
+
+    __slots__ = ("_buckets", "_counts", "_sum", "_count", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def time(self) -> _Timer:
+        return _Timer(self.observe)
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        with self._lock:
+            return list(self._counts), self._sum, self._count
+
+
+class Histogram:
+    """Latency histogram with optional labels"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._children: Dict[Tuple[str, ...], _HistogramChild] = {}
+        self._lock = threading.Lock()
+        if not self.label_names:
+            self._default = self.labels()
+
+    def labels(self, *values: str) -> _HistogramChild:
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, _HistogramChild(self.buckets))
+        return child
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def time(self) -> _Timer:
+        return self._default.time()
+
+    def render(self) -> List[str]:
+        lines = []
+        for values, child in sorted(self._children.items()):
+            counts, total, count = child.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, values, le)} {cumulative}")
+            labels = _format_labels(self.label_names, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, *labels: str):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.label_names, values)} {_format_value(v)}"
+            for values, v in items
+        ]
+
+
+class Gauge:
+    """Point-in-time value, either set directly or computed on scrape"""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        fn: Optional[Callable[[], GaugeValue]] = None
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._fn = fn
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+    def inc(self, amount: float = 1.0, *labels: str):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, *labels: str):
+        self.inc(-amount, *labels)
+
+    def set_function(self, fn: Callable[[], GaugeValue]):
+        self._fn = fn
+
+    def render(self) -> List[str]:
+        values = dict(self._values)
+        if self._fn is not None:
+            result = self._fn()
+            if isinstance(result, dict):
+                values.update(result)
+            elif result is not None:
+                values[()] = result
+        return [
+            f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(v)}"
+            for labels, v in sorted(values.items())
+        ]
+
+
+# =========================
+# Registry
+# =========================
+
+class MetricsRegistry:
+    """Holds metrics and renders them in Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Union[Histogram, Counter, Gauge]] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, label_names: Sequence[str] = (),
+              fn: Optional[Callable[[], GaugeValue]] = None) -> Gauge:
+        gauge = self._register(Gauge(name, documentation, label_names, fn))
+        if fn is not None:
+            gauge.set_function(fn)
+        return gauge
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            try:
+                body = metric.render()
+            except Exception:
+                # A failing gauge callback must not break the whole scrape
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(body)
+        return "\n".join(lines) + "\n"
+
+
+def process_resident_memory_bytes() -> Optional[float]:
+    """Current RSS of this process (Linux /proc, else peak RSS)"""
+    statm = Path("/proc/self/statm")
+    if statm.exists():
+        pages = int(statm.read_text().split()[1])
+        return float(pages * os.sysconf("SC_PAGE_SIZE"))
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return float(peak if sys.platform == "darwin" else peak * 1024)
+    except ImportError:
+        return None
+
+
+metrics = MetricsRegistry()
+
+# ===== Pipeline stage histograms =====
+
+QUERY_EMBEDDING_SECONDS = metrics.histogram(
+    "lola_query_embedding_seconds", "Time to embed a chat query"
+)
+VECTOR_SEARCH_SECONDS = metrics.histogram(
+    "lola_vector_search_seconds", "Time to score the vector store for a query"
+)
+PROMPT_ASSEMBLY_SECONDS = metrics.histogram(
+    "lola_prompt_assembly_seconds", "Time to build the chat prompt from retrieved context"
+)
+LLM_GENERATION_SECONDS = metrics.histogram(
+    "lola_llm_generation_seconds", "Time spent waiting on the chat model", ["model"]
+)
+DOCUMENT_PARSE_SECONDS = metrics.histogram(
+    "lola_document_parse_seconds", "Time to extract text from an uploaded file", ["file_type"]
+)
+CHUNKING_SECONDS = metrics.histogram(
+    "lola_chunking_seconds", "Time to split extracted text into chunks"
+)
+INGEST_EMBEDDING_SECONDS = metrics.histogram(
+    "lola_ingest_embedding_seconds", "Time to embed all chunks of one document"
+)
+KB_PERSISTENCE_SECONDS = metrics.histogram(
+    "lola_kb_persistence_seconds", "Time to save or load the knowledge base", ["operation"]
+)
+INGEST_DUPLICATE_CHUNKS = metrics.counter(
+    "lola_ingest_duplicate_chunks_total", "Chunks skipped before embedding as duplicates", ["kind"]
+)
+INGEST_BYTES_SAVED = metrics.counter(
+    "lola_ingest_bytes_saved_total", "Chunk text and embedding bytes not stored because of deduplication"
+)
+CONTEXT_TOKENS = metrics.counter(
+    "lola_context_tokens_total", "Estimated retrieved-context tokens sent to chat models", ["model"]
+)
+CONTEXT_TOKENS_SAVED = metrics.counter(
+    "lola_context_tokens_saved_total",
+    "Estimated prompt tokens avoided by merging adjacent chunks and packing to the budget", ["model"]
+)
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    "lola_http_request_duration_seconds", "HTTP request latency by route",
+    ["method", "route", "status"]
+)
+
+HTTP_REQUESTS_IN_FLIGHT = metrics.gauge(
+    "lola_http_requests_in_flight", "HTTP requests currently being handled"
+)
+
+metrics.gauge(
+    "lola_process_resident_memory_bytes", "Resident memory of the backend process",
+    fn=process_resident_memory_bytes
+)
+
+# ===== Queue depths and cache ratios =====
+# Components register a callback once; values are read only on scrape.
+
+_queue_sources: Dict[str, Callable[[], float]] = {}
+_cache_sources: Dict[str, Callable[[], float]] = {}
+
+
+def track_queue(name: str, fn: Callable[[], float]):
+    """Report fn() as the depth of the named queue"""
+    _queue_sources[name] = fn
+
+
+def track_cache(name: str, fn: Callable[[], float]):
+    """Report fn() as the hit ratio (0-1) of the named cache"""
+    _cache_sources[name] = fn
+
+
+metrics.gauge(
+    "lola_queue_depth", "Pending work items per queue", ["queue"],
+    fn=lambda: {(name,): fn() for name, fn in list(_queue_sources.items())}
+)
+metrics.gauge(
+    "lola_cache_hit_ratio", "Hit ratio per cache", ["cache"],
+    fn=lambda: {(name,): fn() for name, fn in list(_cache_sources.items())}
+)
+
+
+# =========================
+# ASGI Middleware
+# =========================
+
+class MetricsMiddleware:
+    """Record latency per matched route without Starlette's BaseHTTPMiddleware overhead"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            # The router stores the matched route in the shared scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route, str(status_code[0])).observe(
+                time.perf_counter() - start
+            )
@@ -1,47 +1,311 @@
-import ollama
 import numpy as np
 from pathlib import Path
-import PyPDF2
-from docx import Document
-import pandas as pd
-from typing import List, Dict, Tuple, Optional
+from typing import Callable, Iterator, List, Dict, Tuple, Optional, Union
 import pickle
 import logging
 from datetime import datetime
 import hashlib
-import base64
+import heapq
+import importlib
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from chunk_metadata import ChunkMetadata
+from chunk_store import ChunkTexts, remove_stale_segments
+from collection_manager import DEFAULT_COLLECTION, CollectionManager
+from context_assembler import ContextAssembler, estimate_prompt_tokens
+from kb_archive import export_archive, import_archive
+from memory import ConversationMemory
+from dedup import SimHashIndex, simhash
+from reduced_index import ReducedIndex
+from vision import CAPTION_PROMPT, ImageCache, ImageCaptioner, VisionAnswerCache
+from metrics import (
+    QUERY_EMBEDDING_SECONDS, VECTOR_SEARCH_SECONDS, PROMPT_ASSEMBLY_SECONDS,
+    LLM_GENERATION_SECONDS, DOCUMENT_PARSE_SECONDS, CHUNKING_SECONDS,
+    INGEST_EMBEDDING_SECONDS, KB_PERSISTENCE_SECONDS, INGEST_DUPLICATE_CHUNKS,
+    INGEST_BYTES_SAVED, CONTEXT_TOKENS, CONTEXT_TOKENS_SAVED
+)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+class LazyModule:
+    """Proxy that imports a module on first attribute access"""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+
+# The Ollama client pulls in httpx; defer it so the server binds quickly
+ollama = LazyModule("ollama")
+
 # =========================
 # Vector Store
 # =========================
 
+class _ProgressReader:
+    """File wrapper that reports the fraction of bytes consumed by pickle"""
+
+    def __init__(self, f, total: int, callback: Callable[[float], None]):
+        self._f = f
+        self._total = max(total, 1)
+        self._callback = callback
+        self._read = 0
+
+    def _advance(self, n: int):
+        self._read += n
+        # Leave headroom for rebuilding the embedding matrix after unpickling
+        self._callback(min(self._read / self._total, 1.0) * 0.95)
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._f.read(size)
+        self._advance(len(data))
+        return data
+
+    def readinto(self, buffer) -> int:
+        n = self._f.readinto(buffer)
+        self._advance(n or 0)
+        return n
+
+    def readline(self, size: int = -1) -> bytes:
+        data = self._f.readline(size)
+        self._advance(len(data))
+        return data
+
+
+# Store versions are unique across stores, so a replaced store never repeats one (ETags rely on it)
+_VERSIONS = itertools.count(1)
+
+# Search thread pools by worker count, shared by every store. Stores are
+# replaced and unloaded while queries on them may still be running, so no
+# store owns (or shuts down) the pool its queries run on.
+_SEARCH_POOLS: Dict[int, "_SearchPool"] = {}
+_SEARCH_POOLS_LOCK = threading.Lock()
+
+
+class _SearchPool:
+    """Shared search threads, counting the shard tasks submitted and not yet finished"""
+
+    def __init__(self, workers: int):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vector-search")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args) -> Future:
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self.executor.submit(fn, *args)
+        except BaseException:
+            self._task_done(None)
+            raise
+        future.add_done_callback(self._task_done)
+        return future
+
+    def _task_done(self, future: Optional[Future]):
+        with self._lock:
+            self._pending -= 1
+
+    def queue_depth(self) -> int:
+        return self._pending
+
+
+def _search_pool(workers: int) -> _SearchPool:
+    with _SEARCH_POOLS_LOCK:
+        pool = _SEARCH_POOLS.get(workers)
+        if pool is None:
+            pool = _SEARCH_POOLS[workers] = _SearchPool(workers)
+        return pool
+
+
 class SimpleVectorStore:
-    """Enhanced in-memory vector store with deduplication"""
+    """Enhanced in-memory vector store with deduplication and sharded search"""
 
-    def __init__(self):
-        self.documents: List[str] = []
-        self.embeddings: List[np.ndarray] = []
-        self.metadatas: List[Dict] = []
+    def __init__(
+        self,
+        shard_size: int = 65536,
+        max_workers: Optional[int] = None,
+        near_dup_distance: Optional[int] = None,
+        embedding_model: Optional[str] = None,
+        text_compression: bool = True,
+        text_cache_size: int = 1024,
+        text_dir: Optional[Path] = None,
+        reduced_dim: int = 0,
+        reduced_method: str = "pca",
+        rescore_candidates: int = 100
+    ):
+        # Model the stored vectors come from; queries must be embedded with it too
+        self.embedding_model = embedding_model
+        # Chunk texts live in a segment file; only offsets and a small LRU stay in memory
+        self.text_compression = text_compression
+        self.text_cache_size = text_cache_size
+        self.text_dir = text_dir
+        self.documents: ChunkTexts = ChunkTexts(text_compression, text_cache_size, text_dir)
+        # Per-document fields plus int columns per chunk; reads back as dicts
+        self.metadatas: ChunkMetadata = ChunkMetadata()
         self.ids: List[str] = []
         self.document_hashes: set = set()
+        # Content hash and chunk count per ingested file, keyed by source path
+        self.files: Dict[str, Dict] = {}
+        # SimHash fingerprints for near-duplicate detection; None disables it
+        self.near_dups: Optional[SimHashIndex] = (
+            SimHashIndex(near_dup_distance) if near_dup_distance is not None else None
+        )
+
+        # Embeddings live in one contiguous float32 matrix that grows in place,
+        # so shards are plain row slices and scoring is a BLAS mat-vec.
+        self._matrix: Optional[np.ndarray] = None
+        self._norms: Optional[np.ndarray] = None
+        self._size = 0
+        # Optional first pass over reduced embeddings; only the shortlist is scored at full dimension
+        self.reduced: Optional[ReducedIndex] = (
+            ReducedIndex(reduced_method, reduced_dim) if reduced_dim > 0 else None
+        )
+        self.rescore_candidates = max(1, rescore_candidates)
+
+        # Bumped on every mutation so owners can tell whether a save is due
+        self.version = next(_VERSIONS)
+        # catalog() result and the version it was built at
+        self._catalog: Optional[Tuple[int, List[Dict]]] = None
+
+        self.shard_size = max(1, shard_size)
+        self.max_workers = max(1, max_workers or os.cpu_count() or 1)
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """Stored embeddings as an (n_chunks, dim) matrix view"""
+        if self._matrix is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self._matrix[:self._size]
+
+    def _append_embeddings(self, rows: np.ndarray):
+        """Append embedding rows, growing the backing matrix geometrically"""
+        needed = self._size + len(rows)
+        if self._matrix is None:
+            self._matrix = np.empty((max(needed, 1024), rows.shape[1]), dtype=np.float32)
+            self._norms = np.empty(self._matrix.shape[0], dtype=np.float32)
+        elif needed > self._matrix.shape[0]:
+            capacity = max(needed, self._matrix.shape[0] * 2)
+            matrix = np.empty((capacity, self._matrix.shape[1]), dtype=np.float32)
+            norms = np.empty(capacity, dtype=np.float32)
+            matrix[:self._size] = self._matrix[:self._size]
+            norms[:self._size] = self._norms[:self._size]
+            self._matrix, self._norms = matrix, norms
+
+        self._matrix[self._size:needed] = rows
+        self._norms[self._size:needed] = np.linalg.norm(rows, axis=1)
+        self._size = needed
+        if self.reduced is not None:
+            self.reduced.append(rows, self.embeddings)
+
+    @property
+    def dim(self) -> int:
+        """Embedding dimension, 0 while the store is empty"""
+        return 0 if self._matrix is None else self._matrix.shape[1]
 
     def _compute_hash(self, text: str) -> str:
         """Compute hash for deduplication"""
         return hashlib.md5(text.encode()).hexdigest()
 
+    def has_source(self, source: str) -> bool:
+        """Whether any chunk of source is stored"""
+        if source in self.files:
+            return True
+        return bool(self.metadatas.document_ids("source", source))
+
+    def record_file(self, source: str, entry: Dict):
+        """Set an ingested file's entry (content hash, chunk count, size)"""
+        self.files[source] = entry
+        self.version = next(_VERSIONS)
+
+    def catalog(self) -> List[Dict]:
+        """One entry per filename: chunk count, source, upload date, type and size
+
+        Built from the per-document table in O(documents) and reused until
+        the store changes.
+        """
+        cached = self._catalog
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        version = self.version
+        by_filename: Dict[str, Dict] = {}
+        for doc, chunks in self.metadatas.chunk_counts():
+            filename = doc.get("filename", "Unknown")
+            entry = by_filename.get(filename)
+            if entry is None:
+                source = doc.get("source", "")
+                by_filename[filename] = {
+                    "filename": filename,
+                    "source": source,
+                    "chunks": chunks,
+                    "upload_date": doc.get("upload_date", ""),
+                    "file_type": doc.get("file_type", ""),
+                    "size": self.files.get(source, {}).get("size")
+                }
+            else:
+                entry["chunks"] += chunks
+        catalog = list(by_filename.values())
+        self._catalog = (version, catalog)
+        return catalog
+
+    def source_embeddings(self, source: str) -> Dict[str, np.ndarray]:
+        """Copies of the embeddings of source's chunks, keyed by chunk md5"""
+        return {
+            self._compute_hash(self.documents[i]): self._matrix[i].copy()
+            for i in self.metadatas.rows_for("source", source)
+        }
+
+    def find_duplicate(
+        self,
+        text: str,
+        ignore_source: Optional[str] = None,
+        ignore_hashes: Optional[set] = None,
+        ignore_fingerprints: Optional[Dict[int, int]] = None
+    ) -> Tuple[Optional[str], Optional[int]]:
+        """Classify text as an "exact" or "near" duplicate before it is embedded
+
+        Chunks of ignore_source (with md5s ignore_hashes) are disregarded, so a
+        file being replaced isn't deduplicated against its own old version;
+        ignore_fingerprints is that source's precomputed source_counts().
+        Also returns the text's SimHash so add() doesn't compute it twice.
+        """
+        doc_hash = self._compute_hash(text)
+        if doc_hash in self.document_hashes and doc_hash not in (ignore_hashes or ()):
+            return "exact", None
+        if self.near_dups is None:
+            return None, None
+        fingerprint = simhash(text)
+        if fingerprint is not None and self.near_dups.find(fingerprint, ignore_source, ignore_fingerprints) is not None:
+            return "near", fingerprint
+        return None, fingerprint
+
     def add(
         self,
         ids: List[str],
         embeddings: List[List[float]],
         documents: List[str],
-        metadatas: List[Dict]
+        metadatas: List[Dict],
+        fingerprints: Optional[List[Optional[int]]] = None
     ):
         """Add documents with deduplication"""
-        for id_, emb, doc, meta in zip(ids, embeddings, documents, metadatas):
+        new_rows = []
+        for j, (id_, emb, doc, meta) in enumerate(zip(ids, embeddings, documents, metadatas)):
             doc_hash = self._compute_hash(doc)
             
             # Skip if duplicate
@@ -50,11 +314,34 @@ class SimpleVectorStore:
                 continue
             
             self.ids.append(id_)
-            self.embeddings.append(np.array(emb, dtype=np.float32))
+            new_rows.append(emb)
             self.documents.append(doc)
             self.metadatas.append(meta)
             self.document_hashes.add(doc_hash)
 
+            if self.near_dups is not None:
+                fingerprint = fingerprints[j] if fingerprints is not None else simhash(doc)
+                if fingerprint is not None:
+                    self.near_dups.add(fingerprint, meta.get("source", ""))
+
+        if new_rows:
+            self._append_embeddings(np.asarray(new_rows, dtype=np.float32))
+            self.version = next(_VERSIONS)
+
+    def memory_bytes(self) -> int:
+        """Approximate resident size of embeddings, chunk text offsets and cache, and metadata"""
+        matrix_bytes = 0 if self._matrix is None else self._matrix.nbytes + self._norms.nbytes
+        if self.reduced is not None:
+            matrix_bytes += self.reduced.memory_bytes()
+        return matrix_bytes + self.documents.memory_bytes() + self.metadatas.memory_bytes()
+
+    def search_queue_depth(self) -> int:
+        """Shard tasks queued or running (in the pool this store shares)"""
+        pool = _SEARCH_POOLS.get(self.max_workers)
+        if pool is None:
+            return 0
+        return pool.queue_depth()
+
     @staticmethod
     def cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
         """Calculate cosine similarity between two vectors"""
@@ -66,13 +353,33 @@ class SimpleVectorStore:
             
         return float(np.dot(a, b) / (norm_a * norm_b))
 
+    def _score_shard(
+        self,
+        query_vec: np.ndarray,
+        start: int,
+        end: int,
+        k: int
+    ) -> List[Tuple[float, int]]:
+        """Score one shard and return its local top-k as (similarity, index)"""
+        norms = self._norms[start:end]
+        # BLAS releases the GIL here, which is what lets shards run in parallel
+        similarities = self._matrix[start:end] @ query_vec
+        np.divide(similarities, norms, out=similarities, where=norms > 0)
+
+        if k < len(similarities):
+            top = np.argpartition(similarities, -k)[-k:]
+        else:
+            top = np.arange(len(similarities))
+
+        return list(zip(similarities[top].tolist(), (top + start).tolist()))
+
     def query(
         self,
         query_embedding: List[float],
         n_results: int = 3
     ) -> Dict:
         """Query vector store for similar documents"""
-        if not self.embeddings:
+        if self._size == 0:
             return {
                 "documents": [[]],
                 "metadatas": [[]],
@@ -80,22 +387,98 @@ class SimpleVectorStore:
                 "ids": [[]]
             }
 
-        query_vec = np.array(query_embedding, dtype=np.float32)
-        # Calculate similarity with every stored embedding
-        similarities = [
-            self.cosine_similarity(query_vec, emb)
-            for emb in self.embeddings
+        query_vec = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query_vec)
+        if query_norm > 0:
+            query_vec = query_vec / query_norm
+
+        k = min(n_results, self._size)
+        if self._use_reduced(k):
+            return self._results(self._rescore(query_vec[None, :], k)[0])
+        shards = [
+            (start, min(start + self.shard_size, self._size))
+            for start in range(0, self._size, self.shard_size)
         ]
 
-        top_indices = np.argsort(similarities)[-n_results:][::-1]
+        if len(shards) == 1 or self.max_workers == 1:
+            shard_results = [self._score_shard(query_vec, s, e, k) for s, e in shards]
+        else:
+            pool = _search_pool(self.max_workers)
+            futures = [pool.submit(self._score_shard, query_vec, s, e, k) for s, e in shards]
+            shard_results = [future.result() for future in futures]
+
+        # Merge the per-shard candidates into the global top-k
+        return self._results(heapq.nlargest(k, (hit for hits in shard_results for hit in hits)))
 
+    def _results(self, top: List[Tuple[float, int]]) -> Dict:
+        """query()-shaped result for (similarity, index) hits, best first"""
         return {
-            "documents": [[self.documents[i] for i in top_indices]],
-            "metadatas": [[self.metadatas[i] for i in top_indices]],
-            "distances": [[1 - similarities[i] for i in top_indices]],
-            "ids": [[self.ids[i] for i in top_indices]]
+            "documents": [[self.documents[i] for _, i in top]],
+            "metadatas": [[self.metadatas[i] for _, i in top]],
+            "distances": [[1 - sim for sim, _ in top]],
+            "ids": [[self.ids[i] for _, i in top]]
         }
 
+    def _use_reduced(self, k: int) -> bool:
+        """Whether the reduced index is current and a shortlist would skip most rows"""
+        return (
+            self.reduced is not None
+            and self.reduced.size == self._size
+            and self._size > 2 * max(self.rescore_candidates, k)
+        )
+
+    def _rescore(self, queries: np.ndarray, k: int) -> List[List[Tuple[float, int]]]:
+        """Top-k per (unit-length) query: a reduced-dimension shortlist, re-scored at full dimension"""
+        candidates = self.reduced.shortlist(queries, max(self.rescore_candidates, k), self._size)
+        results = []
+        for q in range(len(queries)):
+            rows = np.sort(candidates[:, q])
+            norms = self._norms[rows]
+            similarities = self._matrix[rows] @ queries[q]
+            np.divide(similarities, norms, out=similarities, where=norms > 0)
+            top = np.argpartition(similarities, -k)[-k:] if k < len(rows) else np.arange(len(rows))
+            results.append(heapq.nlargest(k, zip(similarities[top].tolist(), rows[top].tolist())))
+        return results
+
+    def query_batch(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 3
+    ) -> List[Dict]:
+        """Query many embeddings at once; one result per query, shaped like query()
+
+        Each shard is scored against all queries with a single matrix-matrix
+        multiply, which reads the embedding matrix once per batch instead of
+        once per query.
+        """
+        if self._size == 0 or not len(query_embeddings):
+            return [self.query([], n_results) for _ in query_embeddings]
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        query_norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        np.divide(queries, query_norms, out=queries, where=query_norms > 0)
+
+        k = min(n_results, self._size)
+        if self._use_reduced(k):
+            return [self._results(top) for top in self._rescore(queries, k)]
+        candidates: List[List[Tuple[float, int]]] = [[] for _ in range(len(queries))]
+        for start in range(0, self._size, self.shard_size):
+            end = min(start + self.shard_size, self._size)
+            norms = self._norms[start:end, None]
+            # (shard rows, queries) similarity block
+            similarities = self._matrix[start:end] @ queries.T
+            np.divide(similarities, norms, out=similarities, where=norms > 0)
+
+            if k < end - start:
+                top = np.argpartition(similarities, -k, axis=0)[-k:]
+            else:
+                top = np.broadcast_to(np.arange(end - start)[:, None], similarities.shape)
+            scores = np.take_along_axis(similarities, top, axis=0)
+            for q in range(len(queries)):
+                candidates[q].extend(zip(scores[:, q].tolist(), (top[:, q] + start).tolist()))
+
+        return [self._results(heapq.nlargest(k, hits)) for hits in candidates]
+
     def get(self) -> Dict:
         """Get all documents"""
         return {
@@ -106,21 +489,34 @@ class SimpleVectorStore:
 
     def delete_by_source(self, source: str) -> int:
         """Delete all documents from a specific source"""
-        indices_to_remove = []
-        
-        for i, meta in enumerate(self.metadatas):
-            if meta.get("source") == source:
-                indices_to_remove.append(i)
+        indices_to_remove = self.metadatas.rows_for("source", source).tolist()
         
         # Remove in reverse order to maintain indices
-        for i in sorted(indices_to_remove, reverse=True):
+        for i in reversed(indices_to_remove):
             doc_hash = self._compute_hash(self.documents[i])
             self.document_hashes.discard(doc_hash)
             
             del self.ids[i]
-            del self.embeddings[i]
             del self.documents[i]
-            del self.metadatas[i]
+
+        if indices_to_remove:
+            self.metadatas.delete_rows(indices_to_remove)
+            if not self._matrix.flags.writeable:
+                # Mapped from a shared generation; compact a private copy instead
+                self._matrix, self._norms = np.array(self._matrix), np.array(self._norms)
+            keep = np.ones(self._size, dtype=bool)
+            keep[indices_to_remove] = False
+            remaining = int(keep.sum())
+            self._matrix[:remaining] = self._matrix[:self._size][keep]
+            self._norms[:remaining] = self._norms[:self._size][keep]
+            self._size = remaining
+            if self.reduced is not None:
+                self.reduced.keep(keep)
+            self.version = next(_VERSIONS)
+
+        if self.near_dups is not None:
+            self.near_dups.remove_source(source)
+        self.files.pop(source, None)
         
         logger.info(f"Removed {len(indices_to_remove)} chunks from {source}")
         return len(indices_to_remove)
@@ -128,39 +524,169 @@ class SimpleVectorStore:
     def clear(self):
         """Clear all data"""
         self.documents.clear()
-        self.embeddings.clear()
         self.metadatas.clear()
         self.ids.clear()
         self.document_hashes.clear()
+        self.files.clear()
+        if self.near_dups is not None:
+            self.near_dups.clear()
+        self._matrix = None
+        self._norms = None
+        self._size = 0
+        if self.reduced is not None:
+            self.reduced.clear()
+        self.version = next(_VERSIONS)
+
+    def _state(self) -> Dict:
+        """Everything but the embeddings, in the on-disk layout"""
+        return {
+            "ids": self.ids,
+            "chunk_metadata": self.metadatas.to_dict(),
+            "document_hashes": list(self.document_hashes),
+            "files": self.files,
+            "near_duplicates": self.near_dups.to_dict() if self.near_dups is not None else None,
+            "embedding_model": self.embedding_model,
+            "embedding_dim": self.dim,
+            "reduced_index": self.reduced.to_dict() if self.reduced is not None else None
+        }
+
+    def _restore(self, data: Dict, directory: Optional[Path] = None, writable: bool = True):
+        """Adopt a _state() dict; chunk texts come from a segment in directory, or inline"""
+        self.clear()
+        self.ids = data["ids"]
+        texts = data.get("chunk_texts")
+        if texts is not None:
+            self.documents = ChunkTexts.open(
+                Path(directory) / texts["segment"], texts, self.text_cache_size, writable, self.text_dir
+            )
+        elif isinstance(data.get("documents"), ChunkTexts):
+            self.documents = data["documents"]
+        else:
+            # Older knowledge bases pickled the texts inline; they move to a segment on the next save
+            self.documents = ChunkTexts(self.text_compression, self.text_cache_size, self.text_dir or directory)
+            self.documents.extend(data["documents"])
+        metadata = data.get("chunk_metadata")
+        if isinstance(metadata, ChunkMetadata):
+            self.metadatas = metadata
+        elif metadata is not None:
+            self.metadatas = ChunkMetadata.from_dict(metadata)
+        else:
+            # Older knowledge bases pickled one dict per chunk
+            self.metadatas = ChunkMetadata()
+            self.metadatas.extend(data["metadatas"])
+        self.document_hashes = set(data.get("document_hashes", []))
+        self.files = data.get("files", {})
+        # Knowledge bases from before the model was recorded keep the configured one
+        self.embedding_model = data.get("embedding_model") or self.embedding_model
+        if self.reduced is not None and data.get("reduced_index"):
+            # The saved projection is reused if it matches the configured reduction
+            self.reduced = ReducedIndex.from_dict(data["reduced_index"], self.reduced.method, self.reduced.dim)
+        if self.near_dups is not None:
+            if data.get("near_duplicates"):
+                self.near_dups = SimHashIndex.from_dict(data["near_duplicates"], self.near_dups.max_distance)
+            elif self.documents:
+                # Fingerprinting a large legacy KB here would stall startup;
+                # only chunks added from now on are checked for near-duplicates
+                logger.info("Knowledge base has no near-duplicate index; indexing new chunks only")
+
+    def with_embeddings(self, embeddings: np.ndarray, embedding_model: str) -> "SimpleVectorStore":
+        """A copy of this store over another embedding matrix (one row per chunk, in order)"""
+        store = SimpleVectorStore(
+            shard_size=self.shard_size,
+            max_workers=self.max_workers,
+            near_dup_distance=self.near_dups.max_distance if self.near_dups is not None else None,
+            text_compression=self.text_compression,
+            text_cache_size=self.text_cache_size,
+            text_dir=self.text_dir,
+            reduced_dim=self.reduced.dim if self.reduced is not None else 0,
+            reduced_method=self.reduced.method if self.reduced is not None else "pca",
+            rescore_candidates=self.rescore_candidates
+        )
+        # Own copies, so later writes to the copy never show through the old store
+        store._restore({
+            **self._state(),
+            "ids": list(self.ids),
+            "documents": self.documents.copy(),
+            "chunk_metadata": self.metadatas.copy(),
+            "files": dict(self.files),
+            "embedding_model": embedding_model,
+            # Another model's vectors need their own projection
+            "reduced_index": None
+        })
+        if len(embeddings):
+            store._append_embeddings(np.asarray(embeddings, dtype=np.float32))
+        return store
 
     def save(self, filepath: str):
         """Save vector store to disk"""
         try:
-            data = {
-                "ids": self.ids,
-                "embeddings": [emb.tolist() for emb in self.embeddings],
-                "documents": self.documents,
-                "metadatas": self.metadatas,
-                "document_hashes": list(self.document_hashes)
-            }
-            with open(filepath, "wb") as f:
-                pickle.dump(data, f)
+            path = Path(filepath)
+            with KB_PERSISTENCE_SECONDS.labels("save").time():
+                # Texts first: the index must never refer to a segment that isn't fully written
+                texts = self.documents.persist(path.parent, path.stem)
+                data = {**self._state(), "chunk_texts": texts, "embeddings": np.ascontiguousarray(self.embeddings)}
+                # Write beside the target and swap, so other processes never read a partial file
+                tmp_path = f"{filepath}.tmp"
+                with open(tmp_path, "wb") as f:
+                    pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, filepath)
+            remove_stale_segments(path.parent, path.stem, texts["segment"])
             logger.info(f"Saved vector store to {filepath}")
         except Exception as e:
             logger.error(f"Error saving vector store: {e}")
             raise
 
-    def load(self, filepath: str):
-        """Load vector store from disk"""
+    def save_generation(self, directory: str):
+        """Write the store as raw .npy matrices plus a pickle of everything else
+
+        The matrices can be memory-mapped by other processes (load_generation),
+        and so can the generation's own copy of the chunk text segment.
+        """
+        directory = Path(directory)
+        if self._size:
+            np.save(directory / "embeddings.npy", np.ascontiguousarray(self.embeddings))
+            np.save(directory / "norms.npy", np.ascontiguousarray(self._norms[:self._size]))
+        texts = self.documents.copy_to(directory / "texts.chunks")
+        with open(directory / "state.pkl", "wb") as f:
+            pickle.dump({**self._state(), "chunk_texts": texts}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load_generation(self, directory: str):
+        """Load a save_generation() directory, sharing its matrices read-only via mmap
+
+        The mapped matrix has no spare capacity, so a later add() copies it
+        into private memory instead of writing to the shared file.
+        """
+        directory = Path(directory)
+        with open(directory / "state.pkl", "rb") as f:
+            self._restore(pickle.load(f), directory, writable=False)
+        if self.ids:
+            self._matrix = np.load(directory / "embeddings.npy", mmap_mode="r")
+            self._norms = np.load(directory / "norms.npy", mmap_mode="r")
+            self._size = len(self._matrix)
+            if self.reduced is not None:
+                self.reduced.rebuild(self.embeddings)
+
+    def load(self, filepath: str, progress: Optional[Callable[[float], None]] = None):
+        """Load vector store from disk, optionally reporting progress (0-1)"""
         try:
+            start = time.perf_counter()
             with open(filepath, "rb") as f:
+                if progress is not None:
+                    # Reading dominates load time, so bytes read track progress well
+                    f = _ProgressReader(f, Path(filepath).stat().st_size, progress)
                 data = pickle.load(f)
 
-            self.ids = data["ids"]
-            self.embeddings = [np.array(e, dtype=np.float32) for e in data["embeddings"]]
-            self.documents = data["documents"]
-            self.metadatas = data["metadatas"]
-            self.document_hashes = set(data.get("document_hashes", []))
+            self._restore(data, Path(filepath).parent)
+            if data.get("chunk_texts"):
+                # Segments a previous run couldn't delete (still mapped at the time)
+                remove_stale_segments(Path(filepath).parent, Path(filepath).stem, data["chunk_texts"]["segment"])
+            # Older knowledge bases stored embeddings as a list of lists
+            embeddings = np.asarray(data["embeddings"], dtype=np.float32)
+            if len(embeddings):
+                self._append_embeddings(embeddings)
+            KB_PERSISTENCE_SECONDS.labels("load").observe(time.perf_counter() - start)
+            if progress is not None:
+                progress(1.0)
             
             logger.info(f"Loaded vector store from {filepath}")
         except Exception as e:
@@ -172,14 +698,160 @@ class SimpleVectorStore:
 # Document Processing
 # =========================
 
+class _ColumnStats:
+    """One-pass count/mean/std/min/max for a column (Chan et al. batch merge)"""
+
+    __slots__ = ("count", "numeric", "mean", "m2", "min", "max", "distinct")
+
+    DISTINCT_CAP = 1000
+
+    def __init__(self):
+        self.count = 0
+        self.numeric = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.distinct: Optional[set] = set()
+
+    def update(self, column: List[str]):
+        """Merge a batch of cells; empty strings count as missing"""
+        filled = len(column) - column.count("")
+        try:
+            nums = np.array(column, dtype=np.float64)
+        except ValueError:
+            if self.count and self.numeric < self.count / 2:
+                # Already a text column; parsing every cell again is wasted work
+                nums = np.empty(0)
+            else:
+                import pandas as pd
+                nums = pd.to_numeric(pd.Series(column, dtype=object), errors="coerce").to_numpy(dtype=np.float64)
+        nums = nums[~np.isnan(nums)]
+        texts = set(column)
+        texts.discard("")
+        self.count += filled
+        if len(nums):
+            n_a, n_b = self.numeric, len(nums)
+            mean_b = float(nums.mean())
+            m2_b = float(((nums - mean_b) ** 2).sum())
+            delta = mean_b - self.mean
+            total = n_a + n_b
+            self.mean += delta * n_b / total
+            self.m2 += m2_b + delta * delta * n_a * n_b / total
+            self.numeric = total
+            self.min = min(self.min, float(nums.min()))
+            self.max = max(self.max, float(nums.max()))
+        if self.distinct is not None:
+            self.distinct |= texts
+            if len(self.distinct) > self.DISTINCT_CAP:
+                self.distinct = None
+
+    def describe(self, name: str) -> str:
+        # Mostly-numeric columns get moments; everything else a cardinality
+        if self.numeric and self.numeric >= self.count / 2:
+            std = (self.m2 / (self.numeric - 1)) ** 0.5 if self.numeric > 1 else 0.0
+            return (
+                f"{name}: count={self.numeric}, mean={self.mean:.6g}, std={std:.6g}, "
+                f"min={self.min:.6g}, max={self.max:.6g}"
+            )
+        unique = len(self.distinct) if self.distinct is not None else f"{self.DISTINCT_CAP}+"
+        return f"{name}: count={self.count}, unique={unique}"
+
+
+class _TableChunker:
+    """Group table rows into chunks that repeat the header, and summarize in one pass"""
+
+    def __init__(self, title: str, columns: List[str], chunk_words: int):
+        self.title = title
+        self.columns = columns
+        self.chunk_words = chunk_words
+        self.stats = [_ColumnStats() for _ in columns]
+        self.rows = 0
+
+        self._header = "Columns: " + " | ".join(columns)
+        self._header_words = len(self._header.split())
+        self._lines: List[str] = []
+        self._words = 0
+        self._first_row = 1
+
+    @staticmethod
+    def _cell(value) -> str:
+        if value is None:
+            return ""
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return str(value).strip()
+
+    def _flush(self) -> str:
+        last_row = self._first_row + len(self._lines) - 1
+        chunk = "\n".join(
+            [f"{self.title} | Rows {self._first_row}-{last_row}", self._header] + self._lines
+        )
+        self._first_row = last_row + 1
+        self._lines = []
+        self._words = 0
+        return chunk
+
+    def add_rows(self, rows) -> Iterator[str]:
+        """Consume a batch of raw rows (e.g. from a worksheet), skipping blank ones"""
+        width = len(self.columns)
+        cleaned = []
+        for row in rows:
+            cells = [self._cell(v) for v in row[:width]]
+            if any(cells):
+                cleaned.append(cells + [""] * (width - len(cells)))
+        if cleaned:
+            yield from self.add_columns([list(column) for column in zip(*cleaned)])
+
+    def add_columns(self, columns: List[List[str]]) -> Iterator[str]:
+        """Consume a batch given column-wise as strings, yielding every chunk that fills up"""
+        for stat, column in zip(self.stats, columns):
+            stat.update(column)
+
+        for line in map(" | ".join, zip(*columns)):
+            words = len(line.split())
+            if self._lines and self._header_words + self._words + words > self.chunk_words:
+                yield self._flush()
+            self._lines.append(line)
+            self._words += words
+            self.rows += 1
+
+    def finish(self) -> Iterator[str]:
+        """Yield the partial last chunk and the summary chunk"""
+        if self._lines:
+            yield self._flush()
+        yield "\n".join([
+            self.title,
+            f"Rows: {self.rows}",
+            f"Columns: {', '.join(self.columns)}",
+            "",
+            "Statistical Summary:",
+            "=" * 60,
+            *(stat.describe(name) for name, stat in zip(self.columns, self.stats))
+        ])
+
+
 class DocumentProcessor:
     """Extract text from supported document formats"""
 
+    # Tabular files are streamed: rows read per batch, and words per chunk
+    TABLE_READ_ROWS = 10000
+    TABLE_CHUNK_WORDS = 500
+    TABLE_EXTS = {".csv", ".xlsx", ".xls"}
+    CODE_EXTS = {
+        ".html", ".css", ".js", ".jsx", ".json", ".cpp", ".py", ".ts", ".tsx",
+        ".md", ".env", ".bat", ".sh", ".php", ".cs", ".rb", ".java", ".go",
+        ".rs", ".yaml", ".yml", ".xml", ".sql", ".c", ".h"
+    }
+    IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".svg", ".ico", ".gif", ".tif", ".tiff", ".webp", ".bmp"}
+
     @staticmethod
     def read_txt(path: str) -> str:
         """Read plain text file"""
         try:
-            return Path(path).read_text(encoding="utf-8", errors="ignore")
+            return DocumentProcessor.decode_text(Path(path).read_bytes())
         except Exception as e:
             logger.error(f"Error reading TXT file {path}: {e}")
             raise
@@ -187,6 +859,8 @@ class DocumentProcessor:
     @staticmethod
     def read_pdf(path: str) -> str:
         """Extract text from PDF"""
+        import PyPDF2
+
         try:
             text = ""
             with open(path, "rb") as f:
@@ -202,6 +876,8 @@ class DocumentProcessor:
     @staticmethod
     def read_docx(path: str) -> str:
         """Extract text from DOCX"""
+        from docx import Document
+
         try:
             doc = Document(path)
             text = "\n".join(p.text for p in doc.paragraphs if p.text.strip())
@@ -211,73 +887,111 @@ class DocumentProcessor:
             raise
 
     @staticmethod
-    def read_excel(path: str) -> str:
-        """Convert Excel to text with better formatting"""
+    def read_excel(path: str) -> Iterator[str]:
+        """Stream Excel rows into chunks, one sheet at a time"""
+        filename = Path(path).name
+
         try:
-            # Try reading with openpyxl (for .xlsx)
-            try:
-                df = pd.read_excel(path, engine='openpyxl')
-            except ImportError:
+            if Path(path).suffix.lower() == ".xls":
                 try:
-                    df = pd.read_excel(path, engine='xlrd')
+                    import xlrd
                 except ImportError:
-                    raise ImportError(
-                        "Missing Excel dependencies. Install with: "
-                        "pip install openpyxl xlrd"
-                    )
-            
-            filename = Path(path).name
-            
-            # Create a more readable representation
-            text_parts = [
-                f"Excel File: {filename}",
-                f"Rows: {len(df)}",
-                f"Columns: {', '.join(df.columns.tolist())}",
-                "",
-                "Data Preview (first 10 rows):",
-                "=" * 60,
-                df.head(10).to_string(index=False),
-                "",
-                "Statistical Summary:",
-                "=" * 60,
-                df.describe().to_string() if len(df) > 0 else "No numeric data"
-            ]
-            
-            return "\n".join(text_parts)
-            
+                    raise ImportError("Missing Excel dependencies. Install with: pip install xlrd")
+
+                book = xlrd.open_workbook(path, on_demand=True)
+                try:
+                    for sheet_name in book.sheet_names():
+                        sheet = book.sheet_by_name(sheet_name)
+                        rows = (sheet.row_values(i) for i in range(sheet.nrows))
+                        yield from DocumentProcessor._chunk_sheet(filename, sheet_name, rows)
+                        book.unload_sheet(sheet_name)
+                finally:
+                    book.release_resources()
+                return
+
+            try:
+                from openpyxl import load_workbook
+            except ImportError:
+                raise ImportError("Missing Excel dependencies. Install with: pip install openpyxl")
+
+            # read_only keeps a single row in memory instead of the whole sheet
+            book = load_workbook(path, read_only=True, data_only=True)
+            try:
+                for sheet in book.worksheets:
+                    rows = sheet.iter_rows(values_only=True)
+                    yield from DocumentProcessor._chunk_sheet(filename, sheet.title, rows)
+            finally:
+                book.close()
+
         except Exception as e:
             logger.error(f"Error reading Excel file {path}: {e}")
             raise
 
     @staticmethod
-    def read_csv(path: str) -> str:
-        """Convert CSV to text with better formatting"""
+    def _chunk_sheet(filename: str, sheet_name: str, rows: Iterator[tuple]) -> Iterator[str]:
+        """Chunk one worksheet whose first row is the header"""
+        header = next(rows, None)
+        if header is None:
+            return
+
+        table = _TableChunker(
+            f"Excel File: {filename} | Sheet: {sheet_name}",
+            [str(h) if h not in (None, "") else f"column_{i + 1}" for i, h in enumerate(header)],
+            DocumentProcessor.TABLE_CHUNK_WORDS
+        )
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= DocumentProcessor.TABLE_READ_ROWS:
+                yield from table.add_rows(batch)
+                batch = []
+        if batch:
+            yield from table.add_rows(batch)
+        yield from table.finish()
+
+    @staticmethod
+    def read_csv(path: str) -> Iterator[str]:
+        """Stream CSV rows into chunks in fixed-size batches"""
+        import pandas as pd
+
+        filename = Path(path).name
+
         try:
-            # Try UTF-8 first
+            # Sniff the encoding from the head of the file; the rest of a
+            # large file is decoded leniently rather than read twice
+            with open(path, "rb") as f:
+                head = f.read(1 << 20)
             try:
-                df = pd.read_csv(path, encoding="utf-8")
-            except UnicodeDecodeError:
-                df = pd.read_csv(path, encoding="latin-1")
-            
-            filename = Path(path).name
-            
-            # Create a more readable representation
-            text_parts = [
-                f"CSV File: {filename}",
-                f"Rows: {len(df)}",
-                f"Columns: {', '.join(df.columns.tolist())}",
-                "",
-                "Data Preview (first 10 rows):",
-                "=" * 60,
-                df.head(10).to_string(index=False),
-                "",
-                "Statistical Summary:",
-                "=" * 60,
-                df.describe().to_string() if len(df) > 0 else "No numeric data"
-            ]
-            
-            return "\n".join(text_parts)
-            
+                head.decode("utf-8")
+                encoding = "utf-8"
+            except UnicodeDecodeError as e:
+                # A multi-byte character cut off at the sniff boundary is fine
+                encoding = "utf-8" if e.start >= len(head) - 3 else "latin-1"
+
+            with open(path, "r", encoding=encoding, errors="replace", newline="") as f:
+                reader = pd.read_csv(
+                    f,
+                    chunksize=DocumentProcessor.TABLE_READ_ROWS,
+                    dtype=str,
+                    keep_default_na=False,
+                    skipinitialspace=True
+                )
+                table = None
+                for frame in reader:
+                    if table is None:
+                        table = _TableChunker(
+                            f"CSV File: {filename}",
+                            [str(c) for c in frame.columns],
+                            DocumentProcessor.TABLE_CHUNK_WORDS
+                        )
+                    frame = frame.fillna("")
+                    yield from table.add_columns([frame[c].tolist() for c in frame.columns])
+
+                if table is not None:
+                    yield from table.finish()
+
+        except pd.errors.EmptyDataError:
+            logger.warning(f"CSV file {path} is empty")
         except Exception as e:
             logger.error(f"Error reading CSV file {path}: {e}")
             raise
@@ -307,39 +1021,78 @@ To view its contents, ask about this specific image."""
             logger.error(f"Error processing image {path}: {e}")
             return f"Image: {Path(path).name}\n[Error: {str(e)}]"
 
+    @staticmethod
+    def decode_text(raw: bytes) -> str:
+        """Decode file bytes as read_text() would: UTF-8, bad bytes dropped, newlines normalized"""
+        return raw.decode("utf-8", errors="ignore").replace("\r\n", "\n").replace("\r", "\n")
+
+    @staticmethod
+    def code_text(path: str, content: str) -> str:
+        """A code file's text with a header naming the file and its type"""
+        filename = Path(path).name
+        ext = Path(path).suffix
+        
+        # Add metadata header
+        header = f"File: {filename}\nType: {ext} file\n\n"
+        return header + content
+
+    @classmethod
+    def is_plain_text(cls, path: str) -> bool:
+        """Whether the file's text is its bytes decoded (no parser needed)"""
+        ext = Path(path).suffix.lower()
+        return ext == ".txt" or ext in cls.CODE_EXTS
+
+    @classmethod
+    def text_from_bytes(cls, path: str, raw: bytes) -> str:
+        """What process() returns for a plain text or code file, from bytes already in memory"""
+        text = cls.decode_text(raw)
+        if Path(path).suffix.lower() in cls.CODE_EXTS:
+            return cls.code_text(path, text)
+        return text
+
     @staticmethod
     def read_code(path: str) -> str:
         """Read programming/code files"""
         try:
-            content = Path(path).read_text(encoding="utf-8", errors="ignore")
-            filename = Path(path).name
-            ext = Path(path).suffix
-            
-            # Add metadata header
-            header = f"File: {filename}\nType: {ext} file\n\n"
-            return header + content
+            return DocumentProcessor.code_text(path, DocumentProcessor.decode_text(Path(path).read_bytes()))
         except Exception as e:
             logger.error(f"Error reading code file {path}: {e}")
             raise
 
+    @staticmethod
+    def file_hash(path: str) -> str:
+        """SHA-256 of a file's bytes, read in blocks"""
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        return sha.hexdigest()
+
+    @staticmethod
+    def _timed_chunks(chunks: Iterator[str], ext: str) -> Iterator[str]:
+        """Observe parse time of a streaming reader, excluding the consumer's work"""
+        elapsed = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - start
+                yield chunk
+        finally:
+            DOCUMENT_PARSE_SECONDS.labels(ext).observe(elapsed)
+
     @classmethod
-    def process(cls, path: str) -> str:
-        """Process document and extract text"""
+    def process(cls, path: str) -> Union[str, Iterator[str]]:
+        """Process document and extract text, or stream ready-made chunks for tables"""
         if not Path(path).exists():
             raise FileNotFoundError(f"File not found: {path}")
         
         ext = Path(path).suffix.lower()
 
-        # Image extensions
-        image_exts = {".png", ".jpg", ".jpeg", ".svg", ".ico", ".gif", ".tif", ".tiff", ".webp", ".bmp"}
-        
-        # Code/text extensions
-        code_exts = {
-            ".html", ".css", ".js", ".jsx", ".json", ".cpp", ".py", ".ts", ".tsx",
-            ".md", ".env", ".bat", ".sh", ".php", ".cs", ".rb", ".java", ".go",
-            ".rs", ".yaml", ".yml", ".xml", ".sql", ".c", ".h"
-        }
-
         handlers = {
             ".txt": cls.read_txt,
             ".pdf": cls.read_pdf,
@@ -351,44 +1104,212 @@ To view its contents, ask about this specific image."""
         }
         
         # Add image handler for all image types
-        for img_ext in image_exts:
+        for img_ext in cls.IMAGE_EXTS:
             handlers[img_ext] = cls.read_image
         
         # Add code handler for all code types
-        for code_ext in code_exts:
+        for code_ext in cls.CODE_EXTS:
             handlers[code_ext] = cls.read_code
 
         if ext not in handlers:
             raise ValueError(f"Unsupported file type: {ext}")
 
         logger.info(f"Processing {ext} file: {path}")
-        return handlers[ext](path)
+        if ext in cls.TABLE_EXTS:
+            return cls._timed_chunks(handlers[ext](path), ext)
+        with DOCUMENT_PARSE_SECONDS.labels(ext).time():
+            return handlers[ext](path)
+
+
+# =========================
+# Model Throughput Stats
+# =========================
+
+class ModelStatsTracker:
+    """Aggregate per-model latency and token throughput from Ollama responses"""
+
+    def __init__(self):
+        self._stats: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, response: Dict, total_ms: float):
+        """Fold one chat response's counters into the model's totals"""
+        with self._lock:
+            stats = self._stats.setdefault(model, {
+                "requests": 0,
+                "total_ms": 0.0,
+                "load_ns": 0,
+                "cold_loads": 0,
+                "prompt_tokens": 0,
+                "prompt_eval_ns": 0,
+                "generated_tokens": 0,
+                "eval_ns": 0
+            })
+            stats["requests"] += 1
+            stats["total_ms"] += total_ms
+            load_ns = response.get("load_duration") or 0
+            stats["load_ns"] += load_ns
+            # Warm requests still report a few ms of load time
+            stats["cold_loads"] += int(load_ns > 1e9)
+            stats["prompt_tokens"] += response.get("prompt_eval_count") or 0
+            stats["prompt_eval_ns"] += response.get("prompt_eval_duration") or 0
+            stats["generated_tokens"] += response.get("eval_count") or 0
+            stats["eval_ns"] += response.get("eval_duration") or 0
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Averages and throughput per model"""
+        with self._lock:
+            items = [(model, dict(stats)) for model, stats in self._stats.items()]
+
+        result = {}
+        for model, s in items:
+            result[model] = {
+                "requests": s["requests"],
+                "avg_latency_ms": round(s["total_ms"] / s["requests"], 2),
+                "avg_load_ms": round(s["load_ns"] / s["requests"] / 1e6, 2),
+                "cold_loads": s["cold_loads"],
+                "prompt_tokens": s["prompt_tokens"],
+                "generated_tokens": s["generated_tokens"],
+                "prompt_tokens_per_second": (
+                    round(s["prompt_tokens"] / (s["prompt_eval_ns"] / 1e9), 2)
+                    if s["prompt_eval_ns"] else None
+                ),
+                "generation_tokens_per_second": (
+                    round(s["generated_tokens"] / (s["eval_ns"] / 1e9), 2)
+                    if s["eval_ns"] else None
+                )
+            }
+        return result
 
 
 # =========================
 # RAG Engine
 # =========================
 
+SYSTEM_PROMPT = (
+    "You are a helpful AI assistant. Answer the user's question to the best of your ability. "
+    "When a message includes context from the user's documents, use it to answer accurately; "
+    "if the context doesn't contain relevant information, politely say so and provide a general "
+    "response if possible."
+)
+
 class RAGChatbot:
     """Enhanced RAG chatbot with error handling and features"""
 
     def __init__(
         self,
         model: str = "ministral-3",
-        embedding_model: str = "nomic-embed-text"
+        embedding_model: str = "nomic-embed-text",
+        search_shard_size: int = 65536,
+        search_workers: Optional[int] = None,
+        near_dup_distance: Optional[int] = 3,
+        chunk_text_compression: bool = True,
+        chunk_text_cache_size: int = 1024,
+        reduced_dim: int = 0,
+        reduced_method: str = "pca",
+        rescore_candidates: int = 100,
+        image_cache_dir: Optional[Path] = None,
+        vision_max_side: int = 1024,
+        vision_cache_size: int = 256,
+        image_captioning: bool = False,
+        caption_model: Optional[str] = None,
+        kb_path: Optional[Path] = None,
+        collections_dir: Optional[Path] = None,
+        collection_idle_seconds: float = 900.0,
+        collection_memory_cap_bytes: int = 0,
+        context_token_budget: int = 1536,
+        model_context_budgets: Optional[Dict[str, int]] = None,
+        context_min_tokens: int = 640,
+        memory_dir: Optional[Path] = None,
+        memory_recent_turns: int = 6,
+        memory_history_tokens: int = 512,
+        summary_model: Optional[str] = None
     ):
         self.model = model
         self.embedding_model = embedding_model
-        self.vector_store = SimpleVectorStore()
+        self.near_dup_distance = near_dup_distance
+        kb_path = kb_path or Path("storage/knowledge_base.pkl")
+        # One store per named collection; "default" is the original knowledge base
+        self.collections = CollectionManager(
+            store_factory=lambda: SimpleVectorStore(
+                shard_size=search_shard_size,
+                max_workers=search_workers,
+                near_dup_distance=near_dup_distance,
+                embedding_model=self.embedding_model,
+                text_compression=chunk_text_compression,
+                text_cache_size=chunk_text_cache_size,
+                # Unsaved chunk texts spool to disk beside the index, not to a RAM-backed /tmp
+                text_dir=kb_path.parent,
+                reduced_dim=reduced_dim,
+                reduced_method=reduced_method,
+                rescore_candidates=rescore_candidates
+            ),
+            collections_dir=collections_dir or Path("storage/collections"),
+            default_path=kb_path,
+            idle_seconds=collection_idle_seconds,
+            memory_cap_bytes=collection_memory_cap_bytes
+        )
         self.processor = DocumentProcessor()
-        
-        # Verify Ollama connection
+        self.context = ContextAssembler(
+            context_token_budget, model_context_budgets, min_context_tokens=context_min_tokens
+        )
+        # Per-session history; older turns are summarized with summary_model (default: the chat model)
+        self.summary_model = summary_model
+        self.memory = ConversationMemory(
+            self._summarize,
+            memory_dir,
+            recent_turns=memory_recent_turns,
+            history_tokens=memory_history_tokens
+        )
+        self.model_stats = ModelStatsTracker()
+        self.ollama_connected: Optional[bool] = None
+        # Serializes store writes between request handlers and background workers
+        self._store_lock = threading.RLock()
+
+        # Vision: downscaled image payloads, cached answers, optional captions at ingest
+        self.images = ImageCache(image_cache_dir or Path("storage/image_cache"), vision_max_side)
+        self.vision_answers = VisionAnswerCache(vision_cache_size)
+        self.caption_model = caption_model
+        self.captioner = (
+            ImageCaptioner(self._caption_image, self._add_caption) if image_captioning else None
+        )
+
+        # Whether Ollama serves batch /api/embed; None until the first attempt
+        self._batch_embed: Optional[bool] = None
+
+        # Set in the writer process of a multi-worker deployment; every save publishes to it
+        self.generations = None
+
+        # Knowledge base readiness: "ready", "loading" or "error"
+        self.kb_status = "ready"
+        self.kb_progress = 1.0
+        self.kb_error: Optional[str] = None
+        self._kb_ready = threading.Event()
+        self._kb_ready.set()
+
+    @property
+    def vector_store(self) -> SimpleVectorStore:
+        """The default collection's store"""
+        return self.collections.default
+
+    @vector_store.setter
+    def vector_store(self, store: SimpleVectorStore):
+        self.collections.default = store
+
+    def _embedding_model_for(self, store: SimpleVectorStore) -> str:
+        """The model a store's vectors (and so its queries) are embedded with"""
+        return store.embedding_model or self.embedding_model
+
+    def check_connection(self) -> bool:
+        """Verify the Ollama server is reachable"""
         try:
             ollama.list()
             logger.info("Connected to Ollama successfully")
+            self.ollama_connected = True
         except Exception as e:
             logger.error(f"Failed to connect to Ollama: {e}")
-            raise
+            self.ollama_connected = False
+        return self.ollama_connected
 
     @staticmethod
     def chunk_text(
@@ -414,131 +1335,595 @@ class RAGChatbot:
     def add_document(
         self,
         file_path: str,
-        metadata: Optional[Dict] = None
+        metadata: Optional[Dict] = None,
+        collection: str = DEFAULT_COLLECTION
     ) -> Tuple[bool, int]:
         """Add document to knowledge base"""
+        report = self.ingest_document(file_path, metadata, collection=collection)
+        return report["success"], report["chunks_created"]
+
+    def ingest_document(
+        self,
+        file_path: str,
+        metadata: Optional[Dict] = None,
+        content_hash: Optional[str] = None,
+        collection: str = DEFAULT_COLLECTION,
+        text: Optional[str] = None
+    ) -> Dict:
+        """Add a document, or replace a changed one, and report what was skipped
+
+        content_hash is the file's SHA-256 when the caller already computed it
+        while writing the file, and text its extracted text when the caller
+        already has it (plain text and code uploads), so the file isn't read
+        again. Unchanged files return at once with their
+        existing chunk count. A changed file is fully chunked and embedded
+        before its old chunks are swapped out under the store lock, so readers
+        never see both versions or neither. The collection is created on first
+        use and stays loaded until the ingest finishes.
+        """
+        with self.collections.use(collection, create=True) as store:
+            return self._ingest(store, file_path, metadata, content_hash, collection, text)
+
+    def _ingest(
+        self,
+        store: SimpleVectorStore,
+        file_path: str,
+        metadata: Optional[Dict],
+        content_hash: Optional[str],
+        collection: str,
+        text: Optional[str] = None
+    ) -> Dict:
+        report = {
+            "success": False,
+            "unchanged": False,
+            "replaced": False,
+            "chunks_created": 0,
+            "chunks_total": 0,
+            "exact_duplicates": 0,
+            "near_duplicates": 0,
+            "embeddings_saved": 0,
+            "embeddings_reused": 0,
+            "bytes_saved": 0
+        }
         try:
-            # Process document
-            text = self.processor.process(file_path)
-            
-            if not text.strip():
-                logger.warning(f"No text extracted from {file_path}")
-                return False, 0
-            
-            # Create chunks
-            chunks = self.chunk_text(text)
-            
-            if not chunks:
-                logger.warning(f"No chunks created from {file_path}")
-                return False, 0
-            
+            content_hash = content_hash or self.processor.file_hash(file_path)
+            known = store.files.get(file_path)
+            if known is not None and known["sha256"] == content_hash:
+                logger.info(f"Unchanged file, skipping ingest: {file_path}")
+                report.update(success=True, unchanged=True, chunks_created=known["chunks"])
+                return report
+            replacing = store.has_source(file_path)
+            # Chunks that survive the edit keep their embeddings instead of being re-embedded
+            previous = store.source_embeddings(file_path) if replacing else {}
+
+            # Process document; tables arrive already chunked, row group by row group
+            if text is None:
+                text = self.processor.process(file_path)
+
+            if isinstance(text, str):
+                if not text.strip():
+                    logger.warning(f"No text extracted from {file_path}")
+                    return report
+
+                # Create chunks
+                with CHUNKING_SECONDS.time():
+                    chunks = self.chunk_text(text)
+
+                if not chunks:
+                    logger.warning(f"No chunks created from {file_path}")
+                    return report
+            else:
+                chunks = text
+
             # Generate embeddings and add to vector store
             filename = Path(file_path).name
+            # One upload date per file, so its chunks share one document entry
+            upload_date = datetime.now().isoformat()
+            embed_start = time.perf_counter()
+            # A replacement is staged here until the swap; new files stream straight in
+            staged = {"ids": [], "embeddings": [], "documents": [], "metadatas": [], "fingerprints": []}
+            staged_hashes: set = set()
+            staged_dups = SimHashIndex(self.near_dup_distance) if self.near_dup_distance is not None else None
+            # The old version's hashes and fingerprints, gathered once rather than per chunk
+            previous_hashes = set(previous)
+            previous_fingerprints = (
+                store.near_dups.source_counts(file_path) if replacing and store.near_dups is not None else None
+            )
             
             for i, chunk in enumerate(chunks):
+                report["chunks_total"] += 1
                 try:
-                    # Get embedding from Ollama
-                    emb_response = ollama.embeddings(
-                        model=self.embedding_model,
-                        prompt=chunk
+                    # Duplicates are caught before they cost an embedding call
+                    duplicate, fingerprint = store.find_duplicate(
+                        chunk,
+                        ignore_source=file_path if replacing else None,
+                        ignore_hashes=previous_hashes,
+                        ignore_fingerprints=previous_fingerprints
                     )
-                    
-                    embedding = emb_response["embedding"]
+                    if replacing and not duplicate:
+                        # Staged chunks aren't in the store yet; check them separately
+                        if store._compute_hash(chunk) in staged_hashes:
+                            duplicate = "exact"
+                        elif fingerprint is not None and staged_dups is not None and staged_dups.find(fingerprint) is not None:
+                            duplicate = "near"
+                    if duplicate:
+                        report[f"{duplicate}_duplicates"] += 1
+                        report["bytes_saved"] += len(chunk.encode("utf-8")) + store.dim * 4
+                        continue
+
+                    embedding = previous.get(store._compute_hash(chunk)) if replacing else None
+                    if embedding is not None:
+                        report["embeddings_reused"] += 1
+                    else:
+                        # Get embedding from Ollama
+                        emb_response = ollama.embeddings(
+                            model=self._embedding_model_for(store),
+                            prompt=chunk
+                        )
+                        
+                        embedding = emb_response["embedding"]
                     
                     # Prepare metadata
                     chunk_metadata = {
                         "source": file_path,
                         "filename": filename,
                         "chunk": i,
-                        "upload_date": datetime.now().isoformat(),
+                        "upload_date": upload_date,
                         "file_type": Path(file_path).suffix,
                         **(metadata or {})
                     }
+                    chunk_id = f"{Path(file_path).stem}_{i}"
+
+                    if replacing:
+                        for key, value in zip(staged, (chunk_id, embedding, chunk, chunk_metadata, fingerprint)):
+                            staged[key].append(value)
+                        staged_hashes.add(store._compute_hash(chunk))
+                        if fingerprint is not None and staged_dups is not None:
+                            staged_dups.add(fingerprint, file_path)
+                        continue
                     
                     # Add to vector store
-                    self.vector_store.add(
-                        ids=[f"{Path(file_path).stem}_{i}"],
-                        embeddings=[embedding],
-                        documents=[chunk],
-                        metadatas=[chunk_metadata]
-                    )
+                    with self._store_lock:
+                        rows_before = len(store.ids)
+                        store.add(
+                            ids=[chunk_id],
+                            embeddings=[embedding],
+                            documents=[chunk],
+                            metadatas=[chunk_metadata],
+                            fingerprints=[fingerprint]
+                        )
+                        report["chunks_created"] += len(store.ids) - rows_before
                     
                 except Exception as e:
                     logger.error(f"Error processing chunk {i} of {file_path}: {e}")
                     continue
+
+            INGEST_EMBEDDING_SECONDS.observe(time.perf_counter() - embed_start)
+
+            if not report["chunks_total"]:
+                logger.warning(f"No chunks created from {file_path}")
+                return report
+
+            with self._store_lock:
+                if replacing:
+                    removed = store.delete_by_source(file_path)
+                    rows_before = len(store.ids)
+                    if staged["ids"]:
+                        store.add(**staged)
+                    report["chunks_created"] = len(store.ids) - rows_before
+                    report["replaced"] = True
+                    logger.info(f"Replaced {removed} old chunks of {file_path}")
+                store.record_file(file_path, {
+                    "sha256": content_hash,
+                    "chunks": report["chunks_created"],
+                    "size": Path(file_path).stat().st_size,
+                    "updated": datetime.now().isoformat()
+                })
+
+            report["success"] = True
+            report["embeddings_saved"] = (
+                report["exact_duplicates"] + report["near_duplicates"] + report["embeddings_reused"]
+            )
+            if report["exact_duplicates"]:
+                INGEST_DUPLICATE_CHUNKS.inc(report["exact_duplicates"], "exact")
+            if report["near_duplicates"]:
+                INGEST_DUPLICATE_CHUNKS.inc(report["near_duplicates"], "near")
+            INGEST_BYTES_SAVED.inc(report["bytes_saved"])
             
-            logger.info(f"Added {len(chunks)} chunks from {file_path}")
-            return True, len(chunks)
+            logger.info(
+                f"Added {report['chunks_created']} chunks from {file_path} "
+                f"({report['embeddings_saved']} embeddings saved, {report['bytes_saved']} bytes saved)"
+            )
+            if self.captioner is not None and Path(file_path).suffix.lower() in DocumentProcessor.IMAGE_EXTS:
+                self.captioner.submit(file_path, metadata, collection)
+            return report
             
         except Exception as e:
             logger.error(f"Error adding document {file_path}: {e}")
-            return False, 0
+            return report
 
-    def delete_document(self, filename: str) -> int:
+    def delete_document(self, filename: str, collection: str = DEFAULT_COLLECTION) -> int:
         """Delete all chunks from a document"""
-        # Find matching source paths
-        sources = [meta["source"] for meta in self.vector_store.metadatas 
-                   if Path(meta["source"]).name == filename]
-        
-        if not sources:
-            logger.warning(f"No document found with filename: {filename}")
-            return 0
-        
-        total_removed = 0
-        for source in set(sources):
-            removed = self.vector_store.delete_by_source(source)
-            total_removed += removed
+        with self.collections.use(collection) as store:
+            # Find matching source paths
+            sources = [doc["source"] for doc in store.metadatas.documents
+                       if "source" in doc and Path(doc["source"]).name == filename]
+            
+            if not sources:
+                logger.warning(f"No document found with filename: {filename}")
+                return 0
+            
+            total_removed = 0
+            with self._store_lock:
+                for source in set(sources):
+                    removed = store.delete_by_source(source)
+                    total_removed += removed
         
         return total_removed
 
+    def remove_source(self, source: str, collection: str = DEFAULT_COLLECTION) -> int:
+        """Delete the chunks of one source path"""
+        with self._store_lock, self.collections.use(collection) as store:
+            return store.delete_by_source(source)
+
+    # ===== Vision =====
+
+    def _vision_chat(self, model: str, prompt: str, image_path: str) -> Tuple[Dict, bool]:
+        """Ask a vision model about an image; returns (response, served from cache)"""
+        image_hash, payload = self.images.load(image_path)
+        key = (image_hash, model, prompt)
+        cached = self.vision_answers.get(key)
+        if cached is not None:
+            return cached, True
+
+        logger.info(f"Processing image with vision model: {image_path}")
+        with LLM_GENERATION_SECONDS.labels(model).time():
+            response = ollama.chat(
+                model=model,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": prompt,
+                        "images": [payload]
+                    }
+                ]
+            )
+        self.vision_answers.put(key, response)
+        return response, False
+
+    def _caption_image(self, path: str) -> str:
+        """Describe an image with the caption model (runs on the captioner thread)"""
+        response, _ = self._vision_chat(self.caption_model or self.model, CAPTION_PROMPT, path)
+        return response["message"]["content"]
+
+    def _add_caption(self, path: str, caption: str, metadata: Dict, collection: str):
+        """Embed an image caption as an extra chunk of the image's source
+
+        The caption has no chunk number: it doesn't continue the image's
+        text, so the context assembler never merges the two.
+        """
+        filename = Path(path).name
+        text = f"Image File: {filename}\nPath: {path}\nCaption: {caption}"
+        model = self._embedding_model_for(self.collections.get(collection, create=True))
+        embedding = ollama.embeddings(model=model, prompt=text)["embedding"]
+
+        with self._store_lock, self.collections.use(collection, create=True) as store:
+            # The image may have been deleted while its caption was generated
+            if not store.has_source(path):
+                logger.info(f"Skipping caption for removed image: {filename}")
+                return
+            if store.embedding_model and store.embedding_model != model:
+                # Re-embedded with another model in the meantime
+                embedding = ollama.embeddings(model=store.embedding_model, prompt=text)["embedding"]
+            rows_before = len(store.ids)
+            store.add(
+                # Keyed by the full path, so a.png and a.jpg (or two folders' a.png) don't collide
+                ids=[f"{Path(path).stem}_caption_{hashlib.md5(path.encode()).hexdigest()[:8]}"],
+                embeddings=[embedding],
+                documents=[text],
+                metadatas=[{
+                    "source": path,
+                    "filename": filename,
+                    "chunk": None,
+                    "upload_date": datetime.now().isoformat(),
+                    "file_type": Path(path).suffix,
+                    "caption": True,
+                    **metadata
+                }]
+            )
+            entry = store.files.get(path)
+            if entry is not None and len(store.ids) > rows_before:
+                store.record_file(path, {**entry, "chunks": entry["chunks"] + 1})
+        logger.info(f"Indexed caption for {filename}")
+
+    def _summarize(self, prompt: str) -> str:
+        """Run a conversation summary prompt (on the memory worker thread)"""
+        model = self.summary_model or self.model
+        with LLM_GENERATION_SECONDS.labels(model).time():
+            response = ollama.chat(model=model, messages=[{"role": "user", "content": prompt}])
+        return response["message"]["content"]
+
     def retrieve_context(
         self,
         query: str,
         n_results: int = 3,
-        min_similarity: float = 0.3
+        min_similarity: float = 0.3,
+        collections: Optional[List[str]] = None,
+        model: Optional[str] = None
     ) -> Tuple[str, List[str]]:
         """Retrieve relevant context for query"""
+        retrieval = self._retrieve(query, n_results, min_similarity, collections, model)
+        return retrieval["context"], retrieval["sources"]
+
+    def _retrieve(
+        self,
+        query: str,
+        n_results: int = 3,
+        min_similarity: float = 0.3,
+        collections: Optional[List[str]] = None,
+        model: Optional[str] = None,
+        reserved_tokens: int = 0
+    ) -> Dict:
+        """Retrieve context along with per-chunk similarities and stage timings
+
+        Only the selected collections (default: the default one) are searched;
+        their top hits are merged by similarity. The context is packed by the
+        context assembler into the model's prompt budget, less reserved_tokens
+        for the rest of the prompt.
+        """
+        timings = {}
         try:
-            # Get query embedding
-            query_emb_response = ollama.embeddings(
-                model=self.embedding_model,
-                prompt=query
-            )
-            query_emb = query_emb_response["embedding"]
-            
-            # Query vector store
-            results = self.vector_store.query(query_emb, n_results)
+            # Get query embedding, once per embedding model among the collections
+            stage_start = time.perf_counter()
+            stores = [(name, self.collections.get(name)) for name in collections or [DEFAULT_COLLECTION]]
+            query_embs = {}
+            for _, store in stores:
+                model_name = self._embedding_model_for(store)
+                if model_name not in query_embs:
+                    query_embs[model_name] = ollama.embeddings(
+                        model=model_name,
+                        prompt=query
+                    )["embedding"]
+            timings["embed_ms"] = (time.perf_counter() - stage_start) * 1000
+            QUERY_EMBEDDING_SECONDS.observe(timings["embed_ms"] / 1000)
             
-            docs, sources = [], []
-            
-            for doc, meta, dist in zip(
-                results["documents"][0],
-                results["metadatas"][0],
-                results["distances"][0]
-            ):
-                similarity = 1 - dist
-                if similarity >= min_similarity:
-                    docs.append(doc)
-                    sources.append(meta.get("filename", meta.get("source", "Unknown")))
-            
-            context = "\n\n".join(docs)
-            unique_sources = list(set(sources))
+            # Query the selected collections' vector stores
+            stage_start = time.perf_counter()
+            results = [
+                (name, store.query(query_embs[self._embedding_model_for(store)], n_results))
+                for name, store in stores
+            ]
+            timings["search_ms"] = (time.perf_counter() - stage_start) * 1000
+            VECTOR_SEARCH_SECONDS.observe(timings["search_ms"] / 1000)
             
-            logger.debug(f"Retrieved {len(docs)} relevant chunks from {len(unique_sources)} sources")
-            return context, unique_sources
+            return {
+                **self._rank(results, n_results, min_similarity, model, reserved_tokens),
+                "timings": timings
+            }
             
         except Exception as e:
             logger.error(f"Error retrieving context: {e}")
-            return "", []
+            return {"context": "", "sources": [], "hits": [], "timings": timings, "packing": None}
+
+    def retrieve_batch(
+        self,
+        queries: List[str],
+        n_results: int = 3,
+        min_similarity: float = 0.3,
+        collections: Optional[List[str]] = None,
+        model: Optional[str] = None
+    ) -> List[Dict]:
+        """_retrieve() for many queries: one embedding request and one blocked search per collection
+
+        Each context leaves room for the system prompt and its question, as
+        for a chat without history. Per-query timings are each query's share
+        of the batch's embed and search time.
+        """
+        stage_start = time.perf_counter()
+        stores = [(name, self.collections.get(name)) for name in collections or [DEFAULT_COLLECTION]]
+        embeddings = {}
+        for _, store in stores:
+            model_name = self._embedding_model_for(store)
+            if model_name not in embeddings:
+                embeddings[model_name] = self.embed_queries(queries, model_name)
+        embed_ms = (time.perf_counter() - stage_start) * 1000 / len(queries)
+        for _ in queries:
+            QUERY_EMBEDDING_SECONDS.observe(embed_ms / 1000)
+
+        stage_start = time.perf_counter()
+        per_collection = [
+            (name, store.query_batch(embeddings[self._embedding_model_for(store)], n_results))
+            for name, store in stores
+        ]
+        search_ms = (time.perf_counter() - stage_start) * 1000 / len(queries)
+        for _ in queries:
+            VECTOR_SEARCH_SECONDS.observe(search_ms / 1000)
+
+        return [
+            {
+                **self._rank(
+                    [(name, results[i]) for name, results in per_collection],
+                    n_results, min_similarity, model,
+                    self._reserved_tokens(SYSTEM_PROMPT, [], query)
+                ),
+                "timings": {"embed_ms": embed_ms, "search_ms": search_ms}
+            }
+            for i, query in enumerate(queries)
+        ]
+
+    def embed_queries(self, texts: List[str], model: Optional[str] = None) -> List[List[float]]:
+        """Embed several texts in one Ollama request, falling back to one request each
+
+        The pinned ollama client only wraps the single-prompt /api/embeddings,
+        so the batch /api/embed call goes through its HTTP client directly.
+        """
+        model = model or self.embedding_model
+        missing_endpoint = False
+        if self._batch_embed is not False:
+            try:
+                response = ollama._client._request(
+                    "POST", "/api/embed", json={"model": model, "input": texts}
+                )
+                embeddings = response.json()["embeddings"]
+                if len(embeddings) == len(texts):
+                    self._batch_embed = True
+                    return embeddings
+            except Exception as e:
+                # A 404 is either an unknown model or an Ollama without /api/embed
+                missing_endpoint = getattr(e, "status_code", None) == 404 and self._batch_embed is None
+                if not missing_endpoint:
+                    logger.error(f"Batch embedding failed, embedding queries one at a time: {e}")
+        embeddings = [
+            ollama.embeddings(model=model, prompt=text)["embedding"]
+            for text in texts
+        ]
+        if missing_endpoint:
+            # The model is fine, so the endpoint is missing (Ollama before 0.3); stop asking
+            logger.info("Ollama has no batch embedding endpoint; embedding queries one at a time")
+            self._batch_embed = False
+        return embeddings
+
+    def _rank(
+        self,
+        results: List[Tuple[str, Dict]],
+        n_results: int,
+        min_similarity: float,
+        model: Optional[str],
+        reserved_tokens: int = 0
+    ) -> Dict:
+        """Merge (collection, query result) pairs by similarity and pack the context"""
+        matches = []
+        for name, result in results:
+            matches.extend(
+                (dist, doc, meta, name) for doc, meta, dist in zip(
+                    result["documents"][0],
+                    result["metadatas"][0],
+                    result["distances"][0]
+                )
+            )
+        matches.sort(key=lambda match: match[0])
+        
+        relevant, hits = [], []
+        
+        for dist, doc, meta, name in matches[:n_results]:
+            similarity = 1 - dist
+            source = meta.get("filename", meta.get("source", "Unknown"))
+            hits.append({
+                "source": source,
+                "chunk": meta.get("chunk"),
+                "collection": name,
+                "similarity": round(similarity, 4),
+                "used": similarity >= min_similarity
+            })
+            if similarity >= min_similarity:
+                relevant.append({"document": doc, "meta": meta, "source": source, "similarity": similarity})
+        
+        model = model or self.model
+        packing = self.context.assemble(relevant, model, reserved_tokens)
+        CONTEXT_TOKENS.inc(packing["tokens"], model)
+        CONTEXT_TOKENS_SAVED.inc(packing["tokens_saved"], model)
+        
+        logger.debug(
+            f"Retrieved {len(relevant)} relevant chunks from {len(packing['sources'])} sources "
+            f"({packing['tokens']} context tokens, {packing['tokens_saved']} saved)"
+        )
+        return {
+            "context": packing.pop("context"),
+            "sources": packing.pop("sources"),
+            "hits": hits,
+            "packing": packing
+        }
+
+    def _finish_chat(
+        self,
+        response: Dict,
+        sources: List[str],
+        context_used: bool,
+        model: str,
+        timings: Dict,
+        hits: List[Dict],
+        started: float,
+        debug: bool,
+        packing: Optional[Dict] = None
+    ) -> Dict:
+        """Build the chat result, recording model throughput from Ollama's counters"""
+        total_ms = (time.perf_counter() - started) * 1000
+        self.model_stats.record(model, response, total_ms)
+
+        result = {
+            "answer": response["message"]["content"],
+            "sources": sources,
+            "context_used": context_used,
+            "model_used": model
+        }
+
+        if debug:
+            # Ollama reports durations in nanoseconds
+            eval_count = response.get("eval_count") or 0
+            eval_ns = response.get("eval_duration") or 0
+            result["debug"] = {
+                "timings": {
+                    **timings,
+                    "model_load_ms": (response.get("load_duration") or 0) / 1e6,
+                    "prompt_eval_ms": (response.get("prompt_eval_duration") or 0) / 1e6,
+                    "generation_ms": eval_ns / 1e6,
+                    "total_ms": total_ms
+                },
+                "prompt_tokens": response.get("prompt_eval_count"),
+                "generated_tokens": eval_count or None,
+                "tokens_per_second": round(eval_count / (eval_ns / 1e9), 2) if eval_ns else None,
+                "retrieved_chunks": hits,
+                "context": packing
+            }
+
+        return result
+
+    @staticmethod
+    def _reserved_tokens(system_prompt: str, turns: List[Dict], message: str) -> int:
+        """Estimated prompt tokens besides the retrieved context, which is packed into what is left"""
+        question = {"role": "user", "content": f"Context:\n\n\nQuestion: {message}"}
+        return estimate_prompt_tokens([{"role": "system", "content": system_prompt}, *turns, question])
+
+    def _fit_history(self, system_prompt: str, turns: List[Dict], message: str, model: str) -> List[Dict]:
+        """The newest whole exchanges that fit beside the context's minimum budget
+
+        Older turns left out here are still in memory, which folds them into the summary.
+        """
+        allowed = self.context.history_budget(model)
+        if allowed is None:
+            return turns
+        while turns and self._reserved_tokens(system_prompt, turns, message) > allowed:
+            turns = turns[2:]
+        return turns
+
+    def _remember(self, session_id: Optional[str], message: str, result: Dict) -> Dict:
+        """Add the exchange to the session's memory (and its figures to debug output)"""
+        if session_id:
+            self.memory.record(session_id, message, result["answer"])
+            if "debug" in result:
+                result["debug"]["memory"] = self.memory.stats(session_id)
+        return result
 
     def chat(
         self,
         message: str,
         use_rag: bool = True,
         top_k: int = 3,
-        model_override: Optional[str] = None
+        model_override: Optional[str] = None,
+        debug: bool = False,
+        collections: Optional[List[str]] = None,
+        session_id: Optional[str] = None,
+        retrieval: Optional[Dict] = None
     ) -> Dict:
-        """Generate response to user message"""
+        """Generate response to user message, continuing session_id's conversation if given
+
+        A retrieval done ahead of time (see retrieve_batch) can be passed in to
+        skip that step; its context was packed without room for session history.
+        """
+        started = time.perf_counter()
+        timings = {}
+        hits = []
+        packing = None
         try:
             context = ""
             sources = []
@@ -546,8 +1931,26 @@ class RAGChatbot:
             # Use override model if provided, otherwise use default
             model_to_use = model_override or self.model
 
-            if use_rag and len(self.vector_store.documents) > 0:
-                context, sources = self.retrieve_context(message, n_results=top_k)
+            # History first: the retrieved context gets the prompt budget it leaves
+            prompt_start = time.perf_counter()
+            summary, turns = self.memory.history(session_id) if session_id else ("", [])
+            system_prompt = SYSTEM_PROMPT
+            if summary:
+                system_prompt += f"\n\nSummary of the earlier conversation:\n{summary}"
+            if use_rag:
+                turns = self._fit_history(system_prompt, turns, message, model_to_use)
+            history_ms = (time.perf_counter() - prompt_start) * 1000
+
+            collections = collections or [DEFAULT_COLLECTION]
+            if use_rag and (retrieval is not None or any(self.collections.get(name).documents for name in collections)):
+                if retrieval is None:
+                    retrieval = self._retrieve(
+                        message, n_results=top_k, collections=collections, model=model_to_use,
+                        reserved_tokens=self._reserved_tokens(system_prompt, turns, message)
+                    )
+                context, sources, hits = retrieval["context"], retrieval["sources"], retrieval["hits"]
+                packing = retrieval["packing"]
+                timings.update(retrieval["timings"])
                 
                 # Check if context contains image references and user is asking about images
                 image_keywords = ['image', 'picture', 'photo', 'whats in', 'what is in', 'describe', 'show']
@@ -563,72 +1966,48 @@ class RAGChatbot:
                             model_lower = model_to_use.lower()
                             if any(x in model_lower for x in ['ministral', 'llava', 'vision', 'pixtral']):
                                 try:
-                                    # Load and process image with vision model
-                                    with open(image_path, "rb") as img_file:
-                                        img_data = base64.b64encode(img_file.read()).decode('utf-8')
-                                    
-                                    logger.info(f"Processing image with vision model: {image_path}")
+                                    vision_start = time.perf_counter()
+                                    response, cached = self._vision_chat(model_to_use, message, image_path)
+                                    if cached:
+                                        # Don't count the original call's tokens twice in model stats
+                                        response = {"message": response["message"]}
+                                    timings["vision_ms"] = (time.perf_counter() - vision_start) * 1000
                                     
-                                    response = ollama.chat(
-                                        model=model_to_use,
-                                        messages=[
-                                            {
-                                                "role": "user",
-                                                "content": message,
-                                                "images": [img_data]
-                                            }
-                                        ]
+                                    result = self._finish_chat(
+                                        response, sources, True, model_to_use,
+                                        timings, hits, started, debug, packing
                                     )
-                                    
-                                    return {
-                                        "answer": response["message"]["content"],
-                                        "sources": sources,
-                                        "context_used": True,
-                                        "model_used": model_to_use
-                                    }
+                                    return self._remember(session_id, message, result)
                                 except Exception as img_error:
                                     logger.error(f"Error processing image: {img_error}")
                                     # Fall through to normal chat if image processing fails
 
-            # Prepare messages for normal chat
+            # Prepare messages for normal chat. The system prompt, summary and
+            # earlier turns only change when older turns are folded, so Ollama
+            # can reuse its KV cache for them; retrieved context goes with the
+            # new question only and is never replayed in later turns.
+            prompt_start = time.perf_counter()
+            messages = [{"role": "system", "content": system_prompt}, *turns]
             if context:
-                messages = [
-                    {
-                        "role": "system",
-                        "content": f"""You are a helpful AI assistant. Use the following context to answer the user's question accurately.
-
-If the context doesn't contain relevant information, politely say so and provide a general response if possible.
-
-Context:
-{context}
-"""
-                    },
-                    {"role": "user", "content": message}
-                ]
+                messages.append({"role": "user", "content": f"Context:\n{context}\n\nQuestion: {message}"})
             else:
-                messages = [
-                    {
-                        "role": "system",
-                        "content": "You are a helpful AI assistant. Answer the user's question to the best of your ability."
-                    },
-                    {"role": "user", "content": message}
-                ]
+                messages.append({"role": "user", "content": message})
+            timings["prompt_build_ms"] = history_ms + (time.perf_counter() - prompt_start) * 1000
+            PROMPT_ASSEMBLY_SECONDS.observe(timings["prompt_build_ms"] / 1000)
 
             # Get response from Ollama with specified model
             logger.info(f"Using model: {model_to_use}")
-            response = ollama.chat(
-                model=model_to_use,
-                messages=messages
-            )
-
-            answer = response["message"]["content"]
+            with LLM_GENERATION_SECONDS.labels(model_to_use).time():
+                response = ollama.chat(
+                    model=model_to_use,
+                    messages=messages
+                )
 
-            return {
-                "answer": answer,
-                "sources": sources,
-                "context_used": bool(context),
-                "model_used": model_to_use
-            }
+            result = self._finish_chat(
+                response, sources, bool(context), model_to_use,
+                timings, hits, started, debug, packing
+            )
+            return self._remember(session_id, message, result)
             
         except Exception as e:
             logger.error(f"Error in chat: {e}")
@@ -636,44 +2015,170 @@ Context:
                 "answer": f"Sorry, I encountered an error: {str(e)}",
                 "sources": [],
                 "context_used": False,
-                "model_used": model_to_use if 'model_to_use' in locals() else self.model
+                "model_used": model_to_use if 'model_to_use' in locals() else self.model,
+                "error": str(e)
             }
 
     # ===== Persistence =====
 
+    @property
+    def is_ready(self) -> bool:
+        """Whether the knowledge base has finished loading"""
+        return self.kb_status == "ready"
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until a background load finishes; True if the KB is usable"""
+        self._kb_ready.wait(timeout)
+        return self.is_ready
+
     def save_knowledge_base(self, path: str):
-        """Save knowledge base to disk"""
+        """Save knowledge base to disk, along with any changed collections"""
+        if self.kb_status != "ready":
+            # Saving now would overwrite the file on disk with a partial store
+            raise RuntimeError(f"Knowledge base is not ready ({self.kb_status}); refusing to save")
         try:
-            self.vector_store.save(path)
+            # Background writers (captions, folder scans) must not mutate mid-pickle
+            with self._store_lock:
+                self.vector_store.save(path)
+                self.collections.save_dirty(include_default=False)
+                if self.generations is not None:
+                    self.generations.publish(self.vector_store)
         except Exception as e:
             logger.error(f"Error saving knowledge base: {e}")
             raise
 
-    def load_knowledge_base(self, path: str):
+    def load_knowledge_base(self, path: str, progress: Optional[Callable[[float], None]] = None):
         """Load knowledge base from disk"""
         try:
             if Path(path).exists():
-                self.vector_store.load(path)
+                # Build a fresh store and swap it in so queries never see a half-loaded one
+                store = self.collections.store_factory()
+                store.load(path, progress=progress)
+                self.vector_store = store
+                self.kb_status = "ready"
+                self.kb_error = None
             else:
                 logger.warning(f"Knowledge base file not found: {path}")
         except Exception as e:
             logger.error(f"Error loading knowledge base: {e}")
             raise
 
-    def clear_knowledge_base(self):
+    def export_archive(self, path: str, collection: str = DEFAULT_COLLECTION) -> Dict:
+        """Write a collection to a portable archive (see kb_archive); returns its manifest"""
+        # Writers are held off so the matrix and chunk lines stay in step
+        with self._store_lock, self.collections.use(collection) as store:
+            return export_archive(store, path, self._embedding_model_for(store), collection)
+
+    def import_archive(self, path: str, collection: str = DEFAULT_COLLECTION) -> Dict:
+        """Merge an archive into a collection (created if needed) without re-embedding"""
+        created = not self.collections.exists(collection)
+        try:
+            with self.collections.use(collection, create=True) as store:
+                return import_archive(store, path, self._embedding_model_for(store), self._store_lock)
+        except Exception:
+            if created and not self.collections.get(collection).ids:
+                # A rejected archive shouldn't leave an empty collection behind
+                self.collections.drop(collection)
+            raise
+
+    def mark_loading(self):
+        """Flag the knowledge base as loading; requests needing it wait or skip RAG"""
+        self.kb_status = "loading"
+        self.kb_progress = 0.0
+        self.kb_error = None
+        self._kb_ready.clear()
+
+    def use_shared_store(self, store: SimpleVectorStore):
+        """Serve a store published by the writer process (reader processes only)"""
+        with self._store_lock:
+            # Queries still running on the old store finish on it; its mapping goes with it
+            self.vector_store = store
+        self.kb_status = "ready"
+        self.kb_progress = 1.0
+        self.kb_error = None
+        self._kb_ready.set()
+
+    def start_background_load(
+        self,
+        path: str,
+        on_done: Optional[Callable[[], None]] = None
+    ) -> threading.Thread:
+        """Load the knowledge base on a worker thread while the server keeps serving"""
+        self.mark_loading()
+
+        def set_progress(fraction: float):
+            self.kb_progress = fraction
+
+        def run():
+            try:
+                self.load_knowledge_base(path, progress=set_progress)
+                stats = self.get_stats()
+                logger.info(
+                    f"Knowledge base ready: {stats['total_chunks']} chunks "
+                    f"from {stats['total_documents']} documents"
+                )
+            except Exception as e:
+                self.kb_error = str(e)
+                self.kb_status = "error"
+            finally:
+                self.kb_progress = 1.0
+                self._kb_ready.set()
+                if on_done is not None:
+                    on_done()
+
+        thread = threading.Thread(target=run, name="kb-loader", daemon=True)
+        thread.start()
+        return thread
+
+    def clear_knowledge_base(self, collection: str = DEFAULT_COLLECTION):
         """Clear all documents from knowledge base"""
-        self.vector_store.clear()
-        logger.info("Knowledge base cleared")
+        with self._store_lock, self.collections.use(collection) as store:
+            store.clear()
+            # An empty store starts over with the configured model
+            store.embedding_model = self.embedding_model
+        logger.info(f"Knowledge base cleared ({collection})")
 
-    def get_stats(self) -> Dict:
+    def get_stats(self, collection: str = DEFAULT_COLLECTION) -> Dict:
         """Get statistics about the knowledge base"""
-        documents = {}
-        for meta in self.vector_store.metadatas:
-            filename = meta.get("filename", "Unknown")
-            documents[filename] = documents.get(filename, 0) + 1
+        store = self.collections.get(collection)
+        documents = {entry["filename"]: entry["chunks"] for entry in store.catalog()}
         
         return {
-            "total_chunks": len(self.vector_store.documents),
+            "total_chunks": len(store.ids),
             "total_documents": len(documents),
-            "documents": documents
-        }
\ No newline at end of file
+            "documents": documents,
+            "embedding_model": self._embedding_model_for(store),
+            "embedding_dim": store.dim
+        }
+
+
+def build_chatbot(settings) -> RAGChatbot:
+    """A RAGChatbot configured from settings (config.Settings), for the server and CLIs"""
+    return RAGChatbot(
+        model=settings.LLM_MODEL,
+        embedding_model=settings.EMBEDDING_MODEL,
+        search_shard_size=settings.SEARCH_SHARD_SIZE,
+        search_workers=settings.SEARCH_WORKERS or None,
+        near_dup_distance=settings.NEAR_DUP_MAX_DISTANCE if settings.NEAR_DUP_DETECTION else None,
+        chunk_text_compression=settings.CHUNK_TEXT_COMPRESSION,
+        chunk_text_cache_size=settings.CHUNK_TEXT_CACHE_SIZE,
+        reduced_dim=settings.REDUCED_DIM if settings.EMBEDDING_REDUCTION else 0,
+        reduced_method=settings.EMBEDDING_REDUCTION or "pca",
+        rescore_candidates=settings.RESCORE_CANDIDATES,
+        image_cache_dir=settings.STORAGE_DIR / "image_cache",
+        vision_max_side=settings.VISION_MAX_SIDE,
+        vision_cache_size=settings.VISION_CACHE_SIZE,
+        image_captioning=settings.IMAGE_CAPTIONING,
+        caption_model=settings.CAPTION_MODEL or None,
+        kb_path=settings.STORAGE_DIR / settings.KB_FILE,
+        collections_dir=settings.STORAGE_DIR / settings.COLLECTIONS_DIR,
+        collection_idle_seconds=settings.COLLECTION_IDLE_SECONDS,
+        collection_memory_cap_bytes=settings.COLLECTION_MEMORY_CAP_MB * 1024 * 1024,
+        context_token_budget=settings.CONTEXT_TOKEN_BUDGET,
+        model_context_budgets=settings.MODEL_CONTEXT_BUDGETS,
+        context_min_tokens=settings.CONTEXT_MIN_TOKENS,
+        memory_dir=settings.STORAGE_DIR / "memory",
+        memory_recent_turns=settings.MEMORY_RECENT_TURNS,
+        memory_history_tokens=settings.MEMORY_HISTORY_TOKENS,
+        summary_model=settings.SUMMARY_MODEL or None
+    )
\ No newline at end of file
@@ -0,0 +1,194 @@
+"""
+Reduced-Dimension Index
+Low-dimensional copies of the embeddings for a fast first-pass scan
+
+Scoring every chunk at full dimension (768 for nomic-embed-text) reads the
+whole embedding matrix per query. This index keeps each embedding reduced
+to a few hundred dimensions, scans those for a shortlist, and leaves the
+store to re-score only the shortlist at full dimension.
+
+Two reductions:
+- "truncate": keep the first dim components. Meant for Matryoshka-trained
+  models, whose leading components are trained to work on their own.
+- "pca": project onto the top dim principal components of the stored
+  embeddings. Works for any model; the projection is fit on the knowledge
+  base, refit as it doubles in size, and saved with it.
+
+Only the projection is persisted; the reduced rows are rebuilt on load.
+"""
+
+import logging
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+REDUCTION_METHODS = ("truncate", "pca")
+# PCA needs this many embeddings before it is fit; smaller stores are scanned in full anyway
+PCA_MIN_ROWS = 2048
+# Rows sampled (evenly spaced) to fit the PCA projection
+PCA_SAMPLE_ROWS = 20000
+
+
+class ReducedIndex:
+    """Reduced embedding rows plus the projection that produced them"""
+
+    def __init__(self, method: str, dim: int):
+        if method not in REDUCTION_METHODS:
+            raise ValueError(f"Unknown reduction '{method}': use one of {', '.join(REDUCTION_METHODS)}")
+        self.method = method
+        self.dim = dim
+        # PCA only: mean and (full dim, dim) components, and the row count they were fit on
+        self.mean: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None
+        self.fitted_rows = 0
+
+        # (mean, components, rows, norms) swapped as one, so a query never pairs
+        # rows with a projection they weren't made with
+        self._current: Optional[Tuple] = None
+        self._size = 0
+
+    @classmethod
+    def from_dict(cls, data: Dict, method: str, dim: int) -> "ReducedIndex":
+        """Restore a saved projection, unless it was made with other settings"""
+        index = cls(method, dim)
+        if data.get("method") == method and data.get("dim") == dim and data.get("components") is not None:
+            index.mean = np.asarray(data["mean"], dtype=np.float32)
+            index.components = np.asarray(data["components"], dtype=np.float32)
+            index.fitted_rows = data.get("fitted_rows", 0)
+        return index
+
+    def to_dict(self) -> Dict:
+        return {
+            "method": self.method,
+            "dim": self.dim,
+            "mean": self.mean,
+            "components": self.components,
+            "fitted_rows": self.fitted_rows
+        }
+
+    @property
+    def size(self) -> int:
+        return self._size if self._current is not None else 0
+
+    def memory_bytes(self) -> int:
+        if self._current is None:
+            return 0
+        return sum(part.nbytes for part in self._current if part is not None)
+
+    # ===== Projection =====
+
+    def _project(self, vectors: np.ndarray, mean, components) -> np.ndarray:
+        if self.method == "truncate":
+            return np.ascontiguousarray(vectors[:, :self.dim], dtype=np.float32)
+        return ((vectors - mean) @ components).astype(np.float32, copy=False)
+
+    def _row_norms(self, vectors: np.ndarray, reduced: np.ndarray) -> np.ndarray:
+        # Truncated vectors are compared by their own cosine; PCA scores
+        # approximate the full dot product, so they divide by the full norm
+        return np.linalg.norm(reduced if self.method == "truncate" else vectors, axis=1)
+
+    def _fit(self, embeddings: np.ndarray):
+        """Top principal components of (a sample of) the embeddings"""
+        step = max(1, len(embeddings) // PCA_SAMPLE_ROWS)
+        sample = np.asarray(embeddings[::step], dtype=np.float64)
+        mean = sample.mean(axis=0)
+        centered = sample - mean
+        # eigh of the (dim x dim) covariance is much cheaper than an SVD of the sample
+        eigenvalues, eigenvectors = np.linalg.eigh(centered.T @ centered)
+        order = np.argsort(eigenvalues)[::-1][:self.dim]
+        explained = eigenvalues[order].sum() / max(eigenvalues.sum(), 1e-12)
+        self.mean = mean.astype(np.float32)
+        self.components = np.ascontiguousarray(eigenvectors[:, order], dtype=np.float32)
+        self.fitted_rows = len(embeddings)
+        logger.info(
+            f"Fit {self.dim}-dim PCA projection on {len(sample)} of {len(embeddings)} embeddings "
+            f"({explained:.0%} of variance kept)"
+        )
+
+    def _refit_due(self, rows: int) -> bool:
+        # Refitting whenever the store doubles keeps the total projection work linear
+        return self.method == "pca" and rows >= max(2 * self.fitted_rows, PCA_MIN_ROWS)
+
+    def rebuild(self, embeddings: np.ndarray):
+        """Reduce every row again, fitting (or refitting) the projection first if due"""
+        if len(embeddings) == 0 or self.dim >= embeddings.shape[1]:
+            self._current, self._size = None, 0
+            return
+        if self.method == "pca":
+            stale = self.components is None or self.components.shape[0] != embeddings.shape[1]
+            if stale and len(embeddings) < PCA_MIN_ROWS:
+                self._current, self._size = None, 0
+                return
+            if stale or self._refit_due(len(embeddings)):
+                self._fit(embeddings)
+        reduced = self._project(embeddings, self.mean, self.components)
+        capacity = max(len(reduced), 1024)
+        rows = np.empty((capacity, self.dim), dtype=np.float32)
+        norms = np.empty(capacity, dtype=np.float32)
+        rows[:len(reduced)] = reduced
+        norms[:len(reduced)] = self._row_norms(embeddings, reduced)
+        self._current = (self.mean, self.components, rows, norms)
+        self._size = len(reduced)
+
+    def append(self, new_rows: np.ndarray, embeddings: np.ndarray):
+        """Add the reduced new_rows, the last rows of embeddings (all stored embeddings)"""
+        if (
+            self._current is None
+            or self._size + len(new_rows) != len(embeddings)
+            or self._refit_due(len(embeddings))
+        ):
+            # Not built yet, out of step, or grown enough to refit
+            self.rebuild(embeddings)
+            return
+
+        mean, components, rows, norms = self._current
+        needed = self._size + len(new_rows)
+        if needed > len(rows):
+            capacity = max(needed, len(rows) * 2)
+            grown_rows = np.empty((capacity, self.dim), dtype=np.float32)
+            grown_norms = np.empty(capacity, dtype=np.float32)
+            grown_rows[:self._size] = rows[:self._size]
+            grown_norms[:self._size] = norms[:self._size]
+            rows, norms = grown_rows, grown_norms
+            self._current = (mean, components, rows, norms)
+        reduced = self._project(new_rows, mean, components)
+        rows[self._size:needed] = reduced
+        norms[self._size:needed] = self._row_norms(new_rows, reduced)
+        self._size = needed
+
+    def keep(self, mask: np.ndarray):
+        """Drop the rows where mask is False, as the store does on delete"""
+        if self._current is None:
+            return
+        mean, components, rows, norms = self._current
+        remaining = int(mask.sum())
+        rows[:remaining] = rows[:self._size][mask]
+        norms[:remaining] = norms[:self._size][mask]
+        self._size = remaining
+
+    def clear(self):
+        self._current, self._size = None, 0
+        self.mean, self.components, self.fitted_rows = None, None, 0
+
+    # ===== Search =====
+
+    def shortlist(self, queries: np.ndarray, n: int, size: int) -> np.ndarray:
+        """Indices (n, queries) of the n best rows per query by approximate cosine
+
+        queries are unit-length full-dimension vectors, one per row. Only the
+        first size rows are scanned, the rows the caller's store has.
+        """
+        mean, components, rows, norms = self._current
+        size = min(size, self._size)
+        reduced = self._project(queries, mean, components)
+        scores = rows[:size] @ reduced.T
+        if self.method == "pca":
+            # The mean's part of each dot product, dropped by centering
+            scores += queries @ mean
+        norm_column = norms[:size, None]
+        np.divide(scores, norm_column, out=scores, where=norm_column > 0)
+        if n >= size:
+            return np.broadcast_to(np.arange(size)[:, None], scores.shape)
+        return np.argpartition(scores, -n, axis=0)[-n:]
@@ -0,0 +1,186 @@
+"""
+Embedding Migration
+Re-embed the knowledge base in the background after the embedding model changes
+
+Every store records the model its vectors come from, and queries against
+it are embedded with that model, so nothing is ever compared across
+models. A migration re-embeds each collection's stored chunk text with
+the new model into a shadow matrix, throttled so Ollama still has room
+for queries. Queries keep using the old vectors until the shadow covers
+every chunk. The shadow is then swapped in as a whole under the store
+lock. Chunks added or deleted meanwhile are caught up before the swap,
+since the shadow is keyed by chunk text.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class EmbeddingMigration:
+    """Background re-embed of every collection into shadow stores, one collection at a time"""
+
+    def __init__(
+        self,
+        chatbot: "RAGChatbot",
+        chunks_per_second: float = 20.0,
+        batch_size: int = 32,
+        on_swap: Optional[Callable[[str], None]] = None
+    ):
+        self.chatbot = chatbot
+        self.chunks_per_second = chunks_per_second
+        self.batch_size = max(1, batch_size)
+        self.on_swap = on_swap
+
+        self.state = "idle"
+        self.model: Optional[str] = None
+        self.started: Optional[str] = None
+        self.finished: Optional[str] = None
+        self.error: Optional[str] = None
+        self.collections: Dict[str, Dict] = {}
+
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def needed(self, model: str) -> bool:
+        """Whether any loaded collection was embedded with another model"""
+        return any(
+            store.embedding_model != model and store.ids
+            for store in self.chatbot.collections.loaded().values()
+        )
+
+    def start(self, model: str) -> bool:
+        """Migrate every collection to model; restarts a running migration to another model"""
+        with self._lock:
+            if self.state == "running" and self.model == model:
+                return False
+            self.cancel()
+            self._cancel.clear()
+            self.state = "running"
+            self.model = model
+            self.started = datetime.now().isoformat()
+            self.finished = self.error = None
+            self.collections = {}
+            self._thread = threading.Thread(target=self._run, args=(model,), name="reembed", daemon=True)
+            self._thread.start()
+        logger.info(f"Re-embedding the knowledge base with {model} in the background")
+        return True
+
+    def cancel(self):
+        """Stop a running migration; the old vectors stay in use"""
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._cancel.set()
+            thread.join()
+
+    def remaining(self) -> int:
+        """Chunks still to embed in the collection being migrated"""
+        return sum(
+            max(0, progress["chunks"] - progress["embedded"])
+            for progress in list(self.collections.values())
+            if progress["state"] == "running"
+        )
+
+    def status(self) -> Dict:
+        return {
+            "state": self.state,
+            "model": self.model,
+            "started": self.started,
+            "finished": self.finished,
+            "error": self.error,
+            "collections": {name: dict(progress) for name, progress in list(self.collections.items())}
+        }
+
+    def _run(self, model: str):
+        try:
+            for name in self.chatbot.collections.names():
+                self._migrate(name, model)
+            self.state = "completed"
+            logger.info(f"Knowledge base re-embedded with {model}")
+        except _Cancelled:
+            self.state = "cancelled"
+            logger.info(f"Re-embedding with {model} cancelled")
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            logger.error(f"Error re-embedding the knowledge base with {model}: {e}")
+        finally:
+            self.finished = datetime.now().isoformat()
+
+    def _migrate(self, name: str, model: str):
+        progress = self.collections[name] = {"state": "running", "chunks": 0, "embedded": 0}
+        lock = self.chatbot._store_lock
+        with self.chatbot.collections.use(name) as store:
+            if store.embedding_model == model:
+                progress["state"] = "current"
+                return
+            previous_model = store.embedding_model
+            start = time.perf_counter()
+            # The shadow: new vectors keyed by chunk md5, so edits meanwhile are easy to catch up
+            shadow: Dict[str, np.ndarray] = {}
+
+            while True:
+                with lock:
+                    documents = list(store.documents)
+                missing = [doc for doc in documents if store._compute_hash(doc) not in shadow]
+                progress["chunks"] = len(documents)
+                progress["embedded"] = len(documents) - len(missing)
+                if len(missing) > self.batch_size:
+                    self._embed(store, missing, model, shadow, progress, throttle=True)
+                    continue
+
+                # Last few chunks under the lock, so nothing changes between them and the swap
+                with lock:
+                    missing = [doc for doc in store.documents if store._compute_hash(doc) not in shadow]
+                    self._embed(store, missing, model, shadow, progress, throttle=False)
+                    rows = [shadow[store._compute_hash(doc)] for doc in store.documents]
+                    replacement = store.with_embeddings(
+                        np.stack(rows) if rows else np.empty((0, 0), dtype=np.float32), model
+                    )
+                    if self.chatbot.collections.swap(name, replacement):
+                        break
+                # An ingest holds the collection; catch up again once it is done
+                if self._cancel.wait(1.0):
+                    raise _Cancelled()
+
+        progress["state"] = "completed"
+        progress["embedded"] = progress["chunks"] = len(rows)
+        logger.info(
+            f"Re-embedded collection '{name}' ({len(rows)} chunks) from {previous_model} to {model} "
+            f"in {time.perf_counter() - start:.1f} s"
+        )
+        if self.on_swap is not None:
+            self.on_swap(name)
+
+    def _embed(
+        self,
+        store: "SimpleVectorStore",
+        texts: List[str],
+        model: str,
+        shadow: Dict[str, np.ndarray],
+        progress: Dict,
+        throttle: bool
+    ):
+        for i in range(0, len(texts), self.batch_size):
+            if self._cancel.is_set():
+                raise _Cancelled()
+            batch_start = time.perf_counter()
+            batch = texts[i:i + self.batch_size]
+            for text, vector in zip(batch, self.chatbot.embed_queries(batch, model)):
+                shadow[store._compute_hash(text)] = np.asarray(vector, dtype=np.float32)
+            progress["embedded"] += len(batch)
+            if throttle and self.chunks_per_second > 0:
+                pause = len(batch) / self.chunks_per_second - (time.perf_counter() - batch_start)
+                if pause > 0 and self._cancel.wait(pause):
+                    raise _Cancelled()
@@ -7,9 +7,11 @@ from datetime import datetime
 class ChatRequest(BaseModel):
     message: str = Field(..., min_length=1, max_length=5000)
     use_rag: bool = True
-    session_id: Optional[str] = None
+    session_id: Optional[str] = None  # Continue this conversation (recent turns plus a summary)
     top_k: Optional[int] = Field(default=3, ge=1, le=10)
     model: Optional[str] = None  # Allow per-request model override
+    debug: bool = False  # Include a per-stage timing breakdown in the response
+    collections: Optional[List[str]] = None  # Collections to search, default: ["default"]
     
     @validator('message')
     def validate_message(cls, v):
@@ -20,6 +22,21 @@ class ChatRequest(BaseModel):
 class AddDocumentRequest(BaseModel):
     path: str
     metadata: Optional[Dict] = None
+    collection: str = "default"
+
+class ReembedRequest(BaseModel):
+    model: Optional[str] = None  # Embedding model to switch to, default: the configured one
+
+class WatchFolderRequest(BaseModel):
+    path: str = Field(..., min_length=1)
+    recursive: bool = True
+
+class UnwatchFolderRequest(BaseModel):
+    path: str = Field(..., min_length=1)
+    purge: bool = True  # Also remove the folder's documents from the knowledge base
+
+class WatchScanRequest(BaseModel):
+    path: Optional[str] = None  # Scan every watched folder when omitted
 
 class ModelSwitchRequest(BaseModel):
     model_name: str = Field(..., min_length=1)
@@ -32,12 +49,55 @@ class ModelSwitchRequest(BaseModel):
 
 # ============ Response Schemas ============
 
+class RetrievedChunk(BaseModel):
+    source: str
+    chunk: Optional[int] = None
+    collection: Optional[str] = None
+    similarity: float
+    used: bool
+
+class ChatTimings(BaseModel):
+    embed_ms: Optional[float] = None
+    search_ms: Optional[float] = None
+    vision_ms: Optional[float] = None
+    prompt_build_ms: Optional[float] = None
+    model_load_ms: float = 0.0
+    prompt_eval_ms: float = 0.0
+    generation_ms: float = 0.0
+    total_ms: float
+
+class ContextPacking(BaseModel):
+    budget: int  # Context token budget for the model, 0 = unlimited
+    naive_tokens: int  # Estimated tokens of the top-k chunks joined verbatim
+    tokens: int  # Estimated tokens actually sent
+    tokens_saved: int
+    chunks_merged: int
+    overlap_words_removed: int
+    passages_truncated: int
+    passages_dropped: int
+
+class MemoryInfo(BaseModel):
+    turns: int  # Turns replayed verbatim
+    summarized_turns: int  # Older turns folded into the summary
+    summary_tokens: int
+    folding: bool  # A summary update is running in the background
+
+class ChatDebugInfo(BaseModel):
+    timings: ChatTimings
+    prompt_tokens: Optional[int] = None
+    generated_tokens: Optional[int] = None
+    tokens_per_second: Optional[float] = None
+    retrieved_chunks: List[RetrievedChunk] = []
+    context: Optional[ContextPacking] = None
+    memory: Optional[MemoryInfo] = None
+
 class ChatResponse(BaseModel):
     answer: str
     sources: List[str]
     context_used: bool = True
     model_used: Optional[str] = None
     timestamp: datetime = Field(default_factory=datetime.now)
+    debug: Optional[ChatDebugInfo] = None
 
 class MessageModel(BaseModel):
     role: str = Field(..., pattern="^(user|assistant)$")
@@ -66,6 +126,11 @@ class ListChatsResponse(BaseModel):
 class DeleteChatRequest(BaseModel):
     session_id: str
 
+class AppendChatMessagesRequest(BaseModel):
+    messages: List[Dict] = []
+    session: Optional[Dict] = None  # Session fields to update (title, updatedAt, ...)
+    expected_count: Optional[int] = Field(default=None, ge=0)  # Messages the client already saved
+
 class DocumentResponse(BaseModel):
     id: str
     filename: str
@@ -78,6 +143,11 @@ class UploadResponse(BaseModel):
     filename: str
     chunks_created: int
     message: Optional[str] = None
+    unchanged: bool = False
+    replaced: bool = False
+    duplicates_skipped: int = 0
+    near_duplicates_skipped: int = 0
+    bytes_saved: int = 0
 
 class DocumentListResponse(BaseModel):
     documents: List[Dict]
@@ -98,6 +168,9 @@ class HealthResponse(BaseModel):
     version: str = "1.0.0"
     models: Dict[str, str]
     vector_store_size: int
+    ollama_connected: Optional[bool] = None
+    kb_status: str = "ready"  # "loading", "ready" or "error"
+    kb_progress: float = 1.0
 
 class ModelInfo(BaseModel):
     name: str
@@ -106,6 +179,19 @@ class ModelInfo(BaseModel):
     digest: str
     capabilities: List[str] = []
 
+class ModelThroughput(BaseModel):
+    requests: int
+    avg_latency_ms: float
+    avg_load_ms: float
+    cold_loads: int
+    prompt_tokens: int
+    generated_tokens: int
+    prompt_tokens_per_second: Optional[float] = None
+    generation_tokens_per_second: Optional[float] = None
+
+class ModelStatsResponse(BaseModel):
+    models: Dict[str, ModelThroughput]
+
 class ModelListResponse(BaseModel):
     models: List[ModelInfo]
     current_llm: str
@@ -113,6 +199,7 @@ class ModelListResponse(BaseModel):
     
 class DeleteDocumentRequest(BaseModel):
     filename: str
+    collection: str = "default"
     
     @validator('filename')
     def validate_filename(cls, v):
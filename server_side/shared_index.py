@@ -0,0 +1,229 @@
+"""
+Shared Index
+One writer, many readers across uvicorn worker processes
+
+The process holding the writer lock owns the knowledge base: it ingests,
+saves, and after every save publishes an index generation (a directory of
+.npy matrices plus a pickle of chunk text and metadata), then points
+CURRENT at it with an atomic rename. Reader processes memory-map the newest
+generation, so the embedding matrix sits in the page cache once no matter
+how many workers serve queries, and swap stores when CURRENT moves.
+Readers hand their writes to the writer through a spool directory.
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+
+class WriterLock:
+    """Non-blocking exclusive file lock; released by the OS if the holder dies"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = None
+
+    def acquire(self) -> bool:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        f = open(self.path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class IndexGenerations:
+    """Numbered snapshots of the default store plus an atomic CURRENT pointer"""
+
+    def __init__(self, root: Path, keep: int = 3):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        # Older generations are kept briefly for readers that are mid-swap
+        self.keep = max(2, keep)
+
+    @property
+    def _pointer(self) -> Path:
+        return self.root / "CURRENT"
+
+    def current(self) -> Optional[str]:
+        try:
+            return self._pointer.read_text(encoding="utf-8").strip() or None
+        except FileNotFoundError:
+            return None
+
+    def publish(self, store) -> str:
+        """Write the store as the next generation and make it current"""
+        start = time.perf_counter()
+        name = f"{int(self.current() or 0) + 1:08d}"
+        staging = self.root / f".{name}.tmp"
+        target = self.root / name
+        for leftover in (staging, target):
+            shutil.rmtree(leftover, ignore_errors=True)
+
+        staging.mkdir()
+        store.save_generation(str(staging))
+        os.replace(staging, target)
+
+        pointer_tmp = self.root / "CURRENT.tmp"
+        pointer_tmp.write_text(name, encoding="utf-8")
+        os.replace(pointer_tmp, self._pointer)
+
+        self._prune(name)
+        logger.info(
+            f"Published index generation {name} ({len(store.ids)} chunks) "
+            f"in {(time.perf_counter() - start) * 1000:.1f} ms"
+        )
+        return name
+
+    def load(self, store_factory: Callable[[], "SimpleVectorStore"], name: Optional[str] = None):
+        """A store over the given (default: current) generation's mapped matrices"""
+        name = name or self.current()
+        if name is None:
+            raise FileNotFoundError(f"No index generation published in {self.root}")
+        store = store_factory()
+        store.load_generation(str(self.root / name))
+        return store
+
+    def _prune(self, current: str):
+        generations = sorted(p.name for p in self.root.iterdir() if p.is_dir() and p.name.isdigit())
+        for name in generations[:-self.keep]:
+            if name != current:
+                # Fails harmlessly on platforms that can't delete mapped files
+                shutil.rmtree(self.root / name, ignore_errors=True)
+
+
+class GenerationFollower:
+    """Reader side: swap in each newly published generation"""
+
+    def __init__(
+        self,
+        generations: IndexGenerations,
+        store_factory: Callable[[], "SimpleVectorStore"],
+        on_store: Callable[[str, "SimpleVectorStore"], None],
+        interval: float = 1.0
+    ):
+        self.generations = generations
+        self.store_factory = store_factory
+        self.on_store = on_store
+        self.interval = interval
+        self.generation: Optional[str] = None
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def poll(self) -> bool:
+        """Load the current generation if it moved; True if a new store was swapped in"""
+        with self._lock:
+            name = self.generations.current()
+            if name is None or name == self.generation:
+                return False
+            store = self.generations.load(self.store_factory, name)
+            self.on_store(name, store)
+            self.generation = name
+            return True
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="generation-follower", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except FileNotFoundError:
+                # Pruned between reading CURRENT and opening it; the next poll catches up
+                continue
+            except Exception as e:
+                logger.error(f"Error loading index generation: {e}")
+
+
+class WriteSpool:
+    """Writes queued by readers as JSON files, applied by the writer in order"""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, op: str, **args) -> str:
+        job_id = f"{time.time_ns():020d}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        tmp = self.directory / f".{job_id}.tmp"
+        tmp.write_text(json.dumps({"op": op, "args": args}), encoding="utf-8")
+        # The writer only picks up *.json, so it never sees a half-written job
+        os.replace(tmp, self.directory / f"{job_id}.json")
+        return job_id
+
+    def pending(self) -> int:
+        return sum(1 for _ in self.directory.glob("*.json"))
+
+    def drain(self, handler: Callable[[str, Dict], None]) -> int:
+        """Apply every queued job, oldest first; returns how many ran"""
+        applied = 0
+        for path in sorted(self.directory.glob("*.json")):
+            try:
+                job = json.loads(path.read_text(encoding="utf-8"))
+                handler(job["op"], job.get("args", {}))
+                applied += 1
+            except Exception as e:
+                logger.error(f"Error applying spooled write {path.name}: {e}")
+            finally:
+                path.unlink(missing_ok=True)
+        return applied
+
+    def start(
+        self,
+        handler: Callable[[str, Dict], None],
+        interval: float = 1.0,
+        on_drained: Optional[Callable[[], None]] = None
+    ):
+        """Drain the spool periodically on a daemon thread"""
+        if self._thread is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    if self.drain(handler) and on_drained is not None:
+                        on_drained()
+                except Exception as e:
+                    logger.error(f"Error draining write spool: {e}")
+
+        self._thread = threading.Thread(target=run, name="write-spool", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
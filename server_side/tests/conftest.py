@@ -0,0 +1,75 @@
+"""
+Shared fixtures: a fake Ollama server for the whole run, and stores and
+chatbots built in temporary directories
+"""
+
+import itertools
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVER_DIR))
+sys.path.insert(0, str(SERVER_DIR / "benchmarks"))
+
+from fake_ollama import DEFAULT_ANSWER, FakeOllama
+
+# The ollama client reads OLLAMA_HOST when it is first imported, so the fake
+# has to be up before any test module imports rag_engine
+FAKE_OLLAMA = FakeOllama().start()
+os.environ["OLLAMA_HOST"] = FAKE_OLLAMA.url
+
+
+@pytest.fixture
+def fake_ollama():
+    """The shared fake server; answers set on it are reset after the test"""
+    yield FAKE_OLLAMA
+    FAKE_OLLAMA.responses = itertools.cycle([DEFAULT_ANSWER])
+
+
+@pytest.fixture
+def make_chatbot(tmp_path):
+    """Build a RAGChatbot whose storage all lives under tmp_path"""
+    from rag_engine import RAGChatbot
+
+    def make(**kwargs):
+        kwargs.setdefault("kb_path", tmp_path / "knowledge_base.pkl")
+        kwargs.setdefault("collections_dir", tmp_path / "collections")
+        kwargs.setdefault("memory_dir", tmp_path / "memory")
+        kwargs.setdefault("image_cache_dir", tmp_path / "image_cache")
+        return RAGChatbot(**kwargs)
+
+    return make
+
+
+@pytest.fixture(scope="session")
+def api(tmp_path_factory):
+    """TestClient for main.app, run from a scratch working directory"""
+    from fastapi.testclient import TestClient
+
+    previous = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("server"))
+    try:
+        import main
+        with TestClient(main.app) as client:
+            yield client
+    finally:
+        os.chdir(previous)
+
+
+def random_embeddings(rows: int, dim: int = 32, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((rows, dim), dtype=np.float32)
+
+
+def add_rows(store, embeddings: np.ndarray, source: str = "doc.txt", start: int = 0):
+    """Add embeddings to a store as chunks start.. of source"""
+    count = len(embeddings)
+    store.add(
+        ids=[f"{source}_{i}" for i in range(start, start + count)],
+        embeddings=embeddings,
+        documents=[f"chunk {i} of {source}" for i in range(start, start + count)],
+        metadatas=[{"source": source, "filename": source, "chunk": i} for i in range(start, start + count)]
+    )
@@ -0,0 +1,57 @@
+"""Batch chat: input parsing, resumable runs and the shared chatbot factory"""
+
+import json
+
+import pytest
+
+from batch_chat import BatchRunner, parse_items, validate_run_id
+from config import Settings
+from fixtures import write_txt
+from rag_engine import build_chatbot
+
+
+def test_build_chatbot_applies_every_setting(tmp_path):
+    settings = Settings(
+        STORAGE_DIR=tmp_path,
+        CONTEXT_MIN_TOKENS=300,
+        MEMORY_RECENT_TURNS=4,
+        MEMORY_HISTORY_TOKENS=256,
+        IMAGE_CAPTIONING=True,
+        SUMMARY_MODEL="summarizer",
+        NEAR_DUP_DETECTION=False
+    )
+
+    bot = build_chatbot(settings)
+
+    assert bot.context.min_context_tokens == 300
+    assert (bot.memory.recent_turns, bot.memory.history_tokens) == (4, 256)
+    assert bot.captioner is not None
+    assert bot.summary_model == "summarizer"
+    assert bot.near_dup_distance is None
+    assert bot.collections.get("default").text_dir == tmp_path
+
+
+def test_parse_items_numbers_lines_and_rejects_duplicates():
+    items = parse_items(['{"question": " first "}', "", '{"id": "q2", "message": "second"}'])
+    assert [(item["id"], item["question"]) for item in items] == [("1", "first"), ("q2", "second")]
+
+    with pytest.raises(ValueError, match="Line 2: duplicate id 'a'"):
+        parse_items(['{"id": "a", "question": "x"}', '{"id": "a", "question": "y"}'])
+    with pytest.raises(ValueError, match="Invalid run id"):
+        validate_run_id("../escape")
+
+
+def test_interrupted_run_resumes_with_unanswered_items(make_chatbot, fake_ollama, tmp_path):
+    bot = make_chatbot()
+    assert bot.add_document(str(write_txt(tmp_path / "doc.txt", 200)))[0]
+    runner = BatchRunner(bot, tmp_path / "runs", batch_size=2, concurrency=2)
+    items = parse_items(json.dumps({"id": f"q{i}", "question": f"question {i} about documents"}) for i in range(5))
+
+    first = [record for record in runner.run(items[:3], "run-1") if "summary" not in record]
+    records = list(runner.run(items, "run-1"))
+
+    assert sorted(record["id"] for record in first) == ["q0", "q1", "q2"]
+    assert sorted(record["id"] for record in records[:-1]) == ["q3", "q4"]
+    assert records[-1]["summary"]["skipped"] == 3
+    assert records[-1]["summary"]["answered"] == 2
+    assert set(runner.completed("run-1")) == {f"q{i}" for i in range(5)}
@@ -0,0 +1,53 @@
+"""The benchmark suite's fake Ollama and a small vector store run"""
+
+import ollama
+import pytest
+
+from fake_ollama import FakeOllama
+from run_benchmarks import bench_vector_store, timed
+
+
+def _cosine(a, b):
+    return sum(x * y for x, y in zip(a, b))
+
+
+def test_fake_embeddings_are_deterministic_and_word_based():
+    with FakeOllama(dim=64) as fake, FakeOllama(dim=64) as again:
+        cats = fake.embed("cats sleep on the sofa")
+
+        assert cats == again.embed("cats sleep on the sofa")
+        assert _cosine(cats, fake.embed("cats sleep on the bed")) > _cosine(cats, fake.embed("quarterly revenue grew"))
+        assert fake.embed("") == [0.0] * 64
+
+
+def test_fake_serves_the_ollama_client_and_rejects_unknown_models(fake_ollama):
+    client = ollama.Client(host=fake_ollama.url)
+    before = fake_ollama.request_counts.get("/api/chat", 0)
+
+    reply = client.chat(model="ministral-3", messages=[{"role": "user", "content": "hi"}])
+
+    assert reply["message"]["content"]
+    assert reply["eval_count"] > 0
+    assert fake_ollama.request_counts["/api/chat"] == before + 1
+    with pytest.raises(ollama.ResponseError):
+        client.embeddings(model="not-installed", prompt="x")
+
+
+def test_vector_store_section_reports_every_operation(tmp_path):
+    results = bench_vector_store([300], dim=16, queries=5, seed=0, workdir=tmp_path)
+
+    stats = results["300"]
+    assert set(stats) == {"add", "query", "delete_by_source", "save", "load"}
+    assert stats["query"]["runs"] == 5
+    assert stats["save"]["bytes"] > 0
+    assert not list(tmp_path.glob("*.pkl"))
+
+
+def test_timed_summarizes_samples():
+    calls = []
+
+    stats = timed(lambda: calls.append(1), repeat=4)
+
+    assert len(calls) == 4
+    assert stats["runs"] == 4
+    assert stats["min_ms"] <= stats["p50_ms"] <= stats["p95_ms"]
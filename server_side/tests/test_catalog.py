@@ -0,0 +1,43 @@
+"""Document catalog: per-file counts cached by store version, served with ETags"""
+
+from conftest import add_rows, random_embeddings
+from fixtures import make_text
+from rag_engine import SimpleVectorStore
+
+
+def test_catalog_is_reused_until_the_store_changes(tmp_path):
+    store = SimpleVectorStore(text_dir=tmp_path)
+    add_rows(store, random_embeddings(5), source="a.txt")
+    add_rows(store, random_embeddings(3, seed=1), source="b.txt")
+
+    catalog = store.catalog()
+    assert [(entry["filename"], entry["chunks"]) for entry in catalog] == [("a.txt", 5), ("b.txt", 3)]
+    assert store.catalog() is catalog
+
+    store.record_file("a.txt", {"hash": "x", "chunks": 5, "size": 1234})
+    assert store.catalog() is not catalog and store.catalog()[0]["size"] == 1234
+
+    store.delete_by_source("a.txt")
+    assert [entry["filename"] for entry in store.catalog()] == ["b.txt"]
+
+
+def test_documents_revalidate_with_etags(api):
+    files = {"file": ("catalog.txt", make_text(300, seed=8).encode(), "text/plain")}
+    api.post("/upload?collection=catalog", files=files)
+
+    first = api.get("/documents?collection=catalog")
+    etag = first.headers["ETag"]
+    assert first.json()["documents"][0]["filename"] == "catalog.txt"
+    assert first.headers["Cache-Control"] == "no-cache"
+
+    repeat = api.get("/documents?collection=catalog", headers={"If-None-Match": etag})
+    assert repeat.status_code == 304 and repeat.headers["ETag"] == etag
+
+    api.post("/upload?collection=catalog", files={"file": ("more.txt", make_text(300, seed=9).encode(), "text/plain")})
+    changed = api.get("/documents?collection=catalog", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert changed.json()["total_documents"] == 2
+
+
+def test_unknown_collection_is_not_found(api):
+    assert api.get("/documents?collection=nowhere").status_code == 404
@@ -0,0 +1,79 @@
+"""Append-only chat logs: appends, conflicts, paging, legacy sessions and compaction"""
+
+import json
+
+import pytest
+
+from chat_log import ChatConflict, ChatLog
+
+
+def _messages(start, count):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}"} for i in range(start, start + count)]
+
+
+def _lines(log, session_id):
+    return log.path_for(session_id).read_bytes().count(b"\n")
+
+
+def test_appends_page_and_resave_without_rewriting(tmp_path):
+    log = ChatLog(tmp_path)
+    assert log.append("s1", _messages(0, 4), {"title": "Hello", "updatedAt": 1}) == 4
+    assert log.append("s1", _messages(4, 2), {"title": "Hello", "updatedAt": 2}, expected_count=4) == 6
+    before = log.path_for("s1").read_bytes()
+
+    page = log.load("s1", offset=2, limit=3)
+    assert page["messages"] == _messages(2, 3)
+    assert (page["title"], page["updatedAt"], page["total_messages"]) == ("Hello", 2, 6)
+
+    # The old whole-session save appends only what is new
+    assert log.save("s1", {"title": "Hello", "updatedAt": 3, "messages": _messages(0, 7)}) == 1
+    assert log.path_for("s1").read_bytes().startswith(before)
+    assert log.load("s1")["messages"] == _messages(0, 7)
+    # An edited history is rewritten
+    assert log.save("s1", {"title": "Edited", "messages": _messages(1, 2)}) == 2
+    assert log.load("s1") == {"id": "s1", "title": "Edited", "updatedAt": 3, "messages": _messages(1, 2)}
+
+
+def test_stale_append_is_a_conflict(tmp_path):
+    log = ChatLog(tmp_path)
+    log.append("s1", _messages(0, 3))
+
+    with pytest.raises(ChatConflict) as conflict:
+        log.append("s1", _messages(3, 1), expected_count=2)
+
+    assert conflict.value.actual == 3
+    assert log.meta("s1")["total_messages"] == 3
+
+
+def test_torn_tail_is_dropped_and_legacy_sessions_are_converted(tmp_path):
+    log = ChatLog(tmp_path)
+    log.append("s1", _messages(0, 2))
+    with open(log.path_for("s1"), "ab") as f:
+        f.write(b'{"message": {"role": "us')
+    (tmp_path / "old.json").write_text(json.dumps({"id": "old", "title": "Old", "messages": _messages(0, 2)}))
+
+    assert log.append("s1", _messages(2, 1)) == 3
+    assert log.load("s1")["messages"] == _messages(0, 3)
+    assert log.load("old")["messages"] == _messages(0, 2)
+    assert not (tmp_path / "old.json").exists() and log.session_ids() == ["old", "s1"]
+
+
+def test_meta_heavy_logs_are_compacted_in_the_background(tmp_path):
+    log = ChatLog(tmp_path, min_compact_lines=4)
+    log.append("s1", _messages(0, 2))
+    for stamp in range(6):
+        log.append("s1", [], {"updatedAt": stamp})
+    log.join()
+
+    assert _lines(log, "s1") == 3
+    assert log.load("s1") == {"id": "s1", "updatedAt": 5, "messages": _messages(0, 2)}
+
+
+def test_append_endpoint_reports_conflicts(api):
+    assert api.post("/chats/api-log/messages", json={"messages": _messages(0, 2)}).json()["total_messages"] == 2
+
+    stale = api.post("/chats/api-log/messages", json={"messages": _messages(2, 1), "expected_count": 1})
+
+    assert stale.status_code == 409
+    assert stale.json()["detail"]["total_messages"] == 2
+    assert api.get("/chats/load/api-log?offset=1&limit=1").json()["messages"] == _messages(1, 1)
@@ -0,0 +1,41 @@
+"""Per-request timing breakdown, token throughput and per-model stats"""
+
+from rag_engine import ModelStatsTracker
+
+
+def test_debug_chat_reports_stage_timings_and_throughput(api, fake_ollama, monkeypatch):
+    monkeypatch.setattr(fake_ollama, "token_latency", 0.001)
+
+    response = api.post("/chat", json={"message": "What is in my documents?", "debug": True})
+
+    assert response.status_code == 200
+    debug = response.json()["debug"]
+    timings = debug["timings"]
+    assert timings["generation_ms"] > 0
+    assert timings["total_ms"] >= timings["generation_ms"]
+    assert debug["generated_tokens"] > 0 and debug["tokens_per_second"] > 0
+    assert api.post("/chat", json={"message": "Again"}).json()["debug"] is None
+
+    stats = api.get("/stats/models").json()["models"]["ministral-3"]
+    assert stats["requests"] >= 1 and stats["generation_tokens_per_second"] > 0
+
+
+def test_failed_generation_is_reported_in_the_answer(make_chatbot):
+    bot = make_chatbot()
+
+    result = bot.chat("Hello", use_rag=False, model_override="not-installed", debug=True)
+
+    assert "error" in result and "debug" not in result
+    assert result["model_used"] == "not-installed"
+    assert "not-installed" not in bot.model_stats.snapshot()
+
+
+def test_model_stats_average_without_durations():
+    tracker = ModelStatsTracker()
+    tracker.record("m", {"eval_count": 10, "load_duration": 2e9}, 100.0)
+    tracker.record("m", {"eval_count": 10}, 50.0)
+
+    stats = tracker.snapshot()["m"]
+
+    assert (stats["requests"], stats["avg_latency_ms"], stats["cold_loads"]) == (2, 75.0, 1)
+    assert stats["generation_tokens_per_second"] is None
@@ -0,0 +1,71 @@
+"""Columnar chunk metadata: interned tables, plain-dict reads and deletes"""
+
+import pytest
+
+from chunk_metadata import NO_CHUNK, ChunkMetadata
+
+
+def _meta(source, chunk, **extra):
+    return {
+        "source": source,
+        "filename": source.rsplit("/", 1)[-1],
+        "file_type": ".txt",
+        "upload_date": "2026-01-01T00:00:00",
+        "chunk": chunk,
+        **extra
+    }
+
+
+def _rows():
+    return [
+        _meta("/docs/a.txt", 0, tag="x"),
+        _meta("/docs/a.txt", 1, tag="x"),
+        _meta("/docs/b.txt", 0),
+        _meta("/docs/b.txt", None, caption=True),
+        _meta("/docs/c.txt", 0, chunk_label="intro")
+    ]
+
+
+def test_reads_return_the_dicts_that_were_appended():
+    meta = ChunkMetadata()
+    meta.extend(_rows())
+
+    expected = _rows()
+    # A chunk that isn't an int round-trips through the extras table
+    assert meta._chunks[3] == NO_CHUNK
+    assert list(meta) == expected and meta[-1] == expected[-1] and meta[1:3] == expected[1:3]
+    # Shared fields are stored once per document, shared extras once
+    assert len(meta.documents) == 3 and meta.doc_counts == [2, 2, 1]
+    assert len(meta._extras) == 4
+
+    restored = ChunkMetadata.from_dict(meta.to_dict())
+    assert list(restored) == expected and restored.doc_counts == meta.doc_counts
+
+
+def test_rows_for_and_deletes_keep_the_tables_compact():
+    meta = ChunkMetadata()
+    meta.extend(_rows())
+
+    assert meta.rows_for("source", "/docs/b.txt").tolist() == [2, 3]
+    assert meta.rows_for("source", "/docs/missing.txt").tolist() == []
+
+    meta.delete_rows(meta.rows_for("source", "/docs/a.txt"))
+    del meta[0]
+
+    assert [row["source"] for row in meta] == ["/docs/b.txt", "/docs/c.txt"]
+    assert [doc["source"] for doc, _ in meta.chunk_counts()] == ["/docs/b.txt", "/docs/c.txt"]
+    assert len(meta.documents) == 2 and len(meta._extras) == 3
+    with pytest.raises(IndexError):
+        meta[2]
+
+
+def test_copies_are_independent():
+    meta = ChunkMetadata()
+    meta.extend(_rows())
+    copy = meta.copy()
+
+    copy.append(_meta("/docs/d.txt", 0))
+    meta.delete_rows([0])
+
+    assert len(copy) == 6 and len(meta) == 4
+    assert copy[0] == _rows()[0]
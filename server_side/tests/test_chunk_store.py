@@ -0,0 +1,81 @@
+"""Chunk text segments: reads, compaction on save and sweeping replaced segments"""
+
+import os
+from pathlib import Path
+
+from chunk_store import ChunkTexts, remove_stale_segments
+from conftest import add_rows, random_embeddings
+from rag_engine import SimpleVectorStore
+
+
+def _segments(directory: Path):
+    return sorted(p.name for p in directory.glob("kb.*.chunks"))
+
+
+def _compacting_store(tmp_path):
+    """A saved store whose next save compacts into a new segment"""
+    store = SimpleVectorStore(text_dir=tmp_path)
+    add_rows(store, random_embeddings(8), source="old.txt")
+    add_rows(store, random_embeddings(2, seed=1), source="kept.txt")
+    store.save(str(tmp_path / "kb.pkl"))
+    store.delete_by_source("old.txt")
+    return store
+
+
+def test_texts_round_trip_compressed_and_plain(tmp_path):
+    for compress in (True, False):
+        texts = ChunkTexts(compress, cache_size=2, temp_dir=tmp_path)
+        texts.extend(["first", "second ünïcode", ""])
+        texts.append("fourth")
+        assert list(texts) == ["first", "second ünïcode", "", "fourth"]
+        assert texts[1] == "second ünïcode"
+
+
+def test_compaction_replaces_the_segment_and_removes_the_old_one(tmp_path):
+    store = _compacting_store(tmp_path)
+    before = _segments(tmp_path)
+
+    store.save(str(tmp_path / "kb.pkl"))
+
+    after = _segments(tmp_path)
+    assert len(after) == 1 and after != before
+    loaded = SimpleVectorStore(text_dir=tmp_path)
+    loaded.load(str(tmp_path / "kb.pkl"))
+    assert list(loaded.documents) == ["chunk 0 of kept.txt", "chunk 1 of kept.txt"]
+
+
+def test_undeletable_segment_is_left_for_the_next_save(tmp_path, monkeypatch):
+    store = _compacting_store(tmp_path)
+    old = tmp_path / _segments(tmp_path)[0]
+    real_unlink = Path.unlink
+
+    def locked(path, *args, **kwargs):
+        if path == old:
+            raise PermissionError(13, "The process cannot access the file", str(path))
+        return real_unlink(path, *args, **kwargs)
+
+    monkeypatch.setattr(Path, "unlink", locked)
+    store.save(str(tmp_path / "kb.pkl"))
+    assert old.exists() and len(_segments(tmp_path)) == 2
+
+    monkeypatch.setattr(Path, "unlink", real_unlink)
+    store.save(str(tmp_path / "kb.pkl"))
+    assert not old.exists() and len(_segments(tmp_path)) == 1
+
+
+def test_loading_sweeps_older_segments_only(tmp_path):
+    store = SimpleVectorStore(text_dir=tmp_path)
+    add_rows(store, random_embeddings(3))
+    store.save(str(tmp_path / "kb.pkl"))
+    current = _segments(tmp_path)[0]
+    older, newer = tmp_path / "kb.older.chunks", tmp_path / "kb.newer.chunks"
+    for path, age in ((older, -60), (newer, 60)):
+        path.write_bytes(b"x")
+        mtime = (tmp_path / current).stat().st_mtime + age
+        os.utime(path, (mtime, mtime))
+
+    SimpleVectorStore(text_dir=tmp_path).load(str(tmp_path / "kb.pkl"))
+
+    # A newer segment belongs to a save by another process, not yet loaded here
+    assert _segments(tmp_path) == sorted([current, newer.name])
+    assert remove_stale_segments(tmp_path, "kb", "missing.chunks") == 0
@@ -0,0 +1,43 @@
+"""Cold start: heavy modules are imported on first use, not at startup"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import SERVER_DIR
+from rag_engine import LazyModule
+
+
+def test_lazy_module_imports_on_first_attribute(tmp_path, monkeypatch):
+    (tmp_path / "lazy_probe.py").write_text("VALUE = 42\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    probe = LazyModule("lazy_probe")
+
+    assert "lazy_probe" not in sys.modules
+    assert probe.VALUE == 42
+    assert "lazy_probe" in sys.modules
+    monkeypatch.delitem(sys.modules, "lazy_probe")
+
+
+def test_missing_module_fails_on_use_not_on_creation():
+    missing = LazyModule("no_such_module_for_lola")
+
+    with pytest.raises(ModuleNotFoundError):
+        missing.anything
+
+
+def test_importing_the_app_skips_readers_and_the_ollama_client(tmp_path, fake_ollama):
+    probe = (
+        "import sys, main; "
+        "print(sorted(m for m in ('pandas', 'PyPDF2', 'docx', 'PIL', 'ollama', 'httpx') if m in sys.modules))"
+    )
+    env = {**os.environ, "OLLAMA_HOST": fake_ollama.url, "PYTHONPATH": str(SERVER_DIR)}
+
+    result = subprocess.run(
+        [sys.executable, "-c", probe], cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,121 @@
+"""Collections: lazy loading, pinning, unloading and saving outside the lock"""
+
+import threading
+
+import pytest
+
+from collection_manager import DEFAULT_COLLECTION, CollectionManager
+from conftest import add_rows, random_embeddings
+from rag_engine import SimpleVectorStore
+
+
+class _GatedStore(SimpleVectorStore):
+    """A store whose saves wait for a test to let them through"""
+
+    def __init__(self, gate: threading.Event, started: threading.Event, **kwargs):
+        super().__init__(**kwargs)
+        self.gate, self.started = gate, started
+
+    def save(self, filepath: str):
+        self.started.set()
+        assert self.gate.wait(5)
+        super().save(filepath)
+
+
+def _manager(tmp_path, factory=None, **kwargs):
+    return CollectionManager(
+        store_factory=factory or (lambda: SimpleVectorStore(text_dir=tmp_path)),
+        collections_dir=tmp_path / "collections",
+        default_path=tmp_path / "knowledge_base.pkl",
+        **kwargs
+    )
+
+
+def test_collections_load_lazily_and_unload_after_saving(tmp_path):
+    manager = _manager(tmp_path)
+    with manager.use("notes", create=True) as store:
+        add_rows(store, random_embeddings(4))
+
+    manager.unload("notes")
+
+    assert not manager.is_loaded("notes")
+    assert manager.names() == [DEFAULT_COLLECTION, "notes"]
+    assert len(manager.get("notes").ids) == 4
+    with pytest.raises(KeyError):
+        manager.get("missing")
+    with pytest.raises(ValueError):
+        manager.get("../escape")
+
+
+def test_pinned_collections_stay_loaded_and_refuse_swaps(tmp_path):
+    manager = _manager(tmp_path)
+    with manager.use("notes", create=True) as store:
+        manager.unload("notes")
+        assert manager.is_loaded("notes")
+        with manager.use("notes"):
+            assert not manager.swap("notes", SimpleVectorStore(text_dir=tmp_path))
+        replacement = SimpleVectorStore(text_dir=tmp_path)
+        assert manager.swap("notes", replacement)
+    assert manager.get("notes") is replacement and manager.is_dirty("notes")
+    assert store is not replacement
+
+
+def test_memory_cap_unloads_least_recently_used(tmp_path):
+    manager = _manager(tmp_path, memory_cap_bytes=1)
+    for name in ("a", "b"):
+        with manager.use(name, create=True) as store:
+            add_rows(store, random_embeddings(4), source=name)
+
+    assert not manager.is_loaded("a")
+    assert manager.is_loaded("b")
+    assert (tmp_path / "collections" / "a.pkl").exists()
+
+
+def test_unload_saves_outside_the_lock(tmp_path):
+    gate, started = threading.Event(), threading.Event()
+    manager = _manager(tmp_path, factory=lambda: _GatedStore(gate, started, text_dir=tmp_path))
+    for name in ("slow", "other"):
+        with manager.use(name, create=True) as store:
+            add_rows(store, random_embeddings(4), source=name)
+
+    unloading = threading.Thread(target=manager.unload, args=("slow",))
+    unloading.start()
+    assert started.wait(5)
+    # Other collections (and the lock) stay available during the save
+    other = threading.Thread(target=lambda: manager.get("other") and manager.loaded())
+    other.start()
+    other.join(2)
+    assert not other.is_alive()
+
+    # Asking for the collection being unloaded waits, then loads it from the save
+    result = {}
+    waiting = threading.Thread(target=lambda: result.setdefault("store", manager.get("slow")))
+    waiting.start()
+    waiting.join(0.2)
+    assert waiting.is_alive()
+    gate.set()
+    unloading.join(5)
+    waiting.join(5)
+    assert len(result["store"].ids) == 4
+    assert manager.is_loaded("slow") and not manager.is_dirty("slow")
+
+
+def test_drop_waits_for_a_save_in_progress(tmp_path):
+    gate, started = threading.Event(), threading.Event()
+    manager = _manager(tmp_path, factory=lambda: _GatedStore(gate, started, text_dir=tmp_path))
+    with manager.use("notes", create=True) as store:
+        add_rows(store, random_embeddings(2))
+
+    saving = threading.Thread(target=manager.save, args=("notes",))
+    saving.start()
+    assert started.wait(5)
+    dropping = threading.Thread(target=manager.drop, args=("notes",))
+    dropping.start()
+    dropping.join(0.2)
+    assert dropping.is_alive()
+    gate.set()
+    saving.join(5)
+    dropping.join(5)
+
+    assert not manager.exists("notes")
+    assert not list((tmp_path / "collections").glob("notes*"))
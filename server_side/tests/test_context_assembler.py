@@ -0,0 +1,89 @@
+"""ContextAssembler: merging neighbouring chunks and packing them to the budget"""
+
+import itertools
+
+from context_assembler import ContextAssembler, estimate_tokens, skip_words
+from fixtures import write_png
+
+
+def hit(document, chunk, source="doc.txt", similarity=0.9):
+    return {"document": document, "meta": {"source": source, "chunk": chunk}, "source": source, "similarity": similarity}
+
+
+def test_neighbouring_chunks_merge_without_their_overlap():
+    assembler = ContextAssembler(default_budget=0)
+    packing = assembler.assemble([
+        hit("one two three four five", 0),
+        hit("four five six seven", 1),
+    ])
+
+    assert packing["context"] == "one two three four five\nsix seven"
+    assert packing["chunks_merged"] == 1
+    assert packing["overlap_words_removed"] == 2
+
+
+def test_merged_chunks_keep_their_line_breaks():
+    header = "name,qty\nbolt,4\nnut,8"
+    packing = ContextAssembler(default_budget=0).assemble([
+        hit(header, 0, source="parts.csv"),
+        hit("nut,8\nwasher,12\nscrew,3", 1, source="parts.csv"),
+    ])
+
+    assert packing["context"] == "name,qty\nbolt,4\nnut,8\nwasher,12\nscrew,3"
+
+
+def test_skip_words_keeps_the_rest_verbatim():
+    assert skip_words("a b\n  c\n\td", 2) == "c\n\td"
+    assert skip_words("a b", 5) == ""
+    assert skip_words("a b", 0) == "a b"
+
+
+def test_passages_are_packed_by_relevance_and_cut_at_the_budget():
+    long_text = " ".join(["word"] * 400)
+    packing = ContextAssembler(default_budget=150).assemble([
+        hit("short best passage", 0, source="a.txt", similarity=0.95),
+        hit(long_text, 0, source="b.txt", similarity=0.8),
+        hit("never reached", 0, source="c.txt", similarity=0.5),
+    ])
+
+    assert packing["context"].startswith("short best passage\n\nword word")
+    assert packing["sources"] == ["a.txt", "b.txt"]
+    assert packing["tokens"] <= 150
+    assert packing["passages_truncated"] == 1
+    assert packing["passages_dropped"] == 1
+
+
+def test_reserved_tokens_never_take_the_minimum_context():
+    assembler = ContextAssembler(default_budget=1000, min_context_tokens=200)
+    text = " ".join(["word"] * 1000)
+
+    assert assembler.assemble([hit(text, 0)], reserved_tokens=300)["budget"] == 700
+    assert assembler.assemble([hit(text, 0)], reserved_tokens=5000)["budget"] == 200
+    assert assembler.history_budget(None) == 800
+    assert ContextAssembler(default_budget=0).history_budget(None) is None
+
+
+def test_model_budgets_fall_back_to_the_base_name_then_the_default():
+    assembler = ContextAssembler(default_budget=100, model_budgets={"llama3.1": 6000, "qwen:7b": 3000})
+
+    assert assembler.budget_for("llama3.1:8b") == 6000
+    assert assembler.budget_for("qwen:7b") == 3000
+    assert assembler.budget_for("qwen:14b") == 100
+    assert estimate_tokens("abcd" * 10) == 10
+
+
+def test_image_questions_reach_the_vision_model_with_captions_on(make_chatbot, fake_ollama, tmp_path):
+    fake_ollama.responses = itertools.cycle(["A red bicycle leaning on a wall."])
+    bot = make_chatbot(image_captioning=True)
+    image = write_png(tmp_path / "bicycle.png", 64, 48)
+    assert bot.add_document(str(image))[0]
+    bot.captioner.join()
+    assert len(bot.vector_store.ids) == 2
+
+    result = bot.chat("what is in this image file: bicycle.png caption: a red bicycle", debug=True, top_k=3)
+
+    # The image's chunk and its caption are both used; the caption's Path: line
+    # is what sends the question to the vision model
+    assert [c["used"] for c in result["debug"]["retrieved_chunks"]] == [True, True]
+    assert result["sources"] == ["bicycle.png"]
+    assert "vision_ms" in result["debug"]["timings"]
@@ -0,0 +1,123 @@
+"""ConversationMemory folding and the prompt budget it shares with retrieved context"""
+
+import itertools
+import os
+import time
+
+import pytest
+
+from context_assembler import estimate_prompt_tokens
+from fixtures import make_text
+from memory import ConversationMemory
+
+
+def summarizer(calls):
+    def summarize(prompt):
+        calls.append(prompt)
+        return f"summary {len(calls)}"
+    return summarize
+
+
+def test_recent_turns_are_replayed_and_older_ones_folded(tmp_path):
+    calls = []
+    memory = ConversationMemory(summarizer(calls), tmp_path, recent_turns=4, fold_turns=4, history_tokens=10000)
+    for i in range(4):
+        memory.record("s1", f"question {i}", f"answer {i}")
+    memory.join()
+
+    summary, turns = memory.history("s1")
+    assert summary == "summary 1"
+    assert [t["content"] for t in turns] == ["question 2", "answer 2", "question 3", "answer 3"]
+    assert "question 0" in calls[0] and "question 2" not in calls[0]
+    assert memory.stats("s1")["summarized_turns"] == 4
+
+
+def test_long_turns_fold_inside_the_recent_window(tmp_path):
+    calls = []
+    memory = ConversationMemory(summarizer(calls), tmp_path, recent_turns=6, history_tokens=200)
+    memory.record("s1", "first question", make_text(300))
+    memory.record("s1", "second question", make_text(300, seed=1))
+    memory.join()
+
+    summary, turns = memory.history("s1")
+    # Only two exchanges, under recent_turns, but over the token limit: all but the last fold
+    assert summary == "summary 1"
+    assert [t["content"] for t in turns][0] == "second question"
+    assert len(turns) == 2
+
+
+def test_last_exchange_is_never_folded(tmp_path):
+    memory = ConversationMemory(summarizer([]), tmp_path, history_tokens=10)
+    memory.record("s1", "question", make_text(200))
+    memory.join()
+
+    assert memory.history("s1") == ("", [
+        {"role": "user", "content": "question"},
+        {"role": "assistant", "content": make_text(200)}
+    ])
+
+
+def test_history_survives_a_restart_and_forget_removes_it(tmp_path):
+    memory = ConversationMemory(summarizer([]), tmp_path)
+    memory.record("s1", "question", "answer")
+
+    assert ConversationMemory(summarizer([]), tmp_path).history("s1")[1][0]["content"] == "question"
+    memory.forget("s1")
+    assert not (tmp_path / "s1.json").exists()
+    assert memory.history("s1") == ("", [])
+
+
+def test_invalid_session_id_is_rejected(tmp_path):
+    memory = ConversationMemory(summarizer([]), tmp_path)
+    with pytest.raises(ValueError):
+        memory.history("../etc/passwd")
+
+
+def test_retrieved_context_keeps_its_minimum_under_long_history(make_chatbot, fake_ollama, tmp_path, monkeypatch):
+    import rag_engine
+
+    fake_ollama.responses = itertools.cycle([make_text(450, seed=i) for i in range(3)])
+    bot = make_chatbot(context_token_budget=1536, context_min_tokens=640)
+    doc = tmp_path / "doc.txt"
+    doc.write_text(make_text(3000, seed=9))
+    assert bot.add_document(str(doc))[0]
+    bot.memory.summarize = lambda prompt: "The user asked about the report."
+
+    prompts = []
+    chat = rag_engine.ollama.chat
+    def record_prompt(model, messages, **kwargs):
+        if messages[0]["role"] == "system":
+            prompts.append(messages)
+        return chat(model=model, messages=messages, **kwargs)
+    monkeypatch.setattr(rag_engine.ollama, "chat", record_prompt)
+
+    for i in range(4):
+        result = bot.chat(make_text(8, seed=100 + i), session_id="s1", debug=True)
+        assert result["sources"] == ["doc.txt"]
+        assert result["debug"]["context"]["tokens"] >= 600
+        assert estimate_prompt_tokens(prompts[-1]) <= 1536
+    # Older exchanges were left out of the prompt to make room
+    assert len(prompts[-1]) < 2 + 2 * 3
+
+
+def test_expire_forgets_idle_sessions_only(tmp_path):
+    memory = ConversationMemory(summarizer([]), tmp_path)
+    memory.record("old", "question", "answer")
+    memory.record("recent", "question", "answer")
+    month_ago = time.time() - 31 * 86400
+    os.utime(tmp_path / "old.json", (month_ago, month_ago))
+
+    assert memory.expire(30 * 86400) == 1
+    assert memory.history("old") == ("", [])
+    assert memory.history("recent")[1]
+    assert memory.expire(0) == 0
+
+
+def test_deleting_a_chat_deletes_its_memory(api):
+    import main
+
+    main.chatbot.memory.record("chat_1", "question", "answer")
+
+    # The client never saved this chat to the server log, so it is a 404, but memory still goes
+    assert api.delete("/chats/delete/chat_1").status_code == 404
+    assert main.chatbot.memory.history("chat_1") == ("", [])
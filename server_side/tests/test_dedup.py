@@ -0,0 +1,59 @@
+"""Near-duplicate chunks: SimHash fingerprints, the banded index and ingest"""
+
+from dedup import SimHashIndex, simhash
+from fixtures import make_text
+
+
+def _distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def test_simhash_is_close_for_small_edits_only():
+    text = make_text(300)
+    edited = text.replace(text.split()[150], "completely", 1)
+
+    assert _distance(simhash(text), simhash(edited)) <= 3
+    assert _distance(simhash(text), simhash(make_text(300, seed=1))) > 10
+    assert simhash("too short to fingerprint") is None
+
+
+def test_index_finds_fingerprints_within_the_distance():
+    index = SimHashIndex(max_distance=3)
+    base = simhash(make_text(200))
+    index.add(base, "a.txt")
+
+    assert index.find(base ^ 0b101) == base
+    assert index.find(base ^ 0b1111) is None
+    assert index.find(base, ignore_source="a.txt") is None
+
+    restored = SimHashIndex.from_dict(index.to_dict(), 3)
+    restored.remove_source("a.txt")
+    assert index.find(base) == base and restored.find(base) is None and len(restored) == 0
+
+
+def test_ingest_skips_near_duplicate_chunks(make_chatbot, tmp_path):
+    bot = make_chatbot(near_dup_distance=3)
+    text = make_text(400, seed=5)
+    (tmp_path / "original.txt").write_text(text)
+    (tmp_path / "copy.txt").write_text(text.replace(text.split()[10], "changed", 1))
+
+    first = bot.ingest_document(str(tmp_path / "original.txt"))
+    second = bot.ingest_document(str(tmp_path / "copy.txt"))
+
+    assert first["chunks_created"] == 1
+    assert (second["chunks_created"], second["near_duplicates"]) == (0, 1)
+    assert second["bytes_saved"] > 0
+
+
+def test_a_changed_file_is_not_deduplicated_against_its_old_version(make_chatbot, tmp_path):
+    bot = make_chatbot(near_dup_distance=3)
+    path = tmp_path / "notes.txt"
+    text = make_text(400, seed=6)
+    path.write_text(text)
+    bot.ingest_document(str(path))
+    path.write_text(text.replace(text.split()[10], "changed", 1))
+
+    report = bot.ingest_document(str(path))
+
+    assert report["replaced"] and report["chunks_created"] == 1
+    assert "changed" in bot.vector_store.documents[0]
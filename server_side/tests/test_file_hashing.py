@@ -0,0 +1,47 @@
+"""File-level content hashes: unchanged files skip ingest, edits reuse embeddings"""
+
+from fixtures import make_text
+
+
+def _embedding_calls(fake):
+    return fake.request_counts.get("/api/embeddings", 0)
+
+
+def test_unchanged_file_is_not_embedded_again(make_chatbot, fake_ollama, tmp_path):
+    bot = make_chatbot()
+    path = tmp_path / "notes.txt"
+    path.write_text(make_text(1200))
+    first = bot.ingest_document(str(path))
+    calls = _embedding_calls(fake_ollama)
+
+    again = bot.ingest_document(str(path))
+
+    assert again["unchanged"] and again["success"]
+    assert again["chunks_created"] == first["chunks_created"] == bot.vector_store.files[str(path)]["chunks"]
+    assert _embedding_calls(fake_ollama) == calls
+
+
+def test_edited_file_reuses_embeddings_of_unchanged_chunks(make_chatbot, fake_ollama, tmp_path):
+    bot = make_chatbot(near_dup_distance=None)
+    path = tmp_path / "notes.txt"
+    words = make_text(1500).split()
+    path.write_text(" ".join(words))
+    first = bot.ingest_document(str(path))
+    path.write_text(" ".join(words + ["appended", "sentence", "at", "the", "end"]))
+    calls = _embedding_calls(fake_ollama)
+
+    report = bot.ingest_document(str(path))
+
+    assert report["replaced"] and not report["unchanged"]
+    assert report["embeddings_reused"] == first["chunks_created"] - 1
+    assert _embedding_calls(fake_ollama) - calls == report["chunks_total"] - report["embeddings_reused"]
+    assert bot.vector_store.files[str(path)]["chunks"] == len(bot.vector_store.ids)
+
+
+def test_missing_file_fails_without_touching_the_store(make_chatbot, tmp_path):
+    bot = make_chatbot()
+
+    report = bot.ingest_document(str(tmp_path / "missing.txt"))
+
+    assert not report["success"]
+    assert not bot.vector_store.ids and not bot.vector_store.files
@@ -0,0 +1,73 @@
+"""Upload and archive endpoints: streamed to .part files, renamed when complete"""
+
+import io
+import zipfile
+from pathlib import Path
+
+from config import settings
+from fixtures import make_text
+
+
+def _leftovers():
+    return [p.name for p in settings.STORAGE_DIR.rglob("*.part")]
+
+
+def test_upload_then_unchanged_reupload(api):
+    content = make_text(300).encode("utf-8")
+    files = {"file": ("notes.txt", content, "text/plain")}
+
+    first = api.post("/upload?collection=uploads", files=files)
+    second = api.post("/upload?collection=uploads", files=files)
+
+    assert first.status_code == 200 and first.json()["chunks_created"] > 0
+    assert second.json()["unchanged"] is True
+    assert not _leftovers()
+
+
+def test_oversized_upload_is_rejected_without_leftovers(api, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_FILE_SIZE_MB", 0)
+
+    response = api.post("/upload?collection=uploads", files={"file": ("big.txt", b"x" * 2048, "text/plain")})
+
+    assert response.status_code == 413
+    assert not list(settings.STORAGE_DIR.rglob("big.txt"))
+    assert not _leftovers()
+
+
+def test_archive_round_trip_through_the_api(api, monkeypatch):
+    import main
+
+    opened = []
+    real_open = main.aiofiles.open
+
+    def recording_open(path, *args, **kwargs):
+        opened.append(Path(path))
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr(main.aiofiles, "open", recording_open)
+    api.post("/upload?collection=source", files={"file": ("guide.txt", make_text(400, seed=3).encode(), "text/plain")})
+    exported = api.get("/kb/export?collection=source")
+    assert exported.status_code == 200
+
+    response = api.post("/kb/import?collection=restored", files={"file": ("kb.zip", exported.content, "application/zip")})
+
+    assert response.status_code == 200
+    # Streamed without blocking the event loop, beside the final name
+    assert any(path.name.endswith(".zip.part") for path in opened)
+    report = response.json()["report"]
+    assert report["chunks_imported"] == report["chunks_total"] > 0
+    assert api.get("/kb/stats?collection=restored").json()["stats"]["total_chunks"] == report["chunks_total"]
+    assert not list((settings.STORAGE_DIR / "archives").iterdir())
+
+
+def test_import_rejects_a_broken_archive_and_cleans_up(api):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("chunks.jsonl", "{}")
+
+    not_zip = api.post("/kb/import?collection=broken", files={"file": ("kb.zip", b"not a zip", "application/zip")})
+    no_manifest = api.post("/kb/import?collection=broken", files={"file": ("kb.zip", buffer.getvalue(), "application/zip")})
+
+    assert not_zip.status_code == 400
+    assert no_manifest.status_code == 400 and "manifest" in no_manifest.json()["detail"]
+    assert not list((settings.STORAGE_DIR / "archives").iterdir())
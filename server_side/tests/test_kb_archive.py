@@ -0,0 +1,94 @@
+"""Knowledge base archives: round trip, embedding model labels, corrupt archives"""
+
+import sys
+import zipfile
+
+import numpy as np
+import pytest
+
+import kb_archive
+from conftest import add_rows, random_embeddings
+from kb_archive import export_archive, import_archive, verify_archive
+from rag_engine import SimpleVectorStore
+
+
+def _store(tmp_path, name, embedding_model=None, rows=0):
+    store = SimpleVectorStore(embedding_model=embedding_model, text_dir=tmp_path / name)
+    if rows:
+        add_rows(store, random_embeddings(rows))
+        store.record_file("doc.txt", {"sha256": "abc", "chunks": rows})
+    return store
+
+
+def test_round_trip_into_an_empty_store_adopts_the_model(tmp_path):
+    source = _store(tmp_path, "a", "nomic-embed-text", rows=5)
+    export_archive(source, tmp_path / "kb.zip", source.embedding_model)
+    target = _store(tmp_path, "b")
+
+    report = import_archive(target, tmp_path / "kb.zip")
+
+    assert report["chunks_imported"] == 5
+    assert report["sources_imported"] == 1
+    assert target.embedding_model == "nomic-embed-text"
+    assert list(target.documents) == list(source.documents)
+    assert np.array_equal(target.embeddings, source.embeddings)
+    assert target.files["doc.txt"]["chunks"] == 5
+
+
+def test_import_refuses_another_model(tmp_path):
+    source = _store(tmp_path, "a", "nomic-embed-text", rows=3)
+    export_archive(source, tmp_path / "kb.zip", source.embedding_model)
+
+    with pytest.raises(ValueError, match="nomic-embed-text"):
+        import_archive(_store(tmp_path, "b"), tmp_path / "kb.zip", "mxbai-embed-large")
+
+
+def test_corrupt_archive_fails_its_checksum(tmp_path):
+    source = _store(tmp_path, "a", "nomic-embed-text", rows=3)
+    export_archive(source, tmp_path / "kb.zip", source.embedding_model)
+    with zipfile.ZipFile(tmp_path / "kb.zip") as archive:
+        members = {name: archive.read(name) for name in archive.namelist()}
+    members["chunks.jsonl"] = members["chunks.jsonl"].replace(b"chunk 0", b"chunk X")
+    with zipfile.ZipFile(tmp_path / "bad.zip", "w") as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+
+    with pytest.raises(ValueError, match="Checksum mismatch for chunks.jsonl"):
+        verify_archive(tmp_path / "bad.zip")
+
+
+def _run_cli(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["kb_archive.py", *map(str, args)])
+    kb_archive.main()
+
+
+def test_cli_export_labels_the_archive_with_the_store_model(tmp_path, monkeypatch):
+    _store(tmp_path, "kb", "mxbai-embed-large", rows=2).save(str(tmp_path / "kb" / "kb.pkl"))
+
+    _run_cli(monkeypatch, "export", tmp_path / "kb" / "kb.pkl", tmp_path / "kb.zip")
+
+    assert verify_archive(tmp_path / "kb.zip")["embedding_model"] == "mxbai-embed-large"
+
+
+def test_cli_export_rejects_a_conflicting_or_missing_model(tmp_path, monkeypatch):
+    _store(tmp_path, "kb", "mxbai-embed-large", rows=2).save(str(tmp_path / "kb" / "kb.pkl"))
+    _store(tmp_path, "old", rows=2).save(str(tmp_path / "old" / "kb.pkl"))
+
+    with pytest.raises(SystemExit):
+        _run_cli(monkeypatch, "export", tmp_path / "kb" / "kb.pkl", tmp_path / "kb.zip",
+                 "--embedding-model", "nomic-embed-text")
+    with pytest.raises(SystemExit):
+        _run_cli(monkeypatch, "export", tmp_path / "old" / "kb.pkl", tmp_path / "old.zip")
+    assert not (tmp_path / "kb.zip").exists() and not (tmp_path / "old.zip").exists()
+
+
+def test_cli_import_into_a_new_file_records_the_archive_model(tmp_path, monkeypatch):
+    source = _store(tmp_path, "a", "mxbai-embed-large", rows=4)
+    export_archive(source, tmp_path / "kb.zip", source.embedding_model)
+
+    _run_cli(monkeypatch, "import", tmp_path / "kb.zip", tmp_path / "new" / "kb.pkl")
+
+    store = SimpleVectorStore(text_dir=tmp_path / "new")
+    store.load(str(tmp_path / "new" / "kb.pkl"))
+    assert store.embedding_model == "mxbai-embed-large"
+    assert len(store.ids) == 4
@@ -0,0 +1,44 @@
+"""Background knowledge base loading and readiness on /health"""
+
+import pytest
+
+from conftest import add_rows, random_embeddings
+
+
+def test_background_load_reports_progress_and_becomes_ready(make_chatbot, tmp_path):
+    writer = make_chatbot()
+    add_rows(writer.vector_store, random_embeddings(50))
+    writer.save_knowledge_base(str(tmp_path / "knowledge_base.pkl"))
+    bot = make_chatbot()
+    done = []
+
+    thread = bot.start_background_load(str(tmp_path / "knowledge_base.pkl"), on_done=lambda: done.append(True))
+    assert bot.wait_until_ready(10)
+    thread.join(5)
+
+    assert (bot.kb_status, bot.kb_progress, done) == ("ready", 1.0, [True])
+    assert len(bot.vector_store.ids) == 50
+
+
+def test_corrupt_knowledge_base_ends_in_error_and_is_never_saved_over(make_chatbot, tmp_path):
+    kb_path = tmp_path / "knowledge_base.pkl"
+    kb_path.write_bytes(b"not a pickle")
+    bot = make_chatbot()
+
+    bot.start_background_load(str(kb_path))
+
+    assert not bot.wait_until_ready(10)
+    assert bot.kb_status == "error" and bot.kb_error
+    with pytest.raises(RuntimeError, match="not ready"):
+        bot.save_knowledge_base(str(kb_path))
+    assert kb_path.read_bytes() == b"not a pickle"
+
+
+def test_health_reports_readiness_with_an_etag(api):
+    first = api.get("/health")
+
+    assert first.status_code == 200
+    assert first.json()["kb_status"] == "ready"
+    assert first.json()["kb_progress"] == 1.0
+    cached = api.get("/health", headers={"If-None-Match": first.headers["etag"]})
+    assert cached.status_code == 304
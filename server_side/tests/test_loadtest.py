@@ -0,0 +1,73 @@
+"""Load test harness: trace parsing, replay and the latency report"""
+
+import asyncio
+import json
+
+import pytest
+
+from loadtest import LoadRunner, endpoint_key, load_trace, synthesize_trace
+
+
+class _Response:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+
+
+class _FakeClient:
+    """Async client answering by path; /boom raises like a dropped connection"""
+
+    def __init__(self):
+        self.requests = []
+
+    async def request(self, method, path, **kwargs):
+        self.requests.append((method, path, kwargs))
+        if path == "/boom":
+            raise ConnectionError("reset")
+        return _Response(404 if path == "/missing" else 200)
+
+
+def _write(path, lines):
+    path.write_text("\n".join(json.dumps(line) for line in lines) + "\n", encoding="utf-8")
+    return path
+
+
+def test_backlog_lines_become_chat_calls(tmp_path):
+    trace = _write(tmp_path / "trace.jsonl", [
+        {"request_id": "r1", "title": "Title only"},
+        {"method": "POST", "path": "/upload", "file": {"path": "a.txt"}},
+        {"path": "/health"},
+    ])
+
+    entries = load_trace(trace)
+
+    assert entries[0] == {
+        "request_id": "r1", "method": "POST", "path": "/chat",
+        "json": {"message": "Title only", "use_rag": True}, "offset": None
+    }
+    assert entries[1]["file"]["path"] == str((tmp_path / "a.txt").resolve())
+    assert (entries[2]["request_id"], entries[2]["method"]) == ("3", "GET")
+    assert endpoint_key("GET", "/chats/load/abc?x=1") == "GET /chats/load/{id}"
+
+
+def test_lines_without_path_or_message_are_rejected(tmp_path):
+    trace = _write(tmp_path / "trace.jsonl", [{"request_id": "r1", "body": "  "}])
+
+    with pytest.raises(ValueError, match="line 1"):
+        load_trace(trace)
+
+
+def test_replay_reports_latency_and_errors_per_endpoint(tmp_path):
+    synthesize_trace(tmp_path / "trace.jsonl", 40, seed=1)
+    entries = load_trace(tmp_path / "trace.jsonl")
+    entries += [{"method": "GET", "path": "/missing"}, {"method": "GET", "path": "/boom"}]
+    client = _FakeClient()
+    runner = LoadRunner(client, concurrency=4, rate=0, use_offsets=False, seed=0)
+
+    report = runner.report(asyncio.run(runner.run(entries)))
+
+    assert report["requests"] == len(client.requests) == 42
+    assert report["errors"] == 2
+    assert report["endpoints"]["GET /missing"]["status_codes"] == {"404": 1}
+    assert report["endpoints"]["GET /boom"]["status_codes"] == {"0": 1}
+    uploads = [kwargs for _, path, kwargs in client.requests if path == "/upload"]
+    assert all(kwargs["files"]["file"][1] for kwargs in uploads)
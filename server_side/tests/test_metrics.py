@@ -0,0 +1,39 @@
+"""Metrics registry, Prometheus rendering and the /metrics endpoint"""
+
+from metrics import MetricsRegistry
+
+
+def test_histogram_renders_cumulative_buckets_per_label():
+    registry = MetricsRegistry()
+    latency = registry.histogram("test_seconds", "Test latency", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        latency.labels("search").observe(value)
+
+    lines = registry.render().splitlines()
+
+    assert lines[:2] == ["# HELP test_seconds Test latency", "# TYPE test_seconds histogram"]
+    assert 'test_seconds_bucket{stage="search",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="search",le="1"} 2' in lines
+    assert 'test_seconds_bucket{stage="search",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{stage="search"} 3' in lines
+    assert registry.histogram("test_seconds", "again") is latency
+
+
+def test_failing_gauge_callback_does_not_break_the_scrape():
+    registry = MetricsRegistry()
+    registry.gauge("broken", "Raises", fn=lambda: 1 / 0)
+    registry.counter("requests_total", "Requests", ["path"]).inc(2, 'a"b')
+
+    text = registry.render()
+
+    assert "broken" not in text
+    assert 'requests_total{path="a\\"b"} 2' in text
+
+
+def test_requests_are_timed_by_route_template(api):
+    api.get("/chats/load/missing-session")
+
+    text = api.get("/metrics").text
+
+    assert 'lola_http_request_duration_seconds_count{method="GET",route="/chats/load/{session_id}",status="404"}' in text
+    assert "lola_http_requests_in_flight 1" in text
@@ -0,0 +1,65 @@
+"""Reduced-dimension first pass: PCA and truncated shortlists re-scored at full dimension"""
+
+import numpy as np
+import pytest
+
+import reduced_index
+from conftest import add_rows
+from rag_engine import SimpleVectorStore
+from reduced_index import ReducedIndex
+
+
+def _embeddings(rows, dim=64, rank=8, seed=0):
+    """Embeddings whose signal sits in the leading components, as in Matryoshka-trained models"""
+    rng = np.random.default_rng(seed)
+    embeddings = 0.05 * rng.standard_normal((rows, dim))
+    embeddings[:, :rank] += rng.standard_normal((rows, rank))
+    return embeddings.astype(np.float32)
+
+
+def _stores(tmp_path, method, rows=600):
+    embeddings = _embeddings(rows)
+    exact = SimpleVectorStore(text_dir=tmp_path / "exact")
+    reduced = SimpleVectorStore(text_dir=tmp_path / "reduced", reduced_dim=16, reduced_method=method, rescore_candidates=40)
+    for store in (exact, reduced):
+        add_rows(store, embeddings[:rows // 2])
+        add_rows(store, embeddings[rows // 2:], start=rows // 2)
+    return exact, reduced, embeddings
+
+
+@pytest.mark.parametrize("method", ["pca", "truncate"])
+def test_shortlists_find_the_same_neighbours(tmp_path, monkeypatch, method):
+    monkeypatch.setattr(reduced_index, "PCA_MIN_ROWS", 200)
+    exact, reduced, embeddings = _stores(tmp_path, method)
+    queries = embeddings[::50] + 0.01
+
+    assert reduced._use_reduced(5) and reduced.reduced.size == len(embeddings)
+    for query in queries:
+        assert reduced.query(query, 5)["ids"] == exact.query(query, 5)["ids"]
+
+    reduced.delete_by_source("doc.txt")
+    assert reduced.reduced.size == 0 and reduced.query(queries[0], 5)["ids"] == [[]]
+
+
+def test_projection_is_saved_and_reused(tmp_path, monkeypatch):
+    monkeypatch.setattr(reduced_index, "PCA_MIN_ROWS", 200)
+    _, store, embeddings = _stores(tmp_path, "pca")
+    store.save(str(tmp_path / "kb.pkl"))
+
+    loaded = SimpleVectorStore(text_dir=tmp_path / "loaded", reduced_dim=16, reduced_method="pca")
+    loaded.load(str(tmp_path / "kb.pkl"))
+
+    assert np.array_equal(loaded.reduced.components, store.reduced.components)
+    assert loaded.reduced.size == len(embeddings)
+    # Saved with other settings: dropped and refit instead
+    assert ReducedIndex.from_dict(store.reduced.to_dict(), "pca", 8).components is None
+
+
+def test_small_stores_and_bad_settings(tmp_path):
+    store = SimpleVectorStore(text_dir=tmp_path, reduced_dim=16, reduced_method="pca")
+    add_rows(store, _embeddings(100))
+
+    # Too few rows to fit PCA: every row is scored in full
+    assert store.reduced.size == 0 and not store._use_reduced(5)
+    with pytest.raises(ValueError):
+        ReducedIndex("random", 16)
@@ -0,0 +1,52 @@
+"""Background re-embedding after the embedding model changes"""
+
+import numpy as np
+import ollama
+
+from collection_manager import DEFAULT_COLLECTION
+from fixtures import make_text
+from reembed import EmbeddingMigration
+
+
+def _bot_on_old_model(make_chatbot, tmp_path):
+    bot = make_chatbot(near_dup_distance=None)
+    path = tmp_path / "notes.txt"
+    path.write_text(make_text(2000))
+    assert bot.ingest_document(str(path))["success"]
+    store = bot.collections.get(DEFAULT_COLLECTION)
+    store.embedding_model = "old-model"
+    return bot, store
+
+
+def _run(migration, model):
+    assert migration.start(model)
+    migration._thread.join(timeout=30)
+    return migration.status()
+
+
+def test_migration_swaps_in_vectors_from_the_new_model(make_chatbot, tmp_path):
+    bot, old = _bot_on_old_model(make_chatbot, tmp_path)
+    swapped = []
+    migration = EmbeddingMigration(bot, chunks_per_second=0, batch_size=2, on_swap=swapped.append)
+    assert migration.needed("nomic-embed-text")
+
+    status = _run(migration, "nomic-embed-text")
+
+    store = bot.collections.get(DEFAULT_COLLECTION)
+    assert status["state"] == "completed" and swapped == [DEFAULT_COLLECTION]
+    assert status["collections"][DEFAULT_COLLECTION]["embedded"] == len(old.ids)
+    assert store is not old and store.embedding_model == "nomic-embed-text"
+    assert list(store.ids) == list(old.ids)
+    expected = ollama.embeddings(model="nomic-embed-text", prompt=store.documents[0])["embedding"]
+    assert np.allclose(store.embeddings[0], expected, atol=1e-5)
+    assert not migration.needed("nomic-embed-text") and migration.remaining() == 0
+
+
+def test_failed_migration_keeps_the_old_vectors(make_chatbot, tmp_path):
+    bot, old = _bot_on_old_model(make_chatbot, tmp_path)
+    migration = EmbeddingMigration(bot, chunks_per_second=0)
+
+    status = _run(migration, "missing-model")
+
+    assert status["state"] == "failed" and status["error"]
+    assert bot.collections.get(DEFAULT_COLLECTION) is old and old.embedding_model == "old-model"
@@ -0,0 +1,79 @@
+"""Shared index: published generations, followers, the writer lock and the spool"""
+
+import numpy as np
+import pytest
+
+from conftest import add_rows, random_embeddings
+from rag_engine import SimpleVectorStore
+from shared_index import GenerationFollower, IndexGenerations, WriterLock, WriteSpool
+
+
+def _store(tmp_path, rows=40, seed=0):
+    store = SimpleVectorStore(text_dir=tmp_path)
+    add_rows(store, random_embeddings(rows, seed=seed))
+    return store
+
+
+def test_readers_map_the_published_generation_read_only(tmp_path):
+    generations = IndexGenerations(tmp_path / "shared")
+    writer = _store(tmp_path)
+    generations.publish(writer)
+
+    reader = generations.load(lambda: SimpleVectorStore(text_dir=tmp_path))
+    query = random_embeddings(1, seed=9)[0]
+
+    assert isinstance(reader._matrix, np.memmap) and not reader._matrix.flags.writeable
+    assert reader.query(query, 3)["ids"] == writer.query(query, 3)["ids"]
+    assert list(reader.documents) == list(writer.documents)
+    # Writes copy the mapped matrix into private memory
+    add_rows(reader, random_embeddings(1, seed=5), source="new.txt")
+    assert len(reader.ids) == 41 and len(generations.load(SimpleVectorStore).ids) == 40
+
+
+def test_follower_swaps_in_new_generations_and_old_ones_are_pruned(tmp_path):
+    generations = IndexGenerations(tmp_path / "shared", keep=2)
+    swapped = []
+    follower = GenerationFollower(generations, SimpleVectorStore, lambda name, store: swapped.append((name, len(store.ids))))
+
+    assert not follower.poll()
+    for rows in (10, 20, 30):
+        generations.publish(_store(tmp_path, rows))
+        assert follower.poll()
+    assert not follower.poll()
+
+    assert swapped == [("00000001", 10), ("00000002", 20), ("00000003", 30)]
+    assert sorted(p.name for p in (tmp_path / "shared").iterdir() if p.is_dir()) == ["00000002", "00000003"]
+
+
+def test_loading_before_anything_is_published_fails(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        IndexGenerations(tmp_path / "shared").load(SimpleVectorStore)
+
+
+def test_only_one_writer_holds_the_lock(tmp_path):
+    first, second = WriterLock(tmp_path / "writer.lock"), WriterLock(tmp_path / "writer.lock")
+
+    assert first.acquire()
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+    second.release()
+
+
+def test_spool_applies_jobs_in_order_and_drops_failing_ones(tmp_path):
+    spool = WriteSpool(tmp_path / "spool")
+    applied = []
+
+    def handler(op, args):
+        if op == "broken":
+            raise ValueError("bad job")
+        applied.append((op, args["path"]))
+
+    spool.submit("ingest", path="a.txt")
+    spool.submit("broken", path="b.txt")
+    spool.submit("delete", path="c.txt")
+
+    assert spool.pending() == 3
+    assert spool.drain(handler) == 2
+    assert applied == [("ingest", "a.txt"), ("delete", "c.txt")]
+    assert spool.pending() == 0
@@ -0,0 +1,73 @@
+"""Row-chunked CSV and Excel reading: batches, repeated headers, one-pass stats"""
+
+import re
+
+import pandas as pd
+import pytest
+
+from fixtures import write_csv, write_xlsx
+from rag_engine import DocumentProcessor
+
+
+def _row_ranges(chunks):
+    return [tuple(map(int, re.search(r"Rows (\d+)-(\d+)", chunk).groups())) for chunk in chunks[:-1]]
+
+
+def test_csv_chunks_do_not_depend_on_the_read_batch_size(tmp_path, monkeypatch):
+    path = write_csv(tmp_path / "sales.csv", 400)
+    whole = list(DocumentProcessor.read_csv(str(path)))
+    monkeypatch.setattr(DocumentProcessor, "TABLE_READ_ROWS", 7)
+
+    batched = list(DocumentProcessor.read_csv(str(path)))
+
+    assert batched == whole
+    ranges = _row_ranges(whole)
+    assert ranges[0][0] == 1 and ranges[-1][1] == 400
+    assert all(b[0] == a[1] + 1 for a, b in zip(ranges, ranges[1:]))
+    assert all(chunk.splitlines()[1].startswith("Columns: ") for chunk in whole[:-1])
+
+
+def test_csv_summary_matches_pandas(tmp_path, monkeypatch):
+    path = write_csv(tmp_path / "sales.csv", 250, seed=3)
+    monkeypatch.setattr(DocumentProcessor, "TABLE_READ_ROWS", 16)
+    frame = pd.read_csv(path)
+
+    summary = list(DocumentProcessor.read_csv(str(path)))[-1]
+
+    assert "Rows: 250" in summary
+    price = next(line for line in summary.splitlines() if line.startswith("price:"))
+    assert f"mean={frame['price'].mean():.6g}" in price
+    assert f"std={frame['price'].std():.6g}" in price
+    assert f"max={frame['price'].max():.6g}" in price
+
+
+def test_excel_sheets_stream_in_row_batches(tmp_path, monkeypatch):
+    path = write_xlsx(tmp_path / "sales.xlsx", 120)
+    monkeypatch.setattr(DocumentProcessor, "TABLE_READ_ROWS", 10)
+
+    chunks = list(DocumentProcessor.read_excel(str(path)))
+
+    assert chunks[0].startswith("Excel File: sales.xlsx | Sheet: Sheet1 | Rows 1-")
+    assert "Rows: 120" in chunks[-1]
+    assert _row_ranges(chunks)[-1][1] == 120
+
+
+def test_empty_and_unreadable_tables(tmp_path):
+    (tmp_path / "empty.csv").write_text("")
+    (tmp_path / "broken.xlsx").write_bytes(b"not a workbook")
+
+    assert list(DocumentProcessor.read_csv(str(tmp_path / "empty.csv"))) == []
+    with pytest.raises(Exception):
+        list(DocumentProcessor.read_excel(str(tmp_path / "broken.xlsx")))
+
+
+def test_csv_ingest_keeps_rows_on_their_own_lines(make_chatbot, tmp_path):
+    bot = make_chatbot()
+    path = write_csv(tmp_path / "sales.csv", 60)
+
+    assert bot.add_document(str(path))[0]
+
+    first, last_row = bot.vector_store.documents[0], _row_ranges(list(bot.vector_store.documents))[0][1]
+    assert first.splitlines()[0] == f"CSV File: sales.csv | Rows 1-{last_row}"
+    # Title, header, then one line per row
+    assert len(first.splitlines()) == 2 + last_row
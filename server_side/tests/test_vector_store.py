@@ -0,0 +1,97 @@
+"""SimpleVectorStore search: sharding, batching and the shared search pool"""
+
+import threading
+
+import numpy as np
+import pytest
+
+import rag_engine
+from conftest import add_rows, random_embeddings
+from rag_engine import SimpleVectorStore
+
+
+def exact_top(embeddings: np.ndarray, query: np.ndarray, k: int):
+    scores = embeddings @ query / (np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query))
+    return [f"doc.txt_{i}" for i in np.argsort(-scores)[:k]]
+
+
+def test_sharded_query_matches_exact_search():
+    embeddings = random_embeddings(1000)
+    store = SimpleVectorStore(shard_size=64, max_workers=4)
+    add_rows(store, embeddings)
+    query = random_embeddings(1, seed=1)[0]
+
+    result = store.query(query, 5)
+
+    assert result["ids"][0] == exact_top(embeddings, query, 5)
+    assert result["documents"][0][0] == f"chunk {result['ids'][0][0].split('_')[-1]} of doc.txt"
+    assert result["distances"][0] == sorted(result["distances"][0])
+
+
+def test_query_batch_matches_single_queries():
+    store = SimpleVectorStore(shard_size=100, max_workers=2)
+    add_rows(store, random_embeddings(500))
+    queries = random_embeddings(4, seed=2)
+
+    batch = store.query_batch(queries, 3)
+
+    assert [r["ids"] for r in batch] == [store.query(q, 3)["ids"] for q in queries]
+
+
+def test_empty_store_returns_no_hits():
+    store = SimpleVectorStore()
+
+    assert store.query([0.1] * 32, 3)["ids"] == [[]]
+    assert store.query_batch([[0.1] * 32], 3)[0]["ids"] == [[]]
+
+
+def test_stores_share_one_search_pool():
+    a = SimpleVectorStore(shard_size=10, max_workers=3)
+    b = SimpleVectorStore(shard_size=10, max_workers=3)
+    add_rows(a, random_embeddings(100))
+    add_rows(b, random_embeddings(100, seed=1))
+    a.query(random_embeddings(1)[0], 3)
+    b.query(random_embeddings(1)[0], 3)
+
+    assert list(rag_engine._SEARCH_POOLS).count(3) == 1
+    assert a.search_queue_depth() == 0
+
+
+def test_search_queue_depth_counts_unfinished_shard_tasks():
+    store = SimpleVectorStore(shard_size=20, max_workers=2)
+    add_rows(store, random_embeddings(100))
+    release = threading.Event()
+    score_shard = store._score_shard
+
+    def blocked(*args):
+        assert release.wait(5)
+        return score_shard(*args)
+
+    store._score_shard = blocked
+    query = threading.Thread(target=store.query, args=(random_embeddings(1)[0], 3))
+    query.start()
+    try:
+        # Five shards: two running, three waiting for a thread
+        for _ in range(100):
+            if store.search_queue_depth() == 5:
+                break
+            release.wait(0.01)
+        assert store.search_queue_depth() == 5
+    finally:
+        release.set()
+        query.join(5)
+    assert store.search_queue_depth() == 0
+
+
+def test_search_queue_depth_is_exported(api):
+    from metrics import metrics
+
+    assert 'lola_queue_depth{queue="vector_search"} 0' in metrics.render()
+
+
+def test_query_with_wrong_dimension_fails():
+    store = SimpleVectorStore(shard_size=10, max_workers=2)
+    add_rows(store, random_embeddings(100))
+
+    with pytest.raises(ValueError):
+        store.query([0.1] * 8, 3)
@@ -0,0 +1,65 @@
+"""Image captions at ingest, and the vision payload and answer caches"""
+
+import itertools
+
+from fixtures import write_png
+from vision import VisionAnswerCache
+
+
+def test_captions_are_separate_chunks_per_image_path(make_chatbot, fake_ollama, tmp_path):
+    fake_ollama.responses = itertools.cycle(["A cat on a sofa."])
+    bot = make_chatbot(image_captioning=True)
+    images = [
+        write_png(tmp_path / "a.png", 32, 32),
+        write_png(tmp_path / "a.jpg", 32, 32, seed=1),
+        write_png((tmp_path / "other").mkdir() or tmp_path / "other" / "a.png", 32, 32, seed=2),
+    ]
+    for image in images:
+        assert bot.add_document(str(image))[0]
+    bot.captioner.join()
+
+    store = bot.vector_store
+    captions = [i for i, meta in enumerate(store.metadatas) if meta.get("caption")]
+    assert len(captions) == 3
+    assert len({store.ids[i] for i in captions}) == 3
+    assert all(store.metadatas[i].get("chunk") is None for i in captions)
+    assert all("Caption: A cat on a sofa." in store.documents[i] for i in captions)
+    # Listings count the caption with its image (the metadata chunk of a
+    # near-identical image may be skipped as a near duplicate)
+    for image in images:
+        rows = sum(meta.get("source") == str(image) for meta in store.metadatas)
+        assert store.files[str(image)]["chunks"] == rows
+    assert {entry["chunks"] for entry in store.catalog() if entry["filename"] == "a.jpg"} == {store.files[str(images[1])]["chunks"]}
+
+
+def test_caption_for_a_deleted_image_is_skipped(make_chatbot, fake_ollama, tmp_path):
+    bot = make_chatbot()
+    image = write_png(tmp_path / "gone.png", 16, 16)
+
+    bot._add_caption(str(image), "A caption", {}, "default")
+
+    assert len(bot.vector_store.ids) == 0
+
+
+def test_vision_answers_are_cached_per_image_and_prompt(make_chatbot, fake_ollama, tmp_path):
+    bot = make_chatbot()
+    image = write_png(tmp_path / "chart.png", 64, 64)
+    before = fake_ollama.request_counts.get("/api/chat", 0)
+
+    first, cached_first = bot._vision_chat("ministral-3", "What is shown?", str(image))
+    second, cached_second = bot._vision_chat("ministral-3", "What is shown?", str(image))
+
+    assert (cached_first, cached_second) == (False, True)
+    assert first["message"] == second["message"]
+    assert fake_ollama.request_counts["/api/chat"] == before + 1
+
+
+def test_answer_cache_evicts_least_recently_used():
+    cache = VisionAnswerCache(2)
+    cache.put("a", {"answer": 1})
+    cache.put("b", {"answer": 2})
+    cache.get("a")
+    cache.put("c", {"answer": 3})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"answer": 1}
@@ -0,0 +1,81 @@
+"""Watched folders: incremental scans, deletions and state kept across restarts"""
+
+import os
+
+import pytest
+
+from fixtures import make_text
+from watcher import FolderWatcher
+
+
+def _watcher(bot, tmp_path):
+    return FolderWatcher(bot, tmp_path / "watch_state.json", [".txt", ".md"], interval=0)
+
+
+def _count_hashes(bot, monkeypatch):
+    hashed = []
+    file_hash = bot.processor.file_hash
+    monkeypatch.setattr(bot.processor, "file_hash", lambda path: hashed.append(path) or file_hash(path))
+    return hashed
+
+
+def test_scans_index_only_what_changed(make_chatbot, tmp_path, monkeypatch):
+    bot = make_chatbot()
+    docs = tmp_path / "docs"
+    (docs / "sub").mkdir(parents=True)
+    (docs / "a.txt").write_text(make_text(300, seed=1))
+    (docs / "sub" / "b.md").write_text(make_text(300, seed=2))
+    (docs / ".hidden.txt").write_text(make_text(300, seed=3))
+    (docs / "image.bin").write_bytes(b"\0" * 10)
+    watcher = _watcher(bot, tmp_path)
+    watcher.add_folder(str(docs))
+
+    first = watcher.scan()
+    hashed = _count_hashes(bot, monkeypatch)
+    second = watcher.scan()
+
+    assert sorted(os.path.basename(p) for p in first["added"]) == ["a.txt", "b.md"]
+    assert (second["unchanged"], second["added"], hashed) == (2, [], [])
+
+    (docs / "a.txt").write_text(make_text(300, seed=4))
+    (docs / "sub" / "b.md").unlink()
+    third = watcher.scan()
+
+    assert third["modified"] == [str(docs / "a.txt")]
+    assert third["deleted"] == [str(docs / "sub" / "b.md")]
+    assert third["chunks_removed"] > 0
+    assert set(bot.vector_store.files) == {str(docs / "a.txt")}
+
+
+def test_state_survives_a_restart(make_chatbot, tmp_path, monkeypatch):
+    bot = make_chatbot()
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "a.txt").write_text(make_text(300))
+    watcher = _watcher(bot, tmp_path)
+    watcher.add_folder(str(docs))
+    watcher.scan()
+
+    restarted = _watcher(bot, tmp_path)
+    hashed = _count_hashes(bot, monkeypatch)
+    report = restarted.scan()
+
+    assert report["unchanged"] == 1 and not hashed
+    assert restarted.list_folders()[0]["files"] == 1
+
+
+def test_removing_a_folder_purges_its_documents(make_chatbot, tmp_path):
+    bot = make_chatbot()
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "a.txt").write_text(make_text(300))
+    watcher = _watcher(bot, tmp_path)
+    watcher.add_folder(str(docs))
+    watcher.scan()
+
+    assert watcher.remove_folder(str(docs)) > 0
+    assert not bot.vector_store.ids and watcher.list_folders() == []
+    with pytest.raises(KeyError):
+        watcher.scan(str(docs))
+    with pytest.raises(NotADirectoryError):
+        watcher.add_folder(str(docs / "a.txt"))
@@ -0,0 +1,184 @@
+"""
+Vision Helpers
+Downscaled image cache, vision answer cache and background image captioning
+
+Images are hashed and shrunk to a bounded size once, then served from
+storage/image_cache for every later vision call. Pillow is optional: without
+it images are sent as-is, exactly as before.
+"""
+
+import base64
+import hashlib
+import io
+import logging
+import queue
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CAPTION_PROMPT = (
+    "Describe this image in detail for a search index. Mention the main subjects, "
+    "any visible text, numbers, charts or diagrams, and the overall setting."
+)
+
+
+# =========================
+# Downscaled Image Cache
+# =========================
+
+class ImageCache:
+    """Hash images and keep a bounded-size copy on disk for vision requests"""
+
+    def __init__(self, cache_dir: Path, max_side: int = 1024):
+        self.cache_dir = Path(cache_dir)
+        self.max_side = max_side
+        # (path, mtime_ns, size) -> content hash, so unchanged files are hashed once
+        self._hashes: Dict[Tuple[str, int, int], str] = {}
+        self._lock = threading.Lock()
+
+    def image_hash(self, path: str) -> str:
+        """SHA-256 of the file contents, memoized by path, mtime and size"""
+        stat = Path(path).stat()
+        key = (str(path), stat.st_mtime_ns, stat.st_size)
+        digest = self._hashes.get(key)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    sha.update(block)
+            digest = sha.hexdigest()
+            with self._lock:
+                self._hashes[key] = digest
+        return digest
+
+    def _downscale(self, path: str) -> Optional[Tuple[bytes, str]]:
+        """Shrink to max_side on the longest edge; None if Pillow can't handle it"""
+        try:
+            from PIL import Image
+        except ImportError:
+            return None
+
+        try:
+            with Image.open(path) as img:
+                img.thumbnail((self.max_side, self.max_side))
+                out = io.BytesIO()
+                if img.mode in ("RGBA", "LA", "P"):
+                    img.save(out, format="PNG", optimize=True)
+                    return out.getvalue(), ".png"
+                img.convert("RGB").save(out, format="JPEG", quality=85)
+                return out.getvalue(), ".jpg"
+        except Exception as e:
+            logger.warning(f"Could not downscale {path}, sending original: {e}")
+            return None
+
+    def load(self, path: str) -> Tuple[str, str]:
+        """Return (image hash, base64 payload) using the cached downscaled copy"""
+        digest = self.image_hash(path)
+
+        for ext in (".jpg", ".png"):
+            cached = self.cache_dir / f"{digest}_{self.max_side}{ext}"
+            if cached.exists():
+                return digest, base64.b64encode(cached.read_bytes()).decode("utf-8")
+
+        scaled = self._downscale(path)
+        if scaled is None:
+            return digest, base64.b64encode(Path(path).read_bytes()).decode("utf-8")
+
+        data, ext = scaled
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        cached = self.cache_dir / f"{digest}_{self.max_side}{ext}"
+        tmp = cached.with_suffix(ext + ".tmp")
+        tmp.write_bytes(data)
+        tmp.replace(cached)
+        logger.info(f"Cached downscaled image for {Path(path).name} ({len(data) / 1024:.0f} KB)")
+        return digest, base64.b64encode(data).decode("utf-8")
+
+
+# =========================
+# Vision Answer Cache
+# =========================
+
+class VisionAnswerCache:
+    """Bounded LRU of vision model responses keyed by (image hash, model, prompt)"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Dict]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Dict):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# =========================
+# Background Captioning
+# =========================
+
+class ImageCaptioner:
+    """Caption uploaded images on a worker thread and hand the text back for indexing"""
+
+    def __init__(
+        self,
+        caption: Callable[[str], str],
+        on_caption: Callable[[str, str, Dict, str], None]
+    ):
+        self._caption = caption
+        self._on_caption = on_caption
+        self._queue: "queue.Queue[Tuple[str, Dict, str]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, path: str, metadata: Optional[Dict] = None, collection: str = "default"):
+        """Queue an image; the worker thread is started on first use"""
+        self._queue.put((path, metadata or {}, collection))
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="image-captioner", daemon=True)
+                self._thread.start()
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def join(self):
+        """Block until every queued image has been captioned"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            path, metadata, collection = self._queue.get()
+            try:
+                caption = self._caption(path)
+                if caption and caption.strip():
+                    self._on_caption(path, caption.strip(), metadata, collection)
+            except Exception as e:
+                logger.error(f"Error captioning image {path}: {e}")
+            finally:
+                self._queue.task_done()
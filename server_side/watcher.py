@@ -0,0 +1,251 @@
+"""
+Watched Folders
+Incrementally index registered directories
+
+A scan stats every file and only hashes the ones whose mtime or size moved
+since the last scan; only files whose content hash changed are sent to
+ingestion. Files that disappeared are removed from the knowledge base.
+Scan state is persisted, so after a restart an unchanged folder costs one
+stat() per file.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class FolderWatcher:
+    """Keep the knowledge base in sync with a set of directories"""
+
+    def __init__(
+        self,
+        chatbot,
+        state_path: Path,
+        allowed_extensions: List[str],
+        interval: float = 300.0,
+        on_change: Optional[Callable[[], None]] = None
+    ):
+        self.chatbot = chatbot
+        self.state_path = Path(state_path)
+        self.allowed_extensions = {ext.lower() for ext in allowed_extensions}
+        self.interval = interval
+        self.on_change = on_change
+
+        self.folders: Dict[str, Dict] = {}
+        # path -> {"folder", "mtime_ns", "size", "sha256"}
+        self.files: Dict[str, Dict] = {}
+        self.scanning = False
+
+        self._scan_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._load_state()
+
+    # ===== State =====
+
+    def _load_state(self):
+        if not self.state_path.exists():
+            return
+        try:
+            state = json.loads(self.state_path.read_text(encoding="utf-8"))
+            self.folders = state.get("folders", {})
+            self.files = state.get("files", {})
+            logger.info(f"Loaded watch state: {len(self.folders)} folders, {len(self.files)} files")
+        except Exception as e:
+            logger.error(f"Error loading watch state {self.state_path}: {e}")
+
+    def _save_state(self):
+        with self._state_lock:
+            state = {"folders": self.folders, "files": self.files}
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.state_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(state), encoding="utf-8")
+            tmp.replace(self.state_path)
+
+    # ===== Folder registry =====
+
+    def add_folder(self, path: str, recursive: bool = True) -> Dict:
+        """Register a directory; it is indexed on the next scan"""
+        folder = str(Path(path).expanduser().resolve())
+        if not Path(folder).is_dir():
+            raise NotADirectoryError(f"Not a directory: {path}")
+        self.folders[folder] = {
+            "recursive": recursive,
+            "added": datetime.now().isoformat(),
+            "last_scan": None
+        }
+        self._save_state()
+        logger.info(f"Watching folder: {folder}")
+        return {"path": folder, **self.folders[folder]}
+
+    def remove_folder(self, path: str, purge: bool = True) -> int:
+        """Stop watching a directory, optionally removing its documents; returns chunks removed"""
+        folder = str(Path(path).expanduser().resolve())
+        if folder not in self.folders:
+            raise KeyError(f"Folder is not watched: {path}")
+
+        with self._scan_lock:
+            del self.folders[folder]
+            removed = 0
+            for file_path in [p for p, entry in self.files.items() if entry["folder"] == folder]:
+                if purge:
+                    removed += self.chatbot.remove_source(file_path)
+                del self.files[file_path]
+            self._save_state()
+
+        if removed and self.on_change is not None:
+            self.on_change()
+        logger.info(f"Stopped watching {folder} ({removed} chunks removed)")
+        return removed
+
+    def list_folders(self) -> List[Dict]:
+        counts: Dict[str, int] = {}
+        for entry in list(self.files.values()):
+            counts[entry["folder"]] = counts.get(entry["folder"], 0) + 1
+        return [
+            {"path": folder, **info, "files": counts.get(folder, 0)}
+            for folder, info in list(self.folders.items())
+        ]
+
+    # ===== Scanning =====
+
+    def _walk(self, folder: str, recursive: bool) -> Iterator[os.DirEntry]:
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            yield from self._walk(entry.path, recursive)
+                    elif entry.is_file() and Path(entry.name).suffix.lower() in self.allowed_extensions:
+                        yield entry
+        except OSError as e:
+            logger.warning(f"Cannot read {folder}: {e}")
+
+    def _scan_folder(self, folder: str, report: Dict):
+        info = self.folders[folder]
+        indexed = self.chatbot.vector_store.files
+        seen = set()
+
+        for entry in self._walk(folder, info["recursive"]):
+            path = entry.path
+            seen.add(path)
+            try:
+                stat = entry.stat()
+                previous = self.files.get(path)
+                # Cheap check first: same mtime and size means no read at all
+                if (previous is not None and previous["mtime_ns"] == stat.st_mtime_ns
+                        and previous["size"] == stat.st_size and path in indexed):
+                    report["unchanged"] += 1
+                    continue
+
+                content_hash = self.chatbot.processor.file_hash(path)
+                entry_state = {
+                    "folder": folder,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "size": stat.st_size,
+                    "sha256": content_hash
+                }
+                known = indexed.get(path)
+                if known is not None and known["sha256"] == content_hash:
+                    # Touched but not edited
+                    self.files[path] = entry_state
+                    report["unchanged"] += 1
+                    continue
+
+                result = self.chatbot.ingest_document(path, {"watched_folder": folder}, content_hash=content_hash)
+                if not result["success"]:
+                    report["errors"].append({"path": path, "error": "Failed to process document"})
+                    continue
+                self.files[path] = entry_state
+                report["modified" if result["replaced"] else "added"].append(path)
+                report["chunks_created"] += result["chunks_created"]
+            except Exception as e:
+                logger.error(f"Error indexing watched file {path}: {e}")
+                report["errors"].append({"path": path, "error": str(e)})
+
+        for path in [p for p, entry in self.files.items() if entry["folder"] == folder and p not in seen]:
+            report["chunks_removed"] += self.chatbot.remove_source(path)
+            del self.files[path]
+            report["deleted"].append(path)
+
+        info["last_scan"] = datetime.now().isoformat()
+
+    def scan(self, folder: Optional[str] = None) -> Dict:
+        """Index changes in one watched folder, or all of them"""
+        folders = list(self.folders)
+        if folder is not None:
+            resolved = str(Path(folder).expanduser().resolve())
+            if resolved not in self.folders:
+                raise KeyError(f"Folder is not watched: {folder}")
+            folders = [resolved]
+
+        report = {
+            "added": [],
+            "modified": [],
+            "deleted": [],
+            "unchanged": 0,
+            "errors": [],
+            "chunks_created": 0,
+            "chunks_removed": 0
+        }
+        # Ingestion needs the loaded store; never scan against a half-loaded one
+        self.chatbot.wait_until_ready()
+        start = time.perf_counter()
+        with self._scan_lock:
+            self.scanning = True
+            try:
+                for path in folders:
+                    if path in self.folders:
+                        self._scan_folder(path, report)
+                self._save_state()
+            finally:
+                self.scanning = False
+
+        report["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        changed = report["added"] or report["modified"] or report["deleted"]
+        if changed and self.on_change is not None:
+            self.on_change()
+        logger.info(
+            f"Watch scan: {len(report['added'])} added, {len(report['modified'])} modified, "
+            f"{len(report['deleted'])} deleted, {report['unchanged']} unchanged "
+            f"in {report['duration_ms']} ms"
+        )
+        return report
+
+    # ===== Background polling =====
+
+    def start(self):
+        """Scan now and then every interval seconds (interval <= 0: only on request)"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="folder-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def request_scan(self):
+        """Wake the background thread for an immediate scan"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self.folders:
+                try:
+                    self.scan()
+                except Exception as e:
+                    logger.error(f"Watch scan failed: {e}")
+            self._wake.wait(self.interval if self.interval > 0 else None)
+            self._wake.clear()